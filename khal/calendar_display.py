@@ -126,12 +126,16 @@ def str_week(
     highlight_event_days: bool = False,
     locale=None,
     bold_for_light_color: bool = True,
+    occupancy: dict[dt.date, set[str]] | None = None,
 ) -> str:
     """returns a string representing one week,
     if for day == today color is reversed
 
     :param week: list of 7 datetime.date objects (one week)
     :param today: the date of today
+    :param occupancy: calendars with events per day (as returned by
+        `CalendarCollection.get_calendars_between()`), if not given, they are
+        looked up for each day
     :return: string, which if printed on terminal appears to have length 20,
              but may contain ascii escape sequences
     """
@@ -145,7 +149,10 @@ def str_week(
             day_str = style(str(day.day).rjust(2), reverse=True)
         elif highlight_event_days:
             assert collection is not None
-            devents = list(collection.get_calendars_on(day))
+            if occupancy is not None:
+                devents = list(occupancy[day])
+            else:
+                devents = list(collection.get_calendars_on(day))
             if len(devents) > 0:
                 day_str = str_highlight_day(
                     day,
@@ -213,6 +220,14 @@ def vertical_month(
     month_abbr_len = get_month_abbr_len()
     khal.append(style(" " * month_abbr_len + weekheaders + " " + w_number, bold=True))
     _calendar = calendar.Calendar(firstweekday)
+    occupancy = None
+    if highlight_event_days and collection is not None:
+        # look up the days of all months at once
+        last_year, last_month = divmod(year * 12 + month - 1 + count - 1, 12)
+        occupancy = collection.get_calendars_between(
+            _calendar.monthdatescalendar(year, month)[0][0],
+            _calendar.monthdatescalendar(last_year, last_month + 1)[-1][-1],
+        )
     for _ in range(count):
         for week in _calendar.monthdatescalendar(year, month):
             if monthdisplay == "firstday":
@@ -231,6 +246,7 @@ def vertical_month(
                 highlight_event_days,
                 locale,
                 bold_for_light_color,
+                occupancy,
             )
             if new_month:
                 m_name = style(calendar.month_abbr[week[6].month].ljust(month_abbr_len), bold=True)
@@ -30,11 +30,12 @@ from shutil import get_terminal_size
 import click
 import click_log
 
-from . import controllers, plugins
+from . import plugins
 from .cli_utils import (
     _select_one_calendar_callback,
     build_collection,
     calendar_option,
+    echo_lines,
     global_options,
     logger,
     mouse_option,
@@ -44,8 +45,9 @@ from .cli_utils import (
 )
 from .exceptions import FatalError
 from .plugins import COMMANDS
+from .settings import NoConfigFile
 from .terminal import colored
-from .utils import human_formatter, json_formatter
+from .utils import human_formatter, json_formatter, ndjson_formatter
 
 try:
     from setproctitle import setproctitle
@@ -88,10 +90,13 @@ class _KhalGroup(click.Group):
         return super().list_commands(ctx) + list(COMMANDS.keys())
 
     def get_command(self, ctx, name):
-        if name in COMMANDS:
+        # built-in commands are looked up first, so that plugins only need
+        # to be discovered for plugin commands
+        command = super().get_command(ctx, name)
+        if command is None and name in COMMANDS:
             logger.debug(f"found command {name} as a plugin")
-            return COMMANDS[name]
-        return super().get_command(ctx, name)
+            command = COMMANDS[name]
+        return command
 
 
 @click.group(cls=_KhalGroup)
@@ -126,6 +131,8 @@ def calendar(
     ctx, include_calendar, exclude_calendar, daterange, once, notstarted, format, day_format
 ):
     """Print calendar with agenda."""
+    from . import controllers
+
     try:
         rows = controllers.calendar(
             build_collection(
@@ -169,18 +176,34 @@ def calendar(
 )
 @click.option("--notstarted", help=("Print only events that have not started."), is_flag=True)
 @click.option("--json", help=("Fields to output in json"), multiple=True)
+@click.option(
+    "--ndjson",
+    is_flag=True,
+    help=("Stream one JSON object per event and line (with the --json fields, default all)."),
+)
 @click.argument("DATERANGE", nargs=-1, required=False, metavar="[DATETIME [DATETIME | RANGE]]")
 @click.pass_context
 def klist(
-    ctx, include_calendar, exclude_calendar, daterange, once, notstarted, json, format, day_format
+    ctx,
+    include_calendar,
+    exclude_calendar,
+    daterange,
+    once,
+    notstarted,
+    json,
+    ndjson,
+    format,
+    day_format,
 ):
     """List all events between a start (default: today) and (optional)
     end datetime."""
+    from . import controllers
+
     enabled_eventformatters = plugins.FORMATTERS
     # TODO: register user given format string as a plugin
     logger.debug(f"{enabled_eventformatters}")
     try:
-        event_column = controllers.khal_list(
+        lines = controllers.iter_khal_list(
             build_collection(
                 ctx.obj["conf"], multi_calendar_select(ctx, include_calendar, exclude_calendar)
             ),
@@ -192,10 +215,9 @@ def klist(
             conf=ctx.obj["conf"],
             env={"calendars": ctx.obj["conf"]["calendars"]},
             json=json,
+            ndjson=ndjson,
         )
-        if event_column:
-            click.echo("\n".join(event_column))
-        else:
+        if not echo_lines(lines):
             logger.debug("No events found")
 
     except FatalError as error:
@@ -230,6 +252,8 @@ def new(
     assumed to be the event's summary, if two colons (::) are present,
     everything behind them is taken as the event's description.
     """
+    from . import controllers
+
     if not info and not interactive:
         raise click.BadParameter("no details provided, did you mean to use --interactive/-i?")
 
@@ -282,7 +306,14 @@ def new(
     callback=_select_one_calendar_callback,
     multiple=True,
 )
-@click.option("--batch", help=("do not ask for any confirmation."), is_flag=True)
+@click.option(
+    "--batch",
+    help=(
+        "do not ask for any confirmation, events which cannot be converted are "
+        "skipped with a warning."
+    ),
+    is_flag=True,
+)
 @click.option("--random_uid", "-r", help=("Select a random uid."), is_flag=True)
 @click.argument("ics", type=click.File("rb"), nargs=-1)
 @click.option("--format", "-f", help=("The format to print the event."))
@@ -298,8 +329,12 @@ def import_ics(ctx, ics, include_calendar, batch, random_uid, format):
     If no calendar is specified (and not `--batch`), you will be asked
     to choose a calendar. You can either enter the number printed behind
     each calendar's name or any unique prefix of a calendar's name.
+    With --batch, events which cannot be converted (e.g., because they are
+    malformed) are skipped with a warning, all others are imported.
 
     """
+    from . import controllers
+
     if include_calendar:
         ctx.obj["calendar_selection"] = {
             include_calendar,
@@ -317,7 +352,7 @@ def import_ics(ctx, ics, include_calendar, batch, random_uid, format):
     rvalue = 0
     # Default to stdin:
     if not ics:
-        ics_strs = ((sys.stdin.read(), "stdin"),)
+        ics_strs = ((sys.stdin if batch else sys.stdin.read(), "stdin"),)
         if not batch:
 
             def isatty(_file):
@@ -330,6 +365,9 @@ def import_ics(ctx, ics, include_calendar, batch, random_uid, format):
                 sys.stdin = open("/dev/tty")
             else:
                 logger.warning("/dev/tty does not exist, importing might not work")
+    elif batch:
+        # batch imports split the files while reading them
+        ics_strs = ((ics_file, ics_file.name) for ics_file in ics)
     else:
         ics_strs = ((ics_file.read(), ics_file.name) for ics_file in ics)
 
@@ -359,6 +397,8 @@ def import_ics(ctx, ics, include_calendar, batch, random_uid, format):
 @click.pass_context
 def interactive(ctx, include_calendar, exclude_calendar, mouse):
     """Interactive UI. Also launchable via `ikhal`."""
+    from . import controllers
+
     if mouse is not None:
         ctx.obj["conf"]["default"]["enable_mouse"] = mouse
     controllers.interactive(
@@ -376,6 +416,8 @@ def interactive(ctx, include_calendar, exclude_calendar, mouse):
 @click.pass_context
 def interactive_cli(ctx, config, include_calendar, exclude_calendar, mouse):
     """Interactive UI. Also launchable via `khal interactive`."""
+    from . import controllers
+
     prepare_context(ctx, config)
     if mouse is not None:
         ctx.obj["conf"]["default"]["enable_mouse"] = mouse
@@ -406,6 +448,36 @@ def printcalendars(ctx, include_calendar, exclude_calendar):
         sys.exit(1)
 
 
+@cli.command()
+@calendar_option
+@click.argument("files", nargs=-1, required=True, metavar="FILE...")
+@click.pass_context
+def reindex(ctx, calendar, files):
+    """Update the caching database for some files only.
+
+    Use this after some files of CALENDAR have been changed, added or deleted
+    (e.g., in a hook after syncing), instead of letting khal look for changes
+    in all calendars the next time it runs. FILE can either be the path to a
+    file or its name. All other files of CALENDAR are then considered
+    unchanged.
+    """
+    if calendar is None:
+        raise click.UsageError("Please specify a calendar with --calendar.")
+    path = os.path.realpath(ctx.obj["conf"]["calendars"][calendar]["path"])
+    hrefs = []
+    for file in files:
+        if os.sep in file and os.path.realpath(os.path.dirname(file)) != path:
+            raise click.BadParameter(f"{file} is not in calendar {calendar}.")
+        hrefs.append(os.path.basename(file))
+    try:
+        collection = build_collection(ctx.obj["conf"], {calendar}, update=False)
+        collection.update_hrefs(calendar, hrefs, timeout=None)
+    except FatalError as error:
+        logger.debug(error, exc_info=True)
+        logger.fatal(error)
+        sys.exit(1)
+
+
 @cli.command()
 @click.pass_context
 def printformats(ctx):
@@ -439,6 +511,8 @@ def printics(ctx, ics, format):
     """Print an ics file (or read from stdin) without importing it.
 
     Just print the ics file, do nothing else."""
+    from . import controllers
+
     try:
         if ics:
             ics_str = ics.read()
@@ -457,15 +531,21 @@ def printics(ctx, ics, format):
 @multi_calendar_option
 @click.option("--format", "-f", help=("The format of the events."))
 @click.option("--json", help=("Fields to output in json"), multiple=True)
+@click.option(
+    "--ndjson",
+    is_flag=True,
+    help=("Stream one JSON object per event and line (with the --json fields, default all)."),
+)
 @click.argument("search_string")
 @click.pass_context
-def search(ctx, format, json, search_string, include_calendar, exclude_calendar):
+def search(ctx, format, json, ndjson, search_string, include_calendar, exclude_calendar):
     """Search for events matching SEARCH_STRING.
 
     For recurring events, only the master event and different overwritten
-    events are shown.
+    events are shown. Search terms can be limited to one field, e.g.,
+    `location:berlin`.
     """
-    # TODO support for time ranges, location, description etc
+    # TODO support for time ranges
     if format is None:
         format = ctx.obj["conf"]["view"]["event_format"]
     try:
@@ -477,6 +557,15 @@ def search(ctx, format, json, search_string, include_calendar, exclude_calendar)
         term_width, _ = get_terminal_size()
         now = dt.datetime.now()
         env = {"calendars": ctx.obj["conf"]["calendars"]}
+        if ndjson:
+            formatter = ndjson_formatter(json or ["all"])
+            lines = (
+                formatter(event.attributes(relative_to=now, env=env, colors=False))
+                for event in events
+            )
+            if not echo_lines(lines):
+                logger.debug("No events found")
+            return
         if len(json) == 0:
             formatter = human_formatter(format)
         else:
@@ -513,6 +602,8 @@ def search(ctx, format, json, search_string, include_calendar, exclude_calendar)
 @click.pass_context
 def edit(ctx, format, search_string, show_past, include_calendar, exclude_calendar):
     """Interactively edit (or delete) events matching the search string."""
+    from . import controllers
+
     try:
         controllers.edit(
             build_collection(
@@ -536,16 +627,33 @@ def edit(ctx, format, search_string, show_past, include_calendar, exclude_calend
 @click.option("--day-format", "-df", help=("The format of the day line."))
 @click.option("--notstarted", help=("Print only events that have not started"), is_flag=True)
 @click.option("--json", help=("Fields to output in json"), multiple=True)
+@click.option(
+    "--ndjson",
+    is_flag=True,
+    help=("Stream one JSON object per event and line (with the --json fields, default all)."),
+)
 @click.argument("DATETIME", nargs=-1, required=False, metavar="[[START DATE] TIME | now]")
 @click.pass_context
-def at(ctx, datetime, notstarted, format, day_format, json, include_calendar, exclude_calendar):
+def at(
+    ctx,
+    datetime,
+    notstarted,
+    format,
+    day_format,
+    json,
+    ndjson,
+    include_calendar,
+    exclude_calendar,
+):
     """Print all events at a specific datetime (defaults to now)."""
+    from . import controllers
+
     if not datetime:
         datetime = ("now",)
     if format is None:
         format = ctx.obj["conf"]["view"]["event_format"]
     try:
-        rows = controllers.khal_list(
+        lines = controllers.iter_khal_list(
             build_collection(
                 ctx.obj["conf"], multi_calendar_select(ctx, include_calendar, exclude_calendar)
             ),
@@ -557,9 +665,9 @@ def at(ctx, datetime, notstarted, format, day_format, json, include_calendar, ex
             conf=ctx.obj["conf"],
             env={"calendars": ctx.obj["conf"]["calendars"]},
             json=json,
+            ndjson=ndjson,
         )
-        if rows:
-            click.echo("\n".join(rows))
+        echo_lines(lines)
     except FatalError as error:
         logger.debug(error, exc_info=True)
         logger.fatal(error)
@@ -580,4 +688,37 @@ def configure(ctx):
         sys.exit(1)
 
 
+@cli.command()
+@click.option(
+    "--socket",
+    "socket_path",
+    default=None,
+    metavar="PATH",
+    help="The socket to listen on [defaults to $XDG_RUNTIME_DIR/khal/khal.sock].",
+)
+@click.pass_context
+def serve(ctx, socket_path):
+    """Run khal commands for khalc.
+
+    Keeps the configuration and the calendars loaded and runs the commands
+    `khalc` forwards to it, the vdirs are checked for changes in between.
+    """
+    import signal
+
+    from . import client, server
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve(ctx.obj["conf_path"], socket_path or client.default_socket_path())
+    except NoConfigFile:
+        logger.fatal("Cannot find a config file.")
+        sys.exit(1)
+    except (FatalError, OSError) as error:
+        logger.debug(error, exc_info=True)
+        logger.fatal(error)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+
+
 main_khal, main_ikhal = cli, interactive_cli
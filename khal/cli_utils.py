@@ -21,13 +21,17 @@
 #
 import logging
 import sys
+from typing import TYPE_CHECKING
 
 import click
 import click_log
 
 from . import __version__, khalendar
 from .exceptions import FatalError
-from .settings import InvalidSettingsError, NoConfigFile, get_config
+from .settings import InvalidSettingsError, NoConfigFile, get_cached_config
+
+if TYPE_CHECKING:
+    from .server import WarmState
 
 logger = logging.getLogger("khal")
 click_log.basic_config("khal")
@@ -37,6 +41,10 @@ week_option = click.option("--week", "-w", help="Include all events in one week.
 events_option = click.option("--events", default=None, type=int, help="How many events to include.")
 dates_arg = click.argument("dates", nargs=-1)
 
+# set by `khal serve`, configurations and collections are then taken from (and
+# kept in) this server.WarmState instead of being built for each command
+warm_state: "WarmState | None" = None
+
 
 def time_args(f):
     return dates_arg(events_option(week_option(days_option(f))))
@@ -157,8 +165,18 @@ def global_options(f):
     return logfile(config(color(version(f))))
 
 
-def build_collection(conf, selection):
-    """build and return a khalendar.CalendarCollection from the configuration"""
+def build_collection(conf, selection, update=True):
+    """build and return a khalendar.CalendarCollection from the configuration
+
+    :param update: update the caching db from the vdirs
+    """
+    if warm_state is not None:
+        return warm_state.get_collection(conf, selection)
+    return new_collection(conf, selection, update)
+
+
+def new_collection(conf, selection, update=True):
+    """build a new khalendar.CalendarCollection from the configuration"""
     try:
         props = {}
         for name, cal in conf["calendars"].items():
@@ -177,11 +195,13 @@ def build_collection(conf, selection):
             color=conf["highlight_days"]["color"],
             locale=conf["locale"],
             dbpath=conf["sqlite"]["path"],
+            workers=conf["sqlite"]["workers"],
             hmethod=conf["highlight_days"]["method"],
             default_color=conf["highlight_days"]["default_color"],
             multiple=conf["highlight_days"]["multiple"],
             multiple_on_overflow=conf["highlight_days"]["multiple_on_overflow"],
             highlight_event_days=conf["default"]["highlight_event_days"],
+            update=update,
         )
     except FatalError as error:
         logger.debug(error, exc_info=True)
@@ -206,7 +226,10 @@ def prepare_context(ctx, config):
 
     logger.debug("khal %s", __version__)
     try:
-        conf = get_config(config)
+        if warm_state is None:
+            conf = get_cached_config(config)
+        else:
+            conf = warm_state.get_config(config)
     except NoConfigFile:
         conf = _NoConfig()
     except InvalidSettingsError:
@@ -236,3 +259,15 @@ def stringify_conf(conf):
             else:
                 out.append(f"  {subkey}: {subvalue}")
     return "\n".join(out)
+
+
+def echo_lines(lines) -> bool:
+    """print each of `lines` as soon as it is produced
+
+    :returns: True if anything was printed
+    """
+    printed = False
+    for line in lines:
+        click.echo(line)
+        printed = True
+    return printed
@@ -0,0 +1,187 @@
+# Copyright (c) 2013-2022 khal contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+`khalc`, a client for `khal serve`.
+
+It forwards its arguments to a running `khal serve` and prints what it sends
+back. If there is no server running, or the command cannot be served, it
+runs khal as usual. This module only uses the standard library, so that
+starting it is as cheap as possible.
+"""
+
+import json
+import os
+import shutil
+import socket
+import stat
+import struct
+import sys
+import tempfile
+
+# commands that can be run by `khal serve`, they neither read from stdin nor
+# need a terminal
+SERVED_COMMANDS = frozenset(("at", "calendar", "list", "printcalendars", "printformats", "search"))
+
+# options of the main command that take a value
+_VALUE_OPTIONS = frozenset(("-c", "--config", "-l", "--logfile", "-v", "--verbosity"))
+
+# environment variables (by prefix) sent along with each command, they are
+# set for running it, those the client doesn't have are unset
+_FORWARDED_ENV = ("LANG", "LC_", "TZ", "XDG_")
+
+# the server's answer is a sequence of frames, each starting with one of these
+# bytes followed by the length of the payload (4 bytes, big endian)
+STDOUT = b"o"
+STDERR = b"e"
+EXIT = b"x"
+
+
+def default_socket_path() -> str:
+    """return the path of the socket `khal serve` listens on"""
+    if "KHAL_SOCKET" in os.environ:
+        return os.environ["KHAL_SOCKET"]
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or os.path.join(
+        tempfile.gettempdir(), f"khal-{os.getuid()}"
+    )
+    return os.path.join(runtime_dir, "khal", "khal.sock")
+
+
+def is_private_dir(path: str) -> bool:
+    """check that `path` is a directory owned by and only accessible to the
+    current user, as the directory of the socket must be"""
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return (
+        stat.S_ISDIR(info.st_mode)
+        and info.st_uid == os.getuid()
+        and stat.S_IMODE(info.st_mode) & 0o077 == 0
+    )
+
+
+def is_trusted_peer(sock: socket.socket) -> bool:
+    """check that the process at the other end of the unix socket `sock` is
+    run by the current user
+
+    Where the credentials of the peer are not available (SO_PEERCRED is
+    Linux only), we rely on the permissions of the socket's directory.
+    """
+    if not hasattr(socket, "SO_PEERCRED"):
+        return True
+    credentials = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    _pid, uid, _gid = struct.unpack("3i", credentials)
+    return uid == os.getuid()
+
+
+def is_forwarded(name: str) -> bool:
+    """check if the environment variable `name` is sent to the server"""
+    return name.startswith(_FORWARDED_ENV)
+
+
+def get_command(argv: list[str]) -> str | None:
+    """return the name of the (sub)command `argv` would run"""
+    args = iter(argv)
+    for arg in args:
+        if arg == "--":
+            return next(args, None)
+        if arg in _VALUE_OPTIONS:
+            next(args, None)
+        elif not arg.startswith("-"):
+            return arg
+    return None
+
+
+def _read_exactly(sock: socket.socket, length: int) -> bytes:
+    data = b""
+    while len(data) < length:
+        chunk = sock.recv(length - len(data))
+        if not chunk:
+            raise ConnectionError("khal serve closed the connection")
+        data += chunk
+    return data
+
+
+def forward(argv: list[str], socket_path: str | None = None) -> int | None:
+    """run `argv` on a running `khal serve` and print its output
+
+    :returns: the exit code, or None if no server could be reached
+    """
+    socket_path = socket_path or default_socket_path()
+    socket_dir = os.path.dirname(os.path.abspath(socket_path))
+    if not os.path.exists(socket_path):
+        return None
+    if not is_private_dir(socket_dir):
+        sys.stderr.write(f"Not using {socket_path}, {socket_dir} is accessible by other users.\n")
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+    if not is_trusted_peer(sock):
+        sock.close()
+        sys.stderr.write(f"Not using {socket_path}, it is served by another user.\n")
+        return None
+
+    columns, lines = shutil.get_terminal_size()
+    request = {
+        "argv": argv,
+        "cwd": os.getcwd(),
+        "stdout_tty": sys.stdout.isatty(),
+        "stderr_tty": sys.stderr.isatty(),
+        "columns": columns,
+        "lines": lines,
+        "env": {name: value for name, value in os.environ.items() if is_forwarded(name)},
+    }
+    outputs = {STDOUT: sys.stdout.buffer, STDERR: sys.stderr.buffer}
+    with sock:
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        try:
+            while True:
+                kind = _read_exactly(sock, 1)
+                length = int.from_bytes(_read_exactly(sock, 4), "big")
+                payload = _read_exactly(sock, length)
+                if kind == EXIT:
+                    return int(payload)
+                outputs[kind].write(payload)
+                outputs[kind].flush()
+        except ConnectionError as error:
+            sys.stderr.write(f"{error}\n")
+            return 1
+
+
+def main(argv: list[str] | None = None) -> None:
+    if argv is None:
+        argv = sys.argv[1:]
+    if get_command(argv) in SERVED_COMMANDS:
+        code = forward(argv)
+        if code is not None:
+            sys.exit(code)
+
+    from khal.cli import main_khal
+
+    main_khal(args=argv, prog_name="khal")
+
+
+if __name__ == "__main__":
+    main()
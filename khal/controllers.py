@@ -26,7 +26,7 @@ import os
 import re
 import textwrap
 from collections import OrderedDict, defaultdict
-from collections.abc import Callable
+from collections.abc import Callable, Iterator
 from shutil import get_terminal_size
 
 import pytz
@@ -45,12 +45,12 @@ from khal.khalendar.event import Event
 from khal.khalendar.exceptions import DuplicateUid, ReadOnlyCalendarError
 
 from .exceptions import ConfigurationError
-from .icalendar import cal_from_ics, split_ics
+from .icalendar import cal_from_ics, split_ics, split_ics_stream
 from .icalendar import sort_key as sort_vevent_key
 from .khalendar.vdir import Item
 from .parse_datetime import timedelta2str
 from .terminal import merge_columns
-from .utils import human_formatter, json_formatter
+from .utils import human_formatter, json_formatter, ndjson_formatter
 
 logger = logging.getLogger("khal")
 
@@ -202,7 +202,6 @@ def get_events_between(
     """
     assert not (notstarted and not original_start)
 
-    event_list = []
     if env is None:
         env = {}
     assert start
@@ -215,7 +214,34 @@ def get_events_between(
 
     events = sorted(collection.get_localized(start_local, end_local))
     events_float = sorted(collection.get_floating(start, end))
-    events = sorted(events + events_float)
+    return _format_events(
+        sorted(events + events_float),
+        start,
+        end,
+        formatter,
+        notstarted,
+        env,
+        original_start,
+        seen,
+        colors,
+    )
+
+
+def _format_events(
+    events: list[Event],
+    start: dt.datetime,
+    end: dt.datetime,
+    formatter: Callable,
+    notstarted: bool,
+    env: dict,
+    original_start: dt.datetime,
+    seen,
+    colors: bool,
+) -> list[str]:
+    """format the (sorted) `events` scheduled between `start` and `end`, see
+    :func:`get_events_between` for the parameters
+    """
+    event_list = []
     for event in events:
         # yes the logic could be simplified, but I believe it's easier
         # to understand what's going on here this way
@@ -251,8 +277,48 @@ def khal_list(
     env=None,
     datepoint=None,
     json: list | None = None,
-):
-    """returns a list of all events in `daterange`"""
+    ndjson: bool = False,
+) -> list[str]:
+    """returns a list of all events in `daterange`, see :func:`iter_khal_list`"""
+    return list(
+        iter_khal_list(
+            collection,
+            daterange=daterange,
+            conf=conf,
+            agenda_format=agenda_format,
+            day_format=day_format,
+            once=once,
+            notstarted=notstarted,
+            width=width,
+            env=env,
+            datepoint=datepoint,
+            json=json,
+            ndjson=ndjson,
+        )
+    )
+
+
+def iter_khal_list(
+    collection,
+    daterange: list[str] | None = None,
+    conf: dict | None = None,
+    agenda_format=None,
+    day_format: str | None = None,
+    once=False,
+    notstarted: bool = False,
+    width: int | None = None,
+    env=None,
+    datepoint=None,
+    json: list | None = None,
+    ndjson: bool = False,
+) -> Iterator[str]:
+    """yields the lines of the agenda of all events in `daterange`
+
+    Lines are yielded day by day, as soon as the events of a day are
+    formatted. With `ndjson`, each event is one JSON object on a line of its
+    own (with the fields given in `json`, or all of them) and no day
+    headings are printed.
+    """
     assert daterange is not None or datepoint is not None
     assert conf is not None
 
@@ -260,7 +326,10 @@ def khal_list(
     if agenda_format is None:
         agenda_format = conf["view"]["agenda_event_format"]
 
-    if json:
+    if ndjson:
+        formatter = ndjson_formatter(json or ["all"])
+        colors = False
+    elif json:
         formatter = json_formatter(json)
         colors = False
     else:
@@ -302,37 +371,48 @@ def khal_list(
             )
         logger.debug(f"Getting all events between {start} and {end}")
 
-    event_column: list[str] = []
+    first_day = True
     once = set() if once else None
     if env is None:
         env = {}
 
     original_start = conf["locale"]["local_timezone"].localize(start)
+    days = []
     while start < end:
         if start.date() == end.date():
             day_end = end
         else:
             day_end = dt.datetime.combine(start.date(), dt.time.max)
-        current_events = get_events_between(
-            collection,
-            locale=conf["locale"],
-            formatter=formatter,
-            start=start,
-            end=day_end,
-            notstarted=notstarted,
-            original_start=original_start,
-            env=env,
-            seen=once,
-            colors=colors,
-        )
-        if day_format and (conf["default"]["show_all_days"] or current_events) and not json:
-            if len(event_column) != 0 and conf["view"]["blank_line_before_day"]:
-                event_column.append("")
-            event_column.append(format_day(start.date(), day_format, conf["locale"]))
-        event_column.extend(current_events)
+        days.append((start, day_end))
         start = dt.datetime(*start.date().timetuple()[:3]) + dt.timedelta(days=1)
 
-    return event_column
+    # all days are fetched from the db at once, formatting is still done
+    # day by day, as `once` depends on the order the days are printed in
+    buckets = collection.get_events_by_range(days)
+    for (start, day_end), (events, events_float) in zip(days, buckets):
+        current_events = _format_events(
+            sorted(sorted(events) + sorted(events_float)),
+            start,
+            day_end,
+            formatter,
+            notstarted,
+            env,
+            original_start,
+            once,
+            colors,
+        )
+        if (
+            day_format
+            and (conf["default"]["show_all_days"] or current_events)
+            and not (json or ndjson)
+        ):
+            if not first_day and conf["view"]["blank_line_before_day"]:
+                yield ""
+            yield format_day(start.date(), day_format, conf["locale"])
+            first_day = False
+        elif current_events:
+            first_day = False
+        yield from current_events
 
 
 def new_interactive(
@@ -694,6 +774,9 @@ def import_ics(collection, conf, ics, batch=False, random_uid=False, format=None
     :param format: the format string to print events with
     :type format: str
     """
+    if batch:
+        import_ics_batch(collection, conf, ics, random_uid)
+        return
     if format is None:
         format = conf["view"]["event_format"]
     try:
@@ -704,6 +787,40 @@ def import_ics(collection, conf, ics, batch=False, random_uid=False, format=None
         import_event(vevent, collection, conf["locale"], batch, format, env)
 
 
+def import_ics_batch(collection, conf, ics, random_uid=False):
+    """import all events from `ics` without asking
+
+    Events that already exist are updated. Instead of inserting one event
+    after the other, the ics file is split while it is read, the events are
+    converted and written in parallel and the db is updated once for all of
+    them, see :meth:`.khalendar.CalendarCollection.insert_many`. Events
+    which cannot be converted are skipped with a warning.
+
+    :param ics: the ics file's content or an iterable of its lines
+    :type ics: str or bytes or Iterable
+    """
+    if not collection.writable_names:
+        raise ConfigurationError("No writable calendars found, aborting import.")
+    if len(collection.writable_names) == 1:
+        calendar_name = collection.writable_names[0]
+    else:
+        calendar_name = collection.default_calendar_name
+    assert calendar_name in collection.writable_names
+
+    if isinstance(ics, str | bytes):
+        ics = ics.splitlines()
+    vevents = split_ics_stream(
+        ics, random_uid, conf["locale"]["default_timezone"], workers=collection.workers
+    )
+    try:
+        count = collection.insert_many((Item(vevent) for vevent in vevents), calendar_name)
+    except ReadOnlyCalendarError:
+        raise FatalError(f"ERROR: Cannot modify calendar `{calendar_name}` as it is read-only")
+    except (OSError, UnicodeDecodeError) as error:
+        raise FatalError(error)
+    logger.info(f"imported {count} events into `{calendar_name}`")
+
+
 def import_event(vevent, collection, locale, batch, format=None, env=None):
     """import one event into collection, let user choose the collection
 
@@ -746,16 +863,25 @@ def import_event(vevent, collection, locale, batch, format=None, env=None):
             echo("invalid choice")
     assert calendar_name in collection.writable_names
 
+    item = Item(vevent)
+    if not batch and item.uid:
+        others = [
+            calendar
+            for calendar, _ in collection.find_by_uid(item.uid)
+            if calendar != calendar_name
+        ]
+        if others:
+            echo(f"An event with the same UID already exists in `{'`, `'.join(others)}`.")
     if batch or confirm(f"Do you want to import this event into `{calendar_name}`?"):
         try:
-            collection.insert(Item(vevent), collection=calendar_name)
+            collection.insert(item, collection=calendar_name)
         except DuplicateUid:
             if batch or confirm(
                 "An event with the same UID already exists. Do you want to update it?"
             ):
-                collection.force_update(Item(vevent), collection=calendar_name)
+                collection.force_update(item, collection=calendar_name)
             else:
-                logger.warning(f"Not importing event with UID `{event.uid}`")
+                logger.warning(f"Not importing event with UID `{item.uid}`")
 
 
 def print_ics(conf, name, ics, format):
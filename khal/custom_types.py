@@ -47,6 +47,22 @@ EventTuple = tuple[
     str,
 ]
 
+# calendar, href, ref, etag, start, end, uid, summary, location, status and
+# (if requested) item of an instance, see `SQLiteDb.get_instances()`
+InstanceTuple = tuple[
+    str,
+    str,
+    str,
+    str | None,
+    dt.date | dt.datetime,
+    dt.date | dt.datetime,
+    str | None,
+    str,
+    str,
+    str,
+    str | None,
+]
+
 
 # Only need for RRuleMapType
 class RRuleMapBase(TypedDict):
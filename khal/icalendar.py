@@ -24,6 +24,8 @@
 import datetime as dt
 import logging
 from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
 from hashlib import sha256
 
 import dateutil.rrule
@@ -40,6 +42,10 @@ logger = logging.getLogger("khal")
 # zoneinfo.
 icalendar.use_pytz()
 
+# split_ics_stream() converts events in parallel if there are at least this
+# many UIDs
+PARALLEL_THRESHOLD = 200
+
 
 def split_ics(ics: str, random_uid: bool = False, default_timezone=None) -> list:
     """split an ics string into several according to VEVENT's UIDs
@@ -53,15 +59,8 @@ def split_ics(ics: str, random_uid: bool = False, default_timezone=None) -> list
 
     events_grouped = defaultdict(list)
     for item in cal.walk():
-        # Since some events could have a Windows format timezone (e.g. 'New Zealand
-        # Standard Time' for 'Pacific/Auckland' in Olson format), we convert any
-        # Windows format timezones to Olson.
         if item.name == "VTIMEZONE":
-            if item["TZID"] in icalendar.timezone.windows_to_olson.WINDOWS_TO_OLSON:
-                key = icalendar.timezone.windows_to_olson.WINDOWS_TO_OLSON[item["TZID"]]
-            else:
-                key = item["TZID"]
-            tzs[key] = item
+            tzs[_tz_key(item)] = item
 
         if item.name == "VEVENT":
             if "UID" not in item:
@@ -88,6 +87,157 @@ def split_ics(ics: str, random_uid: bool = False, default_timezone=None) -> list
     return out
 
 
+def _tz_key(vtimezone: icalendar.Timezone) -> str:
+    """return the TZID of `vtimezone` to look it up by
+
+    Since some events could have a Windows format timezone (e.g. 'New Zealand
+    Standard Time' for 'Pacific/Auckland' in Olson format), we convert any
+    Windows format timezones to Olson.
+    """
+    if vtimezone["TZID"] in icalendar.timezone.windows_to_olson.WINDOWS_TO_OLSON:
+        return icalendar.timezone.windows_to_olson.WINDOWS_TO_OLSON[vtimezone["TZID"]]
+    return vtimezone["TZID"]
+
+
+def split_ics_stream(
+    lines: Iterable[str | bytes], random_uid: bool = False, default_timezone=None, workers: int = 0
+) -> Iterator[str]:
+    """like `split_ics()`, but for large ics files
+
+    The lines of the ics file are split into VEVENTs (grouped by UID) and
+    VTIMEZONEs without parsing the file as a whole. Only the events of each UID
+    (with the timezones they reference) are parsed, by a pool of `workers`
+    processes (0 means one per CPU) if there are many of them.
+
+    Events that cannot be converted are skipped with a warning, the others are
+    still yielded.
+    """
+    events_grouped, tzs = _split_lines(lines)
+    jobs = []
+    for uid, events in sorted(events_grouped.items()):
+        text = "".join(events)
+        needed_tzs = "".join(tz for tzid, tz in tzs.items() if tzid in text)
+        jobs.append((uid, needed_tzs + text))
+    if workers == 1 or len(jobs) < PARALLEL_THRESHOLD:
+        results = (_try_ics_from_components(*job, random_uid, default_timezone) for job in jobs)
+        yield from (ics for ics in results if ics is not None)
+        return
+    with ProcessPoolExecutor(max_workers=workers or None) as pool:
+        futures = [
+            pool.submit(_try_ics_from_components, *job, random_uid, default_timezone)
+            for job in jobs
+        ]
+        for future in futures:
+            ics = future.result()
+            if ics is not None:
+                yield ics
+
+
+def _split_lines(lines: Iterable[str | bytes]) -> tuple[dict[str, list[str]], dict[str, str]]:
+    """sort the top level VEVENTs and VTIMEZONEs of the lines of an ics file
+
+    :returns: the (unfolded) VEVENTs as strings grouped by UID and the
+        VTIMEZONEs as strings by TZID
+    """
+    events_grouped: dict[str, list[str]] = defaultdict(list)
+    tzs: dict[str, str] = {}
+    name: str | None = None
+    component: list[str] = []
+    depth = 0
+    key = ""
+    for line in _unfold(lines):
+        upper = line.upper()
+        if name is None:
+            if upper in ("BEGIN:VEVENT", "BEGIN:VTIMEZONE"):
+                name, component, depth, key = upper[6:], [line], 0, ""
+            continue
+        component.append(line)
+        if upper.startswith("BEGIN:"):
+            depth += 1
+        elif upper.startswith("END:") and depth > 0:
+            depth -= 1
+        elif upper.startswith("END:"):
+            text = "\r\n".join(component) + "\r\n"
+            if name == "VTIMEZONE":
+                tzs[key] = text
+            else:
+                if not key:
+                    key = sha256(text.encode("utf-8")).hexdigest()
+                events_grouped[key].append(text)
+            name = None
+        elif depth == 0 and ":" in line:
+            prop, value = line.split(":", 1)
+            prop = prop.split(";", 1)[0].upper()
+            if (name, prop) in (("VEVENT", "UID"), ("VTIMEZONE", "TZID")):
+                key = value
+    return events_grouped, tzs
+
+
+def _unfold(lines: Iterable[str | bytes]) -> Iterator[str]:
+    """yield the unfolded content lines of an ics file"""
+    current: str | None = None
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def find_uid(ics: str) -> str | None:
+    """return the UID of the first VEVENT in `ics` without parsing it, None if
+    it has none or it is not a plain value"""
+    depth = None  # nesting within the VEVENT, None outside of it
+    for line in _unfold(ics.splitlines()):
+        upper = line.upper()
+        if depth is None:
+            if upper == "BEGIN:VEVENT":
+                depth = 0
+        elif upper.startswith("BEGIN:"):
+            depth += 1
+        elif upper.startswith("END:"):
+            if depth == 0:
+                return None
+            depth -= 1
+        elif depth == 0 and upper.startswith("UID:"):
+            uid = line[len("UID:") :]
+            # escaped characters would need to be decoded
+            return None if "\\" in uid else uid
+    return None
+
+
+def _try_ics_from_components(
+    uid: str, components: str, random_uid: bool, default_timezone
+) -> str | None:
+    """convert the VEVENTs with `uid` (and the VTIMEZONEs they need) in
+    `components` to an icalendar str, None if that fails"""
+    try:
+        cal = cal_from_ics("BEGIN:VCALENDAR\r\n" + components + "END:VCALENDAR\r\n")
+        tzs = {}
+        events = []
+        for item in cal.walk():
+            if item.name == "VTIMEZONE":
+                tzs[_tz_key(item)] = item
+            elif item.name == "VEVENT":
+                if "UID" not in item:
+                    logger.warning(
+                        f"Event with summary '{item.get('SUMMARY')}' doesn't have a unique ID."
+                        "A generated ID will be used instead."
+                    )
+                    item["UID"] = uid
+                events.append(item)
+        return ics_from_list(events, tzs, random_uid, default_timezone)
+    except Exception as error:
+        logger.warning(f"Error when trying to import the event {uid}: {error}")
+        return None
+
+
 def new_vevent(
     locale,
     dtstart: dt.date,
@@ -218,6 +368,8 @@ def ics_from_list(
 def expand(
     vevent: icalendar.Event,
     href: str = "",
+    start: dt.datetime | None = None,
+    end: dt.datetime | None = None,
 ) -> list[tuple[dt.datetime, dt.datetime]] | None:
     """
     Constructs a list of start and end dates for all recurring instances of the
@@ -232,6 +384,10 @@ def expand(
     :param vevent: vevent to be expanded
     :param href: the href of the vevent, used for more informative logging and
                  nothing else
+    :param start: together with `end`, limits the expansion of recurrence
+                  rules which never end (neither UNTIL nor COUNT are set) to
+                  instances overlapping this window (naive datetimes)
+    :param end: see `start`, if not given, such rules are expanded until 2037
     :returns: list of start and end (date)times of the expanded event
     """
     # we do this now and than never care about the "real" end time again
@@ -284,7 +440,15 @@ def expand(
         # telling mypy, that _until exists
         # we are very sure (TM) that rrulestr always returns a rrule, not a
         # rruleset (which wouldn't have a _until attribute)
-        if rrule._until is None:  # type: ignore
+        windowed = (
+            start is not None
+            and end is not None
+            and rrule._until is None  # type: ignore
+            and rrule._count is None  # type: ignore
+        )
+        if windowed:
+            rrule._until = end  # type: ignore
+        elif rrule._until is None:  # type: ignore
             # rrule really doesn't like to calculate all recurrences until
             # eternity, so we only do it until 2037, because a) I'm not sure
             # if python can deal with larger datetime values yet and b) pytz
@@ -313,21 +477,31 @@ def expand(
                 )
                 return None
 
-        if rrule.count() == 0:
+        if windowed and rrule._dtstart > end:  # type: ignore
+            # the first instance lies beyond the window, nothing to do (yet)
+            instances: Iterable[dt.datetime] = []
+        # unlike count(), this does not calculate all instances
+        elif next(iter(rrule), None) is None:
             logger.warning(
                 f"{href}: Recurrence defined but will never occur.\n"
                 "This event will not be available in khal."
             )
             return None
-
-        rrule = map(sanitize_datetime, rrule)  # type: ignore
+        elif windowed:
+            assert start is not None
+            earliest = start - duration
+            instances = _fast_forward(rrule, earliest).between(  # type: ignore[arg-type]
+                earliest, end, inc=True
+            )
+        else:
+            instances = rrule
 
         logger.debug(f"calculating recurrence dates for {href}, this might take some time.")
 
         # RRULE and RDATE may specify the same date twice, it is recommended by
         # the RFC to consider this as only one instance
-        dtstartl = set(rrule)
-        if not dtstartl:
+        dtstartl = set(map(sanitize_datetime, instances))
+        if not dtstartl and not windowed:
             raise UnsupportedRecurrence()
     else:
         dtstartl = {vevent["DTSTART"].dt}
@@ -354,6 +528,8 @@ def expand(
             try:
                 dtstartl.remove(date)
             except KeyError:
+                if windowed and not _in_window(date, start - duration, end):  # type: ignore
+                    continue
                 logger.warning(
                     f"In event {href}, excluded instance starting at {date} "
                     "not found, event might be invalid."
@@ -365,6 +541,49 @@ def expand(
     return dtstartend
 
 
+# recurrence rules with these frequencies repeat after a fixed time (times
+# their INTERVAL), see `_fast_forward()`
+PERIODS = {
+    dateutil.rrule.WEEKLY: dt.timedelta(weeks=1),
+    dateutil.rrule.DAILY: dt.timedelta(days=1),
+    dateutil.rrule.HOURLY: dt.timedelta(hours=1),
+    dateutil.rrule.MINUTELY: dt.timedelta(minutes=1),
+    dateutil.rrule.SECONDLY: dt.timedelta(seconds=1),
+}
+
+
+def _fast_forward(rrule: dateutil.rrule.rrule, start: dt.datetime) -> dateutil.rrule.rrule:
+    """return a copy of the (originally never ending) `rrule` with the same
+    instances after `start`, but starting as close before it as possible
+
+    dateutil calculates all instances from DTSTART on, so expanding a daily
+    rule years after its DTSTART would take a while. Rules with a fixed
+    period can start at any multiple of it instead.
+    """
+    period = PERIODS.get(rrule._freq)  # type: ignore
+    if period is None or rrule._dtstart >= start:  # type: ignore
+        return rrule
+    period *= rrule._interval  # type: ignore
+    skipped = (start - rrule._dtstart) // period  # type: ignore
+    return rrule.replace(dtstart=rrule._dtstart + skipped * period)  # type: ignore
+
+
+def _in_window(date: dt.date, start: dt.datetime, end: dt.datetime) -> bool:
+    """check if `date` lies between the naive datetimes `start` and `end`"""
+    if not isinstance(date, dt.datetime):
+        date = dt.datetime.combine(date, dt.time.min)
+    return start <= date.replace(tzinfo=None) <= end
+
+
+def is_unbounded(vevent: icalendar.Event) -> bool:
+    """check if `vevent` recurs forever, i.e. has an RRULE with neither UNTIL
+    nor COUNT"""
+    if vevent.get("RECURRENCE-ID"):
+        return False
+    rrule = vevent.get("RRULE")
+    return rrule is not None and "UNTIL" not in rrule and "COUNT" not in rrule
+
+
 def assert_only_one_uid(cal: icalendar.Calendar):
     """assert that all VEVENTs in cal have the same UID"""
     uids = set()
@@ -377,6 +596,17 @@ def assert_only_one_uid(cal: icalendar.Calendar):
         return True
 
 
+# properties `sanitize()` localizes in the default timezone if their timezone
+# is not understood
+LOCALIZED_PROPERTIES = ["DTSTART", "DTEND", "DUE", "RECURRENCE-ID"]
+
+
+def uses_default_timezone(vevent: icalendar.Event) -> bool:
+    """check if `sanitize()` would localize any of `vevent`'s times in the
+    default timezone"""
+    return any(prop in vevent and invalid_timezone(vevent[prop]) for prop in LOCALIZED_PROPERTIES)
+
+
 def sanitize(
     vevent: icalendar.Event,
     default_timezone: pytz.BaseTzInfo,
@@ -399,7 +629,7 @@ def sanitize(
     # convert localized datetimes with timezone information we don't
     # understand to the default timezone
     # TODO do this for everything where a TZID can appear (RDATE, EXDATE)
-    for prop in ["DTSTART", "DTEND", "DUE", "RECURRENCE-ID"]:
+    for prop in LOCALIZED_PROPERTIES:
         if prop in vevent and invalid_timezone(vevent[prop]):
             timezone = vevent[prop].params.get("TZID")
             value = default_timezone.localize(vevent.pop(prop).dt)
@@ -24,9 +24,13 @@ The SQLite backend implementation.
 
 import contextlib
 import datetime as dt
+import heapq
 import logging
+import re
 import sqlite3
-from collections.abc import Iterable, Iterator
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Iterator, Mapping
 from enum import IntEnum
 from os import makedirs, path
 from typing import Any
@@ -37,17 +41,46 @@ import pytz
 from dateutil import parser
 
 from khal import utils
-from khal.custom_types import EventTuple, LocaleConfiguration
-from khal.icalendar import assert_only_one_uid, cal_from_ics
+from khal.custom_types import EventTuple, InstanceTuple, LocaleConfiguration
+from khal.icalendar import (
+    assert_only_one_uid,
+    cal_from_ics,
+    find_uid,
+    is_unbounded,
+    uses_default_timezone,
+)
 from khal.icalendar import expand as expand_vevent
 from khal.icalendar import sanitize as sanitize_vevent
 from khal.icalendar import sort_key as sort_vevent_key
 
 from .exceptions import CouldNotCreateDbDir, NonUniqueUID, OutdatedDbVersionError, UpdateFailed
+from .vdir import get_etag_from_path
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None  # type: ignore[assignment]
 
 logger = logging.getLogger("khal")
 
-DB_VERSION = 5  # The current db layout version
+DB_VERSION = 13  # The current db layout version
+
+# how long (in seconds) to wait for another process writing to or updating
+# the db
+LOCK_TIMEOUT = 5.0
+
+# instances of recurring events without an end are only stored for this long
+# around the current date, instances beyond it are expanded in memory when
+# they are queried
+HORIZON = dt.timedelta(days=2 * 365)
+# the horizon moves along with the current date in steps of (at most) this
+# size, see `SQLiteDb.extend_horizon()`
+HORIZON_STEP = dt.timedelta(days=30)
+# nothing is ever expanded beyond these dates, so that we stay well within the
+# range of datetime
+EXPANSION_LIMITS = (dt.datetime(100, 1, 1), dt.datetime(9900, 1, 1))
+# how many time spans beyond the horizon are kept expanded in memory
+BEYOND_CACHE_SIZE = 16
 
 RECURRENCE_ID = "RECURRENCE-ID"
 THISANDFUTURE = "THISANDFUTURE"
@@ -55,6 +88,29 @@ THISANDPRIOR = "THISANDPRIOR"
 
 PROTO = "PROTO"
 
+# properties of VEVENTs that are indexed for searching, the order is also
+# the order of the columns in the search tables
+SEARCH_FIELDS = ("summary", "description", "location", "categories", "attendee", "organizer")
+# how much a match in each of those fields counts when ranking search results
+SEARCH_WEIGHTS = (10.0, 1.0, 5.0, 5.0, 2.0, 2.0)
+
+# the columns `SQLiteDb._query_instances()` can return and how they are
+# selected, {0} is the table of the instances
+INSTANCE_COLUMNS = {
+    "calendar": "{0}.calendar",
+    "href": "events.href",
+    "ref": "{0}.ref",
+    "etag": "events.etag",
+    "dtstart": "{0}.dtstart",
+    "dtend": "{0}.dtend",
+    "dtype": "{0}.dtype",
+    "uid": "events.uid",
+    "summary": "search.summary",
+    "location": "search.location",
+    "status": "search.status",
+    "item": "events.item",
+}
+
 
 class EventType(IntEnum):
     DATE = 0
@@ -72,6 +128,8 @@ class SQLiteDb:
         combination should be unique.
     :param db_path: path where this sqlite database will be saved, if this is
         None, a place according to the XDG specifications will be chosen
+    :param paths: the paths of the calendars' vdirs, only needed to migrate
+        the etags cached by older versions (see `_migrate_to_13()`)
     """
 
     def __init__(
@@ -79,18 +137,50 @@ class SQLiteDb:
         calendars: Iterable[str],
         db_path: str | None,
         locale: LocaleConfiguration,
+        paths: Mapping[str, str] | None = None,
     ) -> None:
         assert db_path is not None
-        self.calendars: list[str] = list(calendars)
+        self._calendars: list[str] = list(calendars)
+        self._paths: Mapping[str, str] = paths or {}
+        # integer ids of the calendars in `calendars`, all other tables
+        # reference calendars (and events) by those
+        self._calendar_ids: dict[str, int] = {}
+        self._calendar_names: dict[int, str] = {}
         self.db_path = path.expanduser(db_path)
         self._create_dbdir()
         self.locale = locale
         self._at_once: bool = False
-        self.conn = sqlite3.connect(self.db_path)
+        # never ending events of the selected calendars, parsed for expanding
+        # them beyond the horizon, and their instances in recently queried
+        # time spans, see `_beyond_horizon()`
+        self._unbounded_version: tuple | None = None
+        self._unbounded: list[tuple[dict[str, Any], list[icalendar.cal.Event]]] = []
+        self._beyond: OrderedDict[tuple[dt.datetime, dt.datetime], dict[str, list[dict]]] = (
+            OrderedDict()
+        )
+        self.conn = sqlite3.connect(self.db_path, timeout=LOCK_TIMEOUT)
+        if self.db_path != ":memory:":
+            # with a write-ahead log readers never block (and are never
+            # blocked by) a writer, e.g., another khal process updating the db
+            self.conn.execute("PRAGMA journal_mode = WAL")
+        # needed so that the interval index is also cleaned up when rows get
+        # replaced by `INSERT OR REPLACE`
+        self.conn.execute("PRAGMA recursive_triggers = ON")
         self.cursor = self.conn.cursor()
+        self.cursor.execute("CREATE TABLE IF NOT EXISTS version (version INTEGER)")
+        self._check_table_version()
         self._create_default_tables()
         self._check_calendars_exists()
-        self._check_table_version()
+
+    @property
+    def calendars(self) -> list[str]:
+        """names of the calendars events are selected from"""
+        return self._calendars
+
+    @calendars.setter
+    def calendars(self, calendars: Iterable[str]) -> None:
+        self._calendars = list(calendars)
+        self._check_calendars_exists()
 
     @contextlib.contextmanager
     def at_once(self) -> Iterator["SQLiteDb"]:
@@ -105,6 +195,42 @@ class SQLiteDb:
         finally:
             self._at_once = False
 
+    @contextlib.contextmanager
+    def update_lock(self, timeout: float | None) -> Iterator[bool]:
+        """lock updating the db from the vdirs against other processes
+
+        This is an advisory lock, so that only one process updates (the same
+        calendars of) the db at a time, while the others wait for it.
+
+        :param timeout: how long to wait (in seconds) for another process to
+            finish updating, None means forever
+        :returns: (yields) True if the lock was acquired, False if another
+            process is still updating after `timeout`. The db can then still
+            be read, but might be outdated.
+        """
+        if fcntl is None or self.db_path == ":memory:":
+            yield True
+            return
+        with open(self.db_path + ".lock", "a") as lockfile:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(lockfile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        yield False
+                        return
+                    time.sleep(0.05)
+            try:
+                yield True
+            finally:
+                fcntl.flock(lockfile, fcntl.LOCK_UN)
+
+    def _transaction(self) -> contextlib.AbstractContextManager:
+        """like `at_once()`, but can also be used if we already are in one"""
+        return contextlib.nullcontext(self) if self._at_once else self.at_once()
+
     def _create_dbdir(self) -> None:
         """create the dbdir if it doesn't exist"""
         if self.db_path == ":memory:":
@@ -122,81 +248,295 @@ class SQLiteDb:
     def _check_table_version(self) -> None:
         """tests for current db Version
         if the table is still empty, insert db_version
+
+        If the db was created by an older version of khal, it is migrated, see
+        `_migrate()`. As the db only caches data from the vdirs, we otherwise
+        drop all tables and let them be rebuilt.
         """
         self.cursor.execute("SELECT version FROM version")
         result = self.cursor.fetchone()
         if result is None:
             self.cursor.execute("INSERT INTO version (version) VALUES (?)", (DB_VERSION,))
             self.conn.commit()
-        elif not result[0] == DB_VERSION:
+        elif result[0] < DB_VERSION and not self._migrate(result[0]):
+            logger.info(
+                f"{self.db_path} was created by an older version of khal, rebuilding the database"
+            )
+            self._drop_tables()
+            self.cursor.execute("UPDATE version SET version = ?", (DB_VERSION,))
+            self.conn.commit()
+        elif result[0] > DB_VERSION:
             raise OutdatedDbVersionError(
                 str(self.db_path) + " is probably an invalid or outdated database.\n"
                 "You should consider removing it and running khal again."
             )
 
-    def _create_default_tables(self) -> None:
-        """creates version and calendar tables and inserts table version number"""
-        self.cursor.execute("CREATE TABLE IF NOT EXISTS version (version INTEGER)")
-        logger.debug("created version table")
+    def _migrate(self, version: int) -> bool:
+        """migrate the db from `version` to `DB_VERSION` in place
+
+        All steps in `MIGRATIONS` from `version` on are applied in a single
+        transaction. Steps keep as much of the cached data as possible, events
+        whose derived data changed are marked to be updated from their vdir
+        (see `_invalidate()`).
+
+        :returns: False if there is no way to migrate from `version` or a step
+            failed, the db is unchanged then
+        """
+        steps = range(version + 1, DB_VERSION + 1)
+        if any(step not in MIGRATIONS for step in steps):
+            return False
+        logger.info(f"migrating {self.db_path} from version {version} to {DB_VERSION}")
+        self.cursor.execute("BEGIN")
+        try:
+            for step in steps:
+                logger.debug(f"migrating {self.db_path} to version {step}")
+                MIGRATIONS[step](self)
+            self.cursor.execute("UPDATE version SET version = ?", (DB_VERSION,))
+        except Exception as error:
+            self.conn.rollback()
+            logger.warning(f"failed to migrate {self.db_path}: {error}")
+            return False
+        self.conn.commit()
+        return True
+
+    def _drop_tables(self) -> None:
+        """drop all tables but `version`"""
+        # virtual tables need to go first, they also remove their shadow tables
+        for virtual in (True, False):
+            self.cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name != 'version' "
+                "AND (sql LIKE 'CREATE VIRTUAL TABLE%') = ?",
+                (virtual,),
+            )
+            for (table,) in self.cursor.fetchall():
+                self.cursor.execute(f'DROP TABLE IF EXISTS "{table}"')
 
+    def _create_default_tables(self) -> None:
+        """creates calendars, events and recurrence instance tables"""
         self.cursor.execute("""CREATE TABLE IF NOT EXISTS calendars (
+            id INTEGER PRIMARY KEY,
             calendar TEXT NOT NULL UNIQUE,
             resource TEXT NOT NULL,
-            ctag TEXT
+            ctag TEXT,
+            horizon_start INT,
+            horizon_end INT,
+            settings TEXT
             )""")
         self.cursor.execute("""CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY,
                 href TEXT NOT NULL,
-                calendar TEXT NOT NULL,
+                calendar INTEGER NOT NULL REFERENCES calendars( id ),
                 sequence INT,
                 etag TEXT,
                 item TEXT,
-                primary key (href, calendar)
+                unbounded INT NOT NULL DEFAULT 0,
+                uid TEXT,
+                default_tz INT NOT NULL DEFAULT 0,
+                UNIQUE (href, calendar)
                 );""")
-        self.cursor.execute("""CREATE TABLE IF NOT EXISTS recs_loc (
-            dtstart INT NOT NULL,
-            dtend INT NOT NULL,
-            href TEXT NOT NULL REFERENCES events( href ),
-            rec_inst TEXT NOT NULL,
-            ref TEXT NOT NULL,
-            dtype INT NOT NULL,
-            calendar TEXT NOT NULL,
-            primary key (href, rec_inst, calendar)
-            );""")
-        self.cursor.execute("""CREATE TABLE IF NOT EXISTS recs_float (
-            dtstart INT NOT NULL,
-            dtend INT NOT NULL,
-            href TEXT NOT NULL REFERENCES events( href ),
-            rec_inst TEXT NOT NULL,
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS events_uid ON events (uid)")
+        for table in ["recs_loc", "recs_float"]:
+            self.cursor.execute(f"""CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY,
+                dtstart INT NOT NULL,
+                dtend INT NOT NULL,
+                event INTEGER NOT NULL REFERENCES events( id ),
+                rec_inst TEXT NOT NULL,
+                ref TEXT NOT NULL,
+                dtype INT NOT NULL,
+                calendar INTEGER NOT NULL REFERENCES calendars( id ),
+                UNIQUE (event, rec_inst)
+                );""")
+            self._create_interval_index(table)
+        # besides the text to search in, each VEVENT's STATUS is stored, so
+        # that `get_instances()` does not need to parse any events
+        self.cursor.execute(f"""CREATE TABLE IF NOT EXISTS search (
+            id INTEGER PRIMARY KEY,
+            event INTEGER NOT NULL REFERENCES events( id ),
             ref TEXT NOT NULL,
-            dtype INT NOT NULL,
-            calendar TEXT NOT NULL,
-            primary key (href, rec_inst, calendar)
+            {", ".join(f"{field} TEXT NOT NULL" for field in SEARCH_FIELDS)},
+            status TEXT NOT NULL DEFAULT '',
+            UNIQUE (event, ref)
             );""")
+        self._create_search_index()
         self.conn.commit()
 
+    def _create_interval_index(self, table: str) -> None:
+        """create an interval index over `table`'s dtstart and dtend
+
+        The index is an R*Tree, which makes range queries O(log n + k). It is
+        kept in sync with `table` by triggers. R*Tree coordinates are only
+        32 bit floats (and rounded outwards), therefore queries need to check
+        the exact values in `table` as well.
+        """
+        index = f"{table}_index"
+        try:
+            self.cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING rtree(id, dtstart, dtend)"
+            )
+        except sqlite3.OperationalError:
+            # sqlite was compiled without the R*Tree module
+            logger.debug("R*Tree module not available, falling back to a b-tree index")
+            self.cursor.execute(f"""CREATE TABLE IF NOT EXISTS {index} (
+                id INTEGER PRIMARY KEY,
+                dtstart INT NOT NULL,
+                dtend INT NOT NULL
+                );""")
+            self.cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {index}_dtstart ON {index} (dtstart, dtend)"
+            )
+        self.cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_insert
+            AFTER INSERT ON {table} BEGIN
+                INSERT INTO {index} (id, dtstart, dtend) VALUES
+                (new.id, min(new.dtstart, new.dtend), max(new.dtstart, new.dtend));
+            END;""")
+        self.cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_delete
+            AFTER DELETE ON {table} BEGIN
+                DELETE FROM {index} WHERE id = old.id;
+            END;""")
+        self.cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_update
+            AFTER UPDATE OF dtstart, dtend ON {table} BEGIN
+                UPDATE {index} SET
+                dtstart = min(new.dtstart, new.dtend), dtend = max(new.dtstart, new.dtend)
+                WHERE id = new.id;
+            END;""")
+
+    def _create_search_index(self) -> None:
+        """create a full text index over the `search` table
+
+        The index is an FTS5 table using `search` as external content, it is
+        kept in sync by triggers. If sqlite was compiled without FTS5, there
+        is no index and `search()` falls back to substring matching.
+        """
+        fields = ", ".join(SEARCH_FIELDS)
+        new = ", ".join(f"new.{field}" for field in SEARCH_FIELDS)
+        old = ", ".join(f"old.{field}" for field in SEARCH_FIELDS)
+        try:
+            self.cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING "
+                f"fts5({fields}, content='search', content_rowid='id')"
+            )
+        except sqlite3.OperationalError:
+            logger.debug("FTS5 module not available, searching without an index")
+            self._fulltext = False
+            return
+        self._fulltext = True
+        self.cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS search_insert
+            AFTER INSERT ON search BEGIN
+                INSERT INTO search_index (rowid, {fields}) VALUES (new.id, {new});
+            END;""")
+        self.cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS search_delete
+            AFTER DELETE ON search BEGIN
+                INSERT INTO search_index (search_index, rowid, {fields})
+                VALUES ('delete', old.id, {old});
+            END;""")
+        self.cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS search_update
+            AFTER UPDATE ON search BEGIN
+                INSERT INTO search_index (search_index, rowid, {fields})
+                VALUES ('delete', old.id, {old});
+                INSERT INTO search_index (rowid, {fields}) VALUES (new.id, {new});
+            END;""")
+
     def _check_calendars_exists(self) -> None:
         """make sure an entry for the current calendar exists in `calendar`
         table
         """
         for cal in self.calendars:
-            self.cursor.execute("""SELECT count(*) FROM calendars WHERE calendar = ?;""", (cal,))
-            result = self.cursor.fetchone()
+            self._calendar_id(cal)
+        self._check_settings()
+
+    def _settings(self) -> str:
+        """the settings the cached data of events depends on, as stored in the
+        db"""
+        return f"default_timezone={self.locale['default_timezone']}"
+
+    def _check_settings(self) -> None:
+        """make sure the cached data of the current calendars was derived with
+        the current settings
+
+        If the settings changed since, only the events whose cached data
+        depends on them (i.e., with times in a timezone we did not understand
+        and therefore localized in the default timezone) are marked to be
+        updated from their vdirs, see `_invalidate()`.
+        """
+        settings = self._settings()
+        sql_s = (
+            "SELECT id, settings FROM calendars WHERE (settings IS NULL OR settings != ?) "
+            f"AND id IN ({self._selected()});"
+        )
+        changed = self.sql_ex(sql_s, (settings,))
+        if not changed:
+            return
+        with self._transaction():
+            for calendar_id, old in changed:
+                if old is not None:
+                    logger.info(
+                        f"settings of {self._calendar_names[calendar_id]} changed, updating "
+                        "the affected events"
+                    )
+                    _invalidate(self, f"calendar = {calendar_id} AND default_tz = 1")
+            self.sql_many(
+                "UPDATE calendars SET settings = ? WHERE id = ?;",
+                ((settings, calendar_id) for calendar_id, _ in changed),
+            )
 
-            if result[0] != 0:
-                logger.debug(f"tables for calendar {cal} exist")
-            else:
-                sql_s = "INSERT INTO calendars (calendar, resource) VALUES (?, ?);"
-                stuple = (cal, "")
-                self.sql_ex(sql_s, stuple)
+    def _calendar_id(self, calendar: str) -> int:
+        """return the id of `calendar`, creating its entry in the `calendars`
+        table if needed"""
+        if calendar in self._calendar_ids:
+            return self._calendar_ids[calendar]
+        self.cursor.execute("SELECT id FROM calendars WHERE calendar = ?;", (calendar,))
+        result = self.cursor.fetchone()
+        if result is not None:
+            logger.debug(f"tables for calendar {calendar} exist")
+            calendar_id = result[0]
+        else:
+            sql_s = "INSERT INTO calendars (calendar, resource) VALUES (?, ?);"
+            self.sql_ex(sql_s, (calendar, ""))
+            assert self.cursor.lastrowid is not None
+            calendar_id = self.cursor.lastrowid
+        self._calendar_ids[calendar] = calendar_id
+        self._calendar_names[calendar_id] = calendar
+        return calendar_id
+
+    def _selected(self) -> str:
+        """the ids of the selected calendars, to be used in an SQL `IN` clause
+
+        The ids are integers, they can therefore be part of the statement
+        itself instead of being bound one parameter per calendar.
+        """
+        return ", ".join(str(self._calendar_ids[cal]) for cal in self.calendars)
 
     def sql_ex(self, statement: str, stuple: tuple) -> list:
-        """wrapper for sql statements, does a "fetchall" """
+        """wrapper for sql statements, does a "fetchall" (for statements
+        returning rows)"""
         self.cursor.execute(statement, stuple)
-        result = self.cursor.fetchall()
+        result = self.cursor.fetchall() if self.cursor.description is not None else []
         if not self._at_once:
             self.conn.commit()
         return result
 
+    def sql_iter(self, statement: str, stuple: tuple) -> Iterator[tuple]:
+        """wrapper for reading sql statements, yields the rows as they are
+        fetched from a cursor of their own instead of fetching them all at
+        once
+
+        The tables read must not be written to before all rows are consumed.
+        """
+        cursor = self.conn.execute(statement, stuple)
+        try:
+            while rows := cursor.fetchmany(256):
+                yield from rows
+        finally:
+            cursor.close()
+
+    def sql_many(self, statement: str, stuples: Iterable[tuple]) -> None:
+        """wrapper for sql statements that are executed once per item of
+        `stuples`, used for writing"""
+        self.cursor.executemany(statement, stuples)
+        if not self._at_once:
+            self.conn.commit()
+
     def update(
         self,
         vevent_str: str,
@@ -222,36 +562,45 @@ class SQLiteDb:
         """
         assert calendar is not None
         assert href is not None
-        ical = cal_from_ics(vevent_str)
-        check_for_errors(ical, calendar, href)
-        if not assert_only_one_uid(ical):
-            logger.warning(
-                f"The .ics file at {calendar}/{href} contains multiple UIDs.\n"
-                "This should not occur in vdir .ics files.\n"
-                "If you didn't edit the file by hand, please report a bug "
-                "at https://github.com/pimutils/khal/issues .\n"
-                "If you want to import it, please use `khal import FILE`."
+        try:
+            expanded = expand_item(
+                vevent_str,
+                href,
+                calendar,
+                self.locale["default_timezone"],
+                self.get_window(calendar),
             )
-            raise NonUniqueUID
-        vevents = (
-            sanitize_vevent(c, self.locale["default_timezone"], href, calendar)
-            for c in ical.walk()
-            if c.name == "VEVENT"
-        )
-        # Need to delete the whole event in case we are updating a
-        # recurring event with an event which is either not recurring any
-        # more or has EXDATEs, as those would be left in the recursion
-        # tables. There are obviously better ways to achieve the same
-        # result.
-        self.delete(href, calendar=calendar)
-        for vevent in sorted(vevents, key=sort_vevent_key):
-            check_for_errors(vevent, calendar, href)
-            check_support(vevent, href, calendar)
-            self._update_impl(vevent, href, calendar)
-
-        sql_s = "INSERT INTO events (item, etag, href, calendar) VALUES (?, ?, ?, ?);"
-        stuple = (vevent_str, etag, href, calendar)
-        self.sql_ex(sql_s, stuple)
+        except Exception:
+            # don't keep an older version of an event around we cannot read
+            # anymore
+            self.delete(href, calendar=calendar)
+            raise
+        self.update_expanded(vevent_str, href, etag, calendar, expanded)
+
+    def update_expanded(
+        self,
+        vevent_str: str,
+        href: str,
+        etag: str,
+        calendar: str,
+        expanded: "ExpandedItem",
+    ) -> None:
+        """insert a new or update an existing event into the db, which has
+        already been expanded by `expand_item()`
+        """
+        instances, unbounded, search_rows, uid, default_tz = expanded
+        with self._transaction():
+            # Need to delete the whole event in case we are updating a
+            # recurring event with an event which is either not recurring any
+            # more or has EXDATEs, as those would be left in the recursion
+            # tables. There are obviously better ways to achieve the same
+            # result.
+            self.delete(href, calendar=calendar)
+            event_id = self._insert_event(
+                vevent_str, etag, href, calendar, unbounded, uid, default_tz
+            )
+            self._insert_instances(instances, event_id, calendar)
+            self._insert_search_rows(search_rows, event_id)
 
     def update_vcf_dates(
         self, vevent_str: str, href: str, etag: str = "", calendar: str | None = None
@@ -275,6 +624,7 @@ class SQLiteDb:
         assert href is not None
         # Delete all event entries for this contact
         self.deletelike(href + "%", calendar=calendar)
+        window = self.get_window(calendar)
         ical = cal_from_ics(vevent_str)
         vcard = ical.walk()[0]
         for key in vcard.keys():
@@ -327,94 +677,317 @@ class SQLiteDb:
                 vevent.add("summary", f"{name}'s {description}")
                 vevent.add("uid", href + key)
                 vevent_str = vevent.to_ical().decode("utf-8")
-                self._update_impl(vevent, href + key, calendar)
-                sql_s = "INSERT INTO events (item, etag, href, calendar) VALUES (?, ?, ?, ?);"
-                stuple = (vevent_str, etag, href + key, calendar)
                 try:
-                    self.sql_ex(sql_s, stuple)
+                    event_id = self._insert_event(
+                        vevent_str, etag, href + key, calendar, is_unbounded(vevent), href + key
+                    )
                 except sqlite3.IntegrityError as error:
                     raise UpdateFailed(
                         "Database integrity error creating birthday event "
                         f"on {date} for contact {name} (UID: {uuid}): "
                         f"{error}"
                     )
+                self._update_impl(vevent, href + key, event_id, calendar, window)
+                self._insert_search_rows([get_search_row(vevent)], event_id)
 
-    def _update_impl(self, vevent: icalendar.cal.Event, href: str, calendar: str) -> None:
-        """insert `vevent` into the database
+    def _update_impl(
+        self,
+        vevent: icalendar.cal.Event,
+        href: str,
+        event_id: int,
+        calendar: str,
+        window: tuple[dt.datetime, dt.datetime] | None = None,
+    ) -> None:
+        """expand `vevent`'s recurrence rules (if needed) and insert all
+        instances in the respective tables
 
-        expand `vevent`'s recurrence rules (if needed) and insert all instance
-        in the respective tables
-        than insert non-recurring and original recurring (those with an RRULE
-        property) events into table `events`
+        :param window: only expand never ending recurrence rules in this
+            window, see `get_window()`
         """
-        # TODO FIXME this function is a steaming pile of shit
-        rec_id = vevent.get(RECURRENCE_ID)
-        if rec_id is None:
-            rrange = None
-        else:
-            rrange = rec_id.params.get("RANGE")
+        instances: Instances = {"recs_loc": {}, "recs_float": {}}
+        expand_instances(vevent, href, instances, window)
+        self._insert_instances(instances, event_id, calendar)
 
-        # testing on datetime.date won't work as datetime is a child of date
-        if not isinstance(vevent["DTSTART"].dt, dt.datetime):
-            dtype = EventType.DATE
-        else:
-            dtype = EventType.DATETIME
-        if ("TZID" in vevent["DTSTART"].params and dtype == EventType.DATETIME) or getattr(
-            vevent["DTSTART"].dt, "tzinfo", None
-        ):
-            recs_table = "recs_loc"
-        else:
-            recs_table = "recs_float"
+    def _insert_event(
+        self,
+        vevent_str: str,
+        etag: str,
+        href: str,
+        calendar: str,
+        unbounded: bool,
+        uid: str | None,
+        default_tz: bool = False,
+    ) -> int:
+        """insert a row into the `events` table
+
+        :param default_tz: if any times of the event were localized in the
+            default timezone
+        :returns: the id of the new row
+        """
+        sql_s = (
+            "INSERT INTO events (item, etag, href, calendar, unbounded, uid, default_tz) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?);"
+        )
+        stuple = (vevent_str, etag, href, self._calendar_id(calendar), unbounded, uid, default_tz)
+        self.sql_ex(sql_s, stuple)
+        event_id = self.cursor.lastrowid
+        assert event_id is not None
+        return event_id
 
-        thisandfuture = rrange == THISANDFUTURE
-        if thisandfuture:
-            start_shift, duration = calc_shift_deltas(vevent)
-            start_shift_seconds = start_shift.days * 3600 * 24 + start_shift.seconds
-            duration_seconds = duration.days * 3600 * 24 + duration.seconds
-
-        dtstartend = expand_vevent(vevent, href)
-        if not dtstartend:
-            # Does this event even have dates? Technically it is possible for
-            # events to be empty/non-existent by deleting all their recurrences
-            # through EXDATE.
-            return
+    def _insert_instances(
+        self, instances: "Instances", event_id: int, calendar: str, replace: bool = True
+    ) -> None:
+        """
+        :param replace: replace instances already stored, otherwise keep them
+        """
+        calendar_id = self._calendar_id(calendar)
+        for table, rows in instances.items():
+            if not rows:
+                continue
+            recs_sql_s = (
+                f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO {table} "
+                "(dtstart, dtend, event, ref, dtype, rec_inst, calendar)"
+                "VALUES (?, ?, ?, ?, ?, ?, ?);"
+            )
+            self.sql_many(
+                recs_sql_s,
+                (
+                    (dbstart, dbend, event_id, ref, dtype, rec_inst, calendar_id)
+                    for rec_inst, (dbstart, dbend, ref, dtype) in rows.items()
+                ),
+            )
 
-        for dtstart, dtend in dtstartend:
-            if dtype == EventType.DATE:
-                dbstart = utils.to_unix_time(dtstart)
-                dbend = utils.to_unix_time(dtend)
-            else:
-                dbstart = utils.to_unix_time(dtstart)
-                dbend = utils.to_unix_time(dtend)
+    def _insert_search_rows(self, search_rows: list[tuple[str, ...]], event_id: int) -> None:
+        fields = ", ".join(SEARCH_FIELDS)
+        sql_s = (
+            f"INSERT OR REPLACE INTO search (event, ref, {fields}, status) "
+            f"VALUES (?, {', '.join('?' * (len(SEARCH_FIELDS) + 2))});"
+        )
+        self.sql_many(sql_s, ((event_id,) + row for row in search_rows))
 
-            if rec_id is not None:
-                ref = rec_inst = str(utils.to_unix_time(rec_id.dt))
-            else:
-                rec_inst = str(dbstart)
-                ref = PROTO
-
-            if thisandfuture:
-                recs_sql_s = (
-                    f"UPDATE {recs_table} SET dtstart = rec_inst + ?, dtend = rec_inst + ?, "
-                    "ref = ? WHERE rec_inst >= ? AND href = ? AND calendar = ?;"
-                )
-                stuple_f = (
-                    start_shift_seconds,
-                    start_shift_seconds + duration_seconds,
-                    ref,
-                    rec_inst,
-                    href,
-                    calendar,
-                )
-                self.sql_ex(recs_sql_s, stuple_f)
-            else:
-                recs_sql_s = (
-                    f"INSERT OR REPLACE INTO {recs_table} "
-                    "(dtstart, dtend, href, ref, dtype, rec_inst, calendar)"
-                    "VALUES (?, ?, ?, ?, ?, ?, ?);"
-                )
-                stuple_n = (dbstart, dbend, href, ref, dtype, rec_inst, calendar)
-                self.sql_ex(recs_sql_s, stuple_n)
+    def _get_horizon(self, calendar: str) -> tuple[float, float]:
+        """return the time span (as unix timestamps) in which instances of
+        never ending recurring events of `calendar` are stored
+        """
+        sql_s = "SELECT horizon_start, horizon_end FROM calendars WHERE calendar = ?;"
+        result = self.sql_ex(sql_s, (calendar,))
+        if result and result[0][0] is not None:
+            return result[0]
+        now = utils.to_unix_time(dt.datetime.now())
+        horizon = (now - HORIZON.total_seconds(), now + HORIZON.total_seconds())
+        self._set_horizon(horizon, calendar)
+        return horizon
+
+    def _set_horizon(self, horizon: tuple[float, float], calendar: str) -> None:
+        sql_s = "UPDATE calendars SET horizon_start = ?, horizon_end = ? WHERE calendar = ?;"
+        self.sql_ex(sql_s, horizon + (calendar,))
+
+    def get_window(self, calendar: str) -> tuple[dt.datetime, dt.datetime]:
+        """return the horizon of `calendar` as naive datetimes, suitable for
+        `khal.icalendar.expand()`
+
+        Recurrence rules are expanded in the events' local time, the window
+        is therefore a day larger than the horizon on either side.
+        """
+        return _window(*self._get_horizon(calendar))
+
+    def in_horizon(self, start: float, end: float) -> bool:
+        """check if all instances of never ending recurring events of the
+        selected calendars between `start` and `end` (unix timestamps) are
+        stored in the db"""
+        sql_s = (
+            f"SELECT count(*) FROM calendars WHERE id IN ({self._selected()}) "
+            "AND (horizon_start > ? OR horizon_end < ?);"
+        )
+        return self.sql_ex(sql_s, (start, end))[0][0] == 0
+
+    def _extended_horizon(self, calendar: str) -> tuple[float, float] | None:
+        """return the horizon `calendar` should have by now, None if it is
+        still good enough"""
+        sql_s = "SELECT horizon_start, horizon_end FROM calendars WHERE calendar = ?;"
+        result = self.sql_ex(sql_s, (calendar,))
+        if not result or result[0][0] is None:
+            # nothing has been expanded within a horizon yet
+            return None
+        horizon_start, horizon_end = result[0]
+        now = utils.to_unix_time(dt.datetime.now())
+        lowest = now - HORIZON.total_seconds()
+        highest = now + HORIZON.total_seconds()
+        slack = HORIZON_STEP.total_seconds()
+        if horizon_start <= lowest + slack and horizon_end >= highest - slack:
+            return None
+        return min(horizon_start, lowest), max(horizon_end, highest)
+
+    def horizon_outdated(self) -> bool:
+        """check if `extend_horizon()` needs to be called"""
+        return any(self._extended_horizon(calendar) for calendar in self.calendars)
+
+    def extend_horizon(self) -> None:
+        """move the horizons of the selected calendars along with the current
+        date
+
+        Once less than `HORIZON` minus `HORIZON_STEP` of a horizon is left, it
+        is extended to `HORIZON` from today again. Only the instances of never
+        ending recurring events within the newly covered time span are
+        inserted, those already stored are kept.
+
+        This should only be called while holding the `update_lock()`.
+        """
+        for calendar in self.calendars:
+            extended = self._extended_horizon(calendar)
+            if extended is None:
+                continue
+            horizon_start, horizon_end = self._get_horizon(calendar)
+            windows = []
+            if extended[0] < horizon_start:
+                windows.append(_window(extended[0], horizon_start))
+            if extended[1] > horizon_end:
+                windows.append(_window(horizon_end, extended[1]))
+            logger.debug(f"extending the horizon of {calendar}")
+            with self._transaction():
+                self._expand_unbounded(calendar, windows)
+                self._set_horizon(extended, calendar)
+
+    def _expand_unbounded(
+        self, calendar: str, windows: list[tuple[dt.datetime, dt.datetime]]
+    ) -> None:
+        """insert the instances of all never ending recurring events of
+        `calendar` within each of `windows`, which are not stored yet"""
+        sql_s = "SELECT id, href, item FROM events WHERE calendar = ? AND unbounded = 1;"
+        for event_id, href, item in self.sql_ex(sql_s, (self._calendar_id(calendar),)):
+            vevents, _ = parse_item(item, href, calendar, self.locale["default_timezone"])
+            for window in windows:
+                # THISANDFUTURE overrides shift all instances found so far,
+                # those of another window would be shifted twice
+                instances: Instances = {"recs_loc": {}, "recs_float": {}}
+                for vevent in vevents:
+                    expand_instances(vevent, href, instances, window)
+                self._insert_instances(instances, event_id, calendar, replace=False)
+
+    def _query_instances(
+        self, table: str, start: float, end: float, columns: tuple[str, ...]
+    ) -> Iterator[tuple]:
+        """return the `columns` (see INSTANCE_COLUMNS, including "dtstart") of
+        the instances in `table` between `start` and `end` (unix timestamps),
+        sorted by start
+
+        The rows are streamed from the db, if any of them lie beyond the
+        horizon, the instances of never ending recurring events are expanded
+        in memory instead, see `_beyond_horizon()`.
+        """
+        floating = table == "recs_float"
+        lt = "<" if floating else "<="
+        gt = ">" if floating else ">="
+        fields = [INSTANCE_COLUMNS[column] for column in columns]
+        beyond = None if self.in_horizon(start, end) else self._beyond_horizon(table, start, end)
+        joins = ""
+        if any(field.startswith(("events.", "search.")) for field in fields):
+            joins += f"JOIN events ON {table}.event = events.id "
+        if any(field.startswith("search.") for field in fields):
+            joins += (
+                f"LEFT JOIN search ON search.event = {table}.event AND search.ref = {table}.ref "
+            )
+        excluded = ""
+        if beyond is not None and self._unbounded:
+            # their instances stored in the db are expanded again as well
+            ids = ", ".join(str(event["id"]) for event, _ in self._unbounded)
+            excluded = f" AND {table}.event NOT IN ({ids})"
+        sql_s = (
+            f"SELECT {', '.join(fields).format(table)} "
+            f"FROM {table}_index JOIN {table} ON {table}_index.id = {table}.id {joins}WHERE "
+            # the R*Tree only narrows down the candidates, its values are rounded
+            f"{table}_index.dtstart <= ? AND {table}_index.dtend >= ? AND "
+            f"({table}.dtstart >= ? AND {table}.dtstart {lt} ? OR "
+            f"{table}.dtend > ? AND {table}.dtend <= ? OR "
+            f"{table}.dtstart <= ? AND {table}.dtend {gt} ?) AND "
+            f"{table}.calendar IN ({self._selected()}){excluded} "
+            f"ORDER BY {table}.dtstart"
+        )
+        stuple = (end, start, start, end, start, end, start, end)
+        rows = self.sql_iter(sql_s, stuple)
+        if beyond is None:
+            return rows
+        expanded = (tuple(instance[column] for column in columns) for instance in beyond)
+        index = columns.index("dtstart")
+        return heapq.merge(rows, expanded, key=lambda row: row[index])
+
+    def _beyond_horizon(self, table: str, start: float, end: float) -> list[dict[str, Any]]:
+        """return the instances of never ending recurring events of the
+        selected calendars in `table` between `start` and `end` (unix
+        timestamps), sorted by start, as mappings of INSTANCE_COLUMNS
+
+        They are expanded in memory, without writing them to the db. The
+        events stay parsed and their instances in the last
+        `BEYOND_CACHE_SIZE` time spans expanded, until the db changes.
+        """
+        version = (
+            self.conn.execute("PRAGMA data_version").fetchone()[0],
+            self.conn.total_changes,
+            tuple(self.calendars),
+        )
+        if version != self._unbounded_version:
+            self._unbounded = list(self._parse_unbounded())
+            self._beyond.clear()
+            self._unbounded_version = version
+        window = _window(start, end)
+        if window in self._beyond:
+            self._beyond.move_to_end(window)
+        else:
+            logger.debug("expanding never ending events beyond the horizon")
+            expanded: dict[str, list[dict]] = {"recs_loc": [], "recs_float": []}
+            for event, vevents in self._unbounded:
+                instances: Instances = {"recs_loc": {}, "recs_float": {}}
+                for vevent in vevents:
+                    expand_instances(vevent, event["href"], instances, window)
+                for name, rows in instances.items():
+                    expanded[name].extend(
+                        {
+                            **event,
+                            **event["search"].get(ref, {}),
+                            "dtstart": dbstart,
+                            "dtend": dbend,
+                            "ref": ref,
+                            "dtype": dtype,
+                        }
+                        for dbstart, dbend, ref, dtype in rows.values()
+                    )
+            for table_instances in expanded.values():
+                table_instances.sort(key=lambda instance: instance["dtstart"])
+            self._beyond[window] = expanded
+            if len(self._beyond) > BEYOND_CACHE_SIZE:
+                self._beyond.popitem(last=False)
+        floating = table == "recs_float"
+        return [
+            instance
+            for instance in self._beyond[window][table]
+            if overlaps(instance["dtstart"], instance["dtend"], start, end, floating)
+        ]
+
+    def _parse_unbounded(self) -> Iterator[tuple[dict[str, Any], list[icalendar.cal.Event]]]:
+        """yield the columns of each never ending recurring event of the
+        selected calendars (see `_beyond_horizon()`) and its VEVENTs"""
+        sql_s = (
+            "SELECT id, calendar, href, etag, uid, item FROM events "
+            f"WHERE unbounded = 1 AND calendar IN ({self._selected()});"
+        )
+        for event_id, calendar, href, etag, uid, item in self.sql_ex(sql_s, ()):
+            name = self._calendar_names[calendar]
+            vevents, _ = parse_item(item, href, name, self.locale["default_timezone"])
+            search_columns = ("ref",) + SEARCH_FIELDS + ("status",)
+            search = {}
+            for vevent in vevents:
+                row = dict(zip(search_columns, get_search_row(vevent), strict=True))
+                search[row.pop("ref")] = row
+            event = {
+                "id": event_id,
+                "calendar": calendar,
+                "href": href,
+                "etag": etag,
+                "uid": uid,
+                "item": item,
+                "search": search,
+            }
+            yield event, vevents
 
     def get_ctag(self, calendar: str) -> str | None:
         stuple = (calendar,)
@@ -441,7 +1014,7 @@ class SQLiteDb:
         """
         sql_s = "SELECT etag FROM events WHERE href = ? AND calendar = ?;"
         try:
-            etag = self.sql_ex(sql_s, (href, calendar))[0][0]
+            etag = self.sql_ex(sql_s, (href, self._calendar_id(calendar)))[0][0]
             return etag
         except IndexError:
             return None
@@ -453,12 +1026,20 @@ class SQLiteDb:
         :param etag: only there for compatibility with vdirsyncer's Storage,
                      we always delete
         """
+        self.delete_many([href], calendar=calendar)
+
+    def delete_many(self, hrefs: Iterable[str], calendar: str = "") -> None:
+        """removes all events with one of `hrefs` from the db"""
         assert calendar != ""
-        for table in ["recs_loc", "recs_float"]:
-            sql_s = f"DELETE FROM {table} WHERE href = ? AND calendar = ?;"
-            self.sql_ex(sql_s, (href, calendar))
-        sql_s = "DELETE FROM events WHERE href = ? AND calendar = ?;"
-        self.sql_ex(sql_s, (href, calendar))
+        calendar_id = self._calendar_id(calendar)
+        stuples = [(href, calendar_id) for href in hrefs]
+        for table in ["recs_loc", "recs_float", "search"]:
+            sql_s = (
+                f"DELETE FROM {table} WHERE event = "
+                "(SELECT id FROM events WHERE href = ? AND calendar = ?);"
+            )
+            self.sql_many(sql_s, stuples)
+        self.sql_many("DELETE FROM events WHERE href = ? AND calendar = ?;", stuples)
 
     def deletelike(self, href: str, etag: Any = None, calendar: str = "") -> None:
         """
@@ -470,91 +1051,118 @@ class SQLiteDb:
                      we always delete
         """
         assert calendar != ""
-        for table in ["recs_loc", "recs_float"]:
-            sql_s = f"DELETE FROM {table} WHERE href LIKE ? AND calendar = ?;"
-            self.sql_ex(sql_s, (href, calendar))
+        stuple = (href, self._calendar_id(calendar))
+        for table in ["recs_loc", "recs_float", "search"]:
+            sql_s = (
+                f"DELETE FROM {table} WHERE event IN "
+                "(SELECT id FROM events WHERE href LIKE ? AND calendar = ?);"
+            )
+            self.sql_ex(sql_s, stuple)
         sql_s = "DELETE FROM events WHERE href LIKE ? AND calendar = ?;"
-        self.sql_ex(sql_s, (href, calendar))
+        self.sql_ex(sql_s, stuple)
+
+    def find_by_uid(self, uid: str) -> list[tuple[str, str, str]]:
+        """find the events with `uid` in all calendars
+
+        :returns: list of (calendar, href, etag)
+        """
+        sql_s = "SELECT calendar, href, etag FROM events WHERE uid = ? AND calendar IN ({0});"
+        result = self.sql_ex(sql_s.format(self._selected()), (uid,))
+        return sorted(
+            (self._calendar_names[calendar], href, etag) for calendar, href, etag in result
+        )
 
     def list(self, calendar: str) -> list[tuple[str, str]]:
         """list all events in `calendar`
 
-        used for testing
         :returns: list of (href, etag)
         """
         sql_s = "SELECT href, etag FROM events WHERE calendar = ?;"
-        return list(set(self.sql_ex(sql_s, (calendar,))))
+        return self.sql_ex(sql_s, (self._calendar_id(calendar),))
+
+    def get_spans(
+        self, hrefs: Iterable[str], calendar: str, prefix: bool = False
+    ) -> Iterable[tuple[int, int, bool]]:
+        """return the earliest start and the latest end (as unix timestamps) of
+        the instances of `hrefs`, separately for localized and floating ones
+
+        :param prefix: also include events whose href starts with one of
+            `hrefs`, like the events of birthday calendars
+        :returns: (start, end, floating) for each kind of instances found
+        """
+        condition = "href LIKE ? || '%'" if prefix else "href = ?"
+        hrefs = tuple(hrefs)
+        calendar_id = self._calendar_id(calendar)
+        for table, floating in [("recs_loc", False), ("recs_float", True)]:
+            sql_s = (
+                f"SELECT MIN(dtstart), MAX(dtend) FROM {table} WHERE event IN "
+                f"(SELECT id FROM events WHERE {condition} AND calendar = ?)"
+            )
+            spans = [self.sql_ex(sql_s, (href, calendar_id))[0] for href in hrefs]
+            spans = [span for span in spans if span[0] is not None]
+            if spans:
+                yield min(start for start, _ in spans), max(end for _, end in spans), floating
 
     def get_localized_calendars(self, start: dt.datetime, end: dt.datetime) -> Iterable[str]:
         assert start.tzinfo is not None
         assert end.tzinfo is not None
         start_u = utils.to_unix_time(start)
         end_u = utils.to_unix_time(end)
-        sql_s = (
-            "SELECT events.calendar FROM "
-            "recs_loc JOIN events ON "
-            "recs_loc.href = events.href AND "
-            "recs_loc.calendar = events.calendar WHERE "
-            "(dtstart >= ? AND dtstart <= ? OR "
-            "dtend > ? AND dtend <= ? OR "
-            "dtstart <= ? AND dtend >= ?) AND events.calendar in ({0}) "
-            "ORDER BY dtstart"
-        )
-        stuple = tuple([start_u, end_u, start_u, end_u, start_u, end_u] + list(self.calendars))  # type: ignore
-        result = self.sql_ex(sql_s.format(",".join(["?"] * len(self.calendars))), stuple)
-        for calendar in result:
-            yield calendar[0]  # result is always an iterable, even if getting only one item
+        for calendar, _ in self._query_instances(
+            "recs_loc", start_u, end_u, ("calendar", "dtstart")
+        ):
+            yield self._calendar_names[calendar]
 
     def get_localized(self, start: dt.datetime, end: dt.datetime) -> Iterable[EventTuple]:
         assert start.tzinfo is not None
         assert end.tzinfo is not None
         start_timestamp = utils.to_unix_time(start)
         end_timestamp = utils.to_unix_time(end)
-        sql_s = (
-            "SELECT item, recs_loc.href, dtstart, dtend, ref, etag, dtype, events.calendar "
-            "FROM recs_loc JOIN events ON "
-            "recs_loc.href = events.href AND "
-            "recs_loc.calendar = events.calendar WHERE "
-            "(dtstart >= ? AND dtstart <= ? OR "
-            "dtend > ? AND dtend <= ? OR "
-            "dtstart <= ? AND dtend >= ?) AND "
-            # insert as many "?" as we have configured calendars
-            f"events.calendar in ({','.join('?' * len(self.calendars))}) "
-            "ORDER BY dtstart"
-        )
-        stuple = (
-            start_timestamp,
-            end_timestamp,
-            start_timestamp,
-            end_timestamp,
-            start_timestamp,
-            end_timestamp,
-        ) + tuple(self.calendars)
-        result = self.sql_ex(sql_s, stuple)
-        for item, href, start_timestamp, end_timestamp, ref, etag, _dtype, calendar in result:
+        columns = ("item", "href", "dtstart", "dtend", "ref", "etag", "calendar")
+        result = self._query_instances("recs_loc", start_timestamp, end_timestamp, columns)
+        names = self._calendar_names
+        for item, href, start_timestamp, end_timestamp, ref, etag, calendar in result:
             start = dt.datetime.fromtimestamp(start_timestamp, pytz.UTC)
             end = dt.datetime.fromtimestamp(end_timestamp, pytz.UTC)
-            yield item, href, start, end, ref, etag, calendar
+            yield item, href, start, end, ref, etag, names[calendar]
 
     def get_floating_calendars(self, start: dt.datetime, end: dt.datetime) -> Iterable[str]:
         assert start.tzinfo is None
         assert end.tzinfo is None
         start_u = utils.to_unix_time(start)
         end_u = utils.to_unix_time(end)
-        sql_s = (
-            "SELECT events.calendar FROM "
-            "recs_float JOIN events ON "
-            "recs_float.href = events.href AND "
-            "recs_float.calendar = events.calendar WHERE "
-            "(dtstart >= ? AND dtstart < ? OR "
-            "dtend > ? AND dtend <= ? OR "
-            "dtstart <= ? AND dtend > ? ) AND events.calendar in ({0}) "
-            "ORDER BY dtstart"
+        for calendar, _ in self._query_instances(
+            "recs_float", start_u, end_u, ("calendar", "dtstart")
+        ):
+            yield self._calendar_names[calendar]
+
+    def get_localized_calendar_spans(
+        self, start: dt.datetime, end: dt.datetime
+    ) -> Iterable[tuple[str, int, int]]:
+        """return calendar, start and end (as unix timestamps) of all localized
+        instances between `start` and `end`, sorted by start"""
+        assert start.tzinfo is not None
+        assert end.tzinfo is not None
+        return self._get_calendar_spans(
+            "recs_loc", utils.to_unix_time(start), utils.to_unix_time(end)
         )
-        stuple = tuple([start_u, end_u, start_u, end_u, start_u, end_u] + list(self.calendars))  # type: ignore
-        result = self.sql_ex(sql_s.format(",".join(["?"] * len(self.calendars))), stuple)
-        for calendar in result:
-            yield calendar[0]
+
+    def get_floating_calendar_spans(
+        self, start: dt.datetime, end: dt.datetime
+    ) -> Iterable[tuple[str, int, int]]:
+        """return calendar, start and end (as unix timestamps) of all floating
+        instances between `start` and `end`, sorted by start"""
+        assert start.tzinfo is None
+        assert end.tzinfo is None
+        return self._get_calendar_spans(
+            "recs_float", utils.to_unix_time(start), utils.to_unix_time(end)
+        )
+
+    def _get_calendar_spans(
+        self, table: str, start_u: float, end_u: float
+    ) -> Iterable[tuple[str, int, int]]:
+        result = self._query_instances(table, start_u, end_u, ("calendar", "dtstart", "dtend"))
+        return [(self._calendar_names[calendar], start, end) for calendar, start, end in result]
 
     def get_floating(self, start: dt.datetime, end: dt.datetime) -> Iterable[EventTuple]:
         """return floating events between `start` and `end`"""
@@ -565,77 +1173,617 @@ class SQLiteDb:
 
         start_u = utils.to_unix_time(start)
         end_u = utils.to_unix_time(end)
-        sql_s = (
-            "SELECT item, recs_float.href, dtstart, dtend, ref, etag, dtype, events.calendar "
-            "FROM recs_float JOIN events ON "
-            "recs_float.href = events.href AND "
-            "recs_float.calendar = events.calendar WHERE "
-            "(dtstart >= ? AND dtstart < ? OR "
-            "dtend > ? AND dtend <= ? OR "
-            "dtstart <= ? AND dtend > ? ) AND events.calendar in ({0}) "
-            "ORDER BY dtstart"
-        )
-        stuple = tuple([start_u, end_u, start_u, end_u, start_u, end_u] + list(self.calendars))  # type: ignore
-        result = self.sql_ex(sql_s.format(",".join(["?"] * len(self.calendars))), stuple)
+        columns = ("item", "href", "dtstart", "dtend", "ref", "etag", "dtype", "calendar")
+        result = self._query_instances("recs_float", start_u, end_u, columns)
+        names = self._calendar_names
         for item, href, start_s, end_s, ref, etag, dtype, calendar in result:
             start_dt = dt.datetime.fromtimestamp(start_s, pytz.UTC).replace(tzinfo=None)
             end_dt = dt.datetime.fromtimestamp(end_s, pytz.UTC).replace(tzinfo=None)
             if dtype == EventType.DATE:
                 start_dt = start_dt.date()
                 end_dt = end_dt.date()
-            yield item, href, start_dt, end_dt, ref, etag, calendar
+            yield item, href, start_dt, end_dt, ref, etag, names[calendar]
+
+    def get_instances(
+        self, start: dt.datetime, end: dt.datetime, item: bool = False
+    ) -> Iterator[InstanceTuple]:
+        """return the instances between `start` and `end`, sorted by start,
+        without their items unless `item` is True
+
+        Localized instances are returned if `start` and `end` are timezone
+        aware (their start and end are then in UTC), floating ones otherwise.
+        """
+        floating = start.tzinfo is None
+        assert floating == (end.tzinfo is None)
+        table = "recs_float" if floating else "recs_loc"
+        start_u = utils.to_unix_time(start)
+        end_u = utils.to_unix_time(end)
+        columns: tuple[str, ...] = ("calendar", "href", "ref", "etag", "dtstart", "dtend")
+        columns += ("dtype", "uid", "summary", "location", "status") + (("item",) if item else ())
+        names = self._calendar_names
+        for row in self._query_instances(table, start_u, end_u, columns):
+            calendar, href, ref, etag, start_s, end_s, dtype, uid = row[:8]
+            summary, location, status = row[8:11]
+            item_str = row[11] if item else None
+            start_dt = dt.datetime.fromtimestamp(start_s, pytz.UTC)
+            end_dt = dt.datetime.fromtimestamp(end_s, pytz.UTC)
+            if floating:
+                start_dt = start_dt.replace(tzinfo=None)
+                end_dt = end_dt.replace(tzinfo=None)
+            instance_start: dt.datetime | dt.date = start_dt
+            instance_end: dt.datetime | dt.date = end_dt
+            if dtype == EventType.DATE:
+                instance_start = start_dt.date()
+                instance_end = end_dt.date()
+            yield (
+                names[calendar],
+                href,
+                ref,
+                etag,
+                instance_start,
+                instance_end,
+                uid,
+                summary or "",
+                location or "",
+                status or "",
+                item_str,
+            )
 
     def get(self, href: str, calendar: str) -> str:
         """returns the ical string matching href and calendar"""
         assert calendar is not None
         sql_s = "SELECT item, etag FROM events WHERE href = ? AND calendar = ?;"
-        item, etag = self.sql_ex(sql_s, (href, calendar))[0]
+        item, etag = self.sql_ex(sql_s, (href, self._calendar_id(calendar)))[0]
         return item
 
     def get_with_etag(self, href: str, calendar: str) -> tuple[str, str]:
         """returns the ical string and its etag matching href and calendar"""
         assert calendar is not None
         sql_s = "SELECT item, etag FROM events WHERE href = ? AND calendar = ?;"
-        item, etag = self.sql_ex(sql_s, (href, calendar))[0]
+        item, etag = self.sql_ex(sql_s, (href, self._calendar_id(calendar)))[0]
         return item, etag
 
-    def search(
-        self, search_string: str
-    ) -> Iterable[tuple[str, str, dt.date, dt.date, str, str, str]]:
-        """search for events matching `search_string`"""
+    def search(self, search_string: str) -> Iterable[EventTuple]:
+        """search for events matching `search_string`
+
+        See `parse_search()` for the syntax of `search_string`. Only the first
+        instance of each VEVENT (i.e., the master event and each overwritten
+        instance) is returned, the best matches first.
+        """
+        terms = parse_search(search_string)
+        if not terms:
+            matches = "SELECT event, ref, 0 AS rank FROM search"
+            match_tuple: tuple = ()
+        elif self._fulltext:
+            matches = (
+                "SELECT event, ref, "
+                f"bm25(search_index, {', '.join(str(w) for w in SEARCH_WEIGHTS)}) AS rank "
+                "FROM search_index JOIN search ON search.id = search_index.rowid "
+                "WHERE search_index MATCH ?"
+            )
+            match_tuple = (fts_query(terms),)
+        else:
+            conditions = []
+            match_tuple = ()
+            for field, term, _ in terms:
+                fields = [field] if field else SEARCH_FIELDS
+                conditions.append("(" + " OR ".join(f"{f} LIKE ?" for f in fields) + ")")
+                match_tuple += (f"%{term}%",) * len(fields)
+            matches = f"SELECT event, ref, 0 AS rank FROM search WHERE {' AND '.join(conditions)}"
+        # sqlite takes the values of the other columns from the row with the
+        # smallest dtstart, i.e., from the first instance
+        select = (
+            "SELECT item, href, MIN({0}.dtstart), {0}.dtend, {0}.ref, etag, dtype, "
+            "{0}.calendar, matches.rank AS rank, {1} AS floating "
+            "FROM matches JOIN {0} ON {0}.event = matches.event AND {0}.ref = matches.ref "
+            "JOIN events ON {0}.event = events.id "
+            f"WHERE {{0}}.calendar in ({self._selected()}) "
+            "GROUP BY {0}.event, {0}.ref"
+        )
         sql_s = (
-            "SELECT item, recs_loc.href, dtstart, dtend, ref, etag, dtype, events.calendar "
-            "FROM recs_loc JOIN events ON "
-            "recs_loc.href = events.href AND "
-            "recs_loc.calendar = events.calendar "
-            "WHERE item LIKE (?) and events.calendar in ({0});"
+            f"WITH matches AS ({matches}) "
+            f"{select.format('recs_loc', 0)} UNION ALL {select.format('recs_float', 1)} "
+            "ORDER BY rank"
         )
-        stuple = tuple([f"%{search_string}%"] + list(self.calendars))
-        result = self.sql_ex(sql_s.format(",".join(["?"] * len(self.calendars))), stuple)
-        for item, href, start, end, ref, etag, dtype, calendar in result:
+        result = self.sql_iter(sql_s, match_tuple)
+        names = self._calendar_names
+        for item, href, start, end, ref, etag, dtype, calendar, _, floating in result:
             start = dt.datetime.fromtimestamp(start, pytz.UTC)
             end = dt.datetime.fromtimestamp(end, pytz.UTC)
+            if floating:
+                start = start.replace(tzinfo=None)
+                end = end.replace(tzinfo=None)
             if dtype == EventType.DATE:
                 start = start.date()
                 end = end.date()
-            yield item, href, start, end, ref, etag, calendar
+            yield item, href, start, end, ref, etag, names[calendar]
 
-        sql_s = (
-            "SELECT item, recs_float.href, dtstart, dtend, ref, etag, dtype, events.calendar "
-            "FROM recs_float JOIN events ON "
-            "recs_float.href = events.href AND "
-            "recs_float.calendar = events.calendar "
-            "WHERE item LIKE (?) and events.calendar in ({0});"
+
+def _window(start: float, end: float) -> tuple[dt.datetime, dt.datetime]:
+    """convert the time span from `start` to `end` (unix timestamps) to naive
+    datetimes in UTC, a day larger on either side and within
+    `EXPANSION_LIMITS`
+    """
+    epoch = dt.datetime(1970, 1, 1)
+    lowest, highest = EXPANSION_LIMITS
+    margin = dt.timedelta(days=1)
+    return (
+        min(max(epoch + dt.timedelta(seconds=start), lowest), highest) - margin,
+        min(max(epoch + dt.timedelta(seconds=end), lowest), highest) + margin,
+    )
+
+
+def overlaps(
+    start: float, end: float, range_start: float, range_end: float, floating: bool
+) -> bool:
+    """check if an instance from `start` to `end` would be returned by a
+    query from `range_start` to `range_end`, all values are unix timestamps
+
+    This mirrors the SQL of `SQLiteDb._query_instances()`.
+    """
+    if floating:
+        return (
+            range_start <= start < range_end
+            or range_start < end <= range_end
+            or (start <= range_start and end > range_end)
         )
-        stuple = tuple([f"%{search_string}%"] + list(self.calendars))
-        result = self.sql_ex(sql_s.format(",".join(["?"] * len(self.calendars))), stuple)
-        for item, href, start, end, ref, etag, dtype, calendar in result:
-            start = dt.datetime.fromtimestamp(start, pytz.UTC).replace(tzinfo=None)
-            end = dt.datetime.fromtimestamp(end, pytz.UTC).replace(tzinfo=None)
-            if dtype == EventType.DATE:
-                start = start.date()
-                end = end.date()
-            yield item, href, start, end, ref, etag, calendar
+    return (
+        range_start <= start <= range_end
+        or range_start < end <= range_end
+        or (start <= range_start and end >= range_end)
+    )
+
+
+def _invalidate(db: SQLiteDb, condition: str, calendar_key: str = "id") -> None:
+    """mark the events matching `condition` (an SQL expression over the
+    `events` table) to be updated from their vdirs
+
+    Their etags are reset, so `CalendarCollection.update_db()` treats them as
+    modified, as well as the ctags of their calendars, so it looks at those
+    calendars (but only those) at all.
+
+    :param calendar_key: the column of `calendars` that `events.calendar`
+        refers to, before version 10 of the db that was the name
+    """
+    db.cursor.execute(f"UPDATE events SET etag = NULL WHERE {condition}")
+    db.cursor.execute(
+        f"UPDATE calendars SET ctag = NULL WHERE {calendar_key} IN "
+        "(SELECT calendar FROM events WHERE etag IS NULL)"
+    )
+
+
+def _recreate_table(db: SQLiteDb, table: str, create: str, select: str) -> None:
+    """replace `table` by a table created by `create` and fill it with the
+    rows of `select`, which can refer to the old table as `{table}_old`"""
+    db.cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    db.cursor.execute(create)
+    db.cursor.execute(f"INSERT INTO {table} {select}")
+    db.cursor.execute(f"DROP TABLE {table}_old")
+
+
+def _migrate_to_6(db: SQLiteDb) -> None:
+    """recurrence instances get an id and an interval index"""
+    for table in ["recs_loc", "recs_float"]:
+        columns = "dtstart, dtend, href, rec_inst, ref, dtype, calendar"
+        db.cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+        db.cursor.execute(f"""CREATE TABLE {table} (
+            id INTEGER PRIMARY KEY,
+            dtstart INT NOT NULL,
+            dtend INT NOT NULL,
+            href TEXT NOT NULL REFERENCES events( href ),
+            rec_inst TEXT NOT NULL,
+            ref TEXT NOT NULL,
+            dtype INT NOT NULL,
+            calendar TEXT NOT NULL,
+            UNIQUE (href, rec_inst, calendar)
+            );""")
+        db._create_interval_index(table)
+        db.cursor.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_old")
+        db.cursor.execute(f"DROP TABLE {table}_old")
+
+
+def _migrate_to_7(db: SQLiteDb) -> None:
+    """never ending recurring events are only expanded within a horizon"""
+    db.cursor.execute("ALTER TABLE calendars ADD COLUMN horizon_start INT")
+    db.cursor.execute("ALTER TABLE calendars ADD COLUMN horizon_end INT")
+    db.cursor.execute("ALTER TABLE events ADD COLUMN unbounded INT NOT NULL DEFAULT 0")
+    # which of them are never ending is only known after parsing them again
+    _invalidate(db, "item LIKE '%RRULE%'", calendar_key="calendar")
+
+
+def _migrate_to_8(db: SQLiteDb) -> None:
+    """events are indexed for searching"""
+    db.cursor.execute(f"""CREATE TABLE search (
+        id INTEGER PRIMARY KEY,
+        href TEXT NOT NULL,
+        calendar TEXT NOT NULL,
+        ref TEXT NOT NULL,
+        {", ".join(f"{field} TEXT NOT NULL" for field in SEARCH_FIELDS)},
+        UNIQUE (href, calendar, ref)
+        );""")
+    db._create_search_index()
+    _invalidate(db, "1", calendar_key="calendar")
+
+
+def _migrate_to_9(db: SQLiteDb) -> None:
+    """events' UIDs are indexed"""
+    db.cursor.execute("ALTER TABLE events ADD COLUMN uid TEXT")
+    db.cursor.execute("CREATE INDEX events_uid ON events (uid)")
+    rows = db.cursor.execute("SELECT rowid, item FROM events").fetchall()
+    uids = [(find_uid(item), rowid) for rowid, item in rows]
+    db.cursor.executemany("UPDATE events SET uid = ? WHERE rowid = ?", uids)
+    _invalidate(db, "uid IS NULL", calendar_key="calendar")
+
+
+def _migrate_to_10(db: SQLiteDb) -> None:
+    """calendars and events are referenced by integer ids"""
+    # the triggers keeping the indexes in sync and the uid index would move
+    # to the old tables
+    for table in ["recs_loc", "recs_float", "search"]:
+        for action in ["insert", "delete", "update"]:
+            db.cursor.execute(f"DROP TRIGGER IF EXISTS {table}_{action}")
+    db.cursor.execute("DROP INDEX IF EXISTS events_uid")
+    _recreate_table(
+        db,
+        "calendars",
+        """CREATE TABLE calendars (
+            id INTEGER PRIMARY KEY,
+            calendar TEXT NOT NULL UNIQUE,
+            resource TEXT NOT NULL,
+            ctag TEXT,
+            horizon_start INT,
+            horizon_end INT
+            )""",
+        "SELECT rowid, calendar, resource, ctag, horizon_start, horizon_end FROM calendars_old",
+    )
+    _recreate_table(
+        db,
+        "events",
+        """CREATE TABLE events (
+            id INTEGER PRIMARY KEY,
+            href TEXT NOT NULL,
+            calendar INTEGER NOT NULL REFERENCES calendars( id ),
+            sequence INT,
+            etag TEXT,
+            item TEXT,
+            unbounded INT NOT NULL DEFAULT 0,
+            uid TEXT,
+            UNIQUE (href, calendar)
+            );""",
+        "SELECT events_old.rowid, href, calendars.id, sequence, etag, item, unbounded, uid "
+        "FROM events_old JOIN calendars ON events_old.calendar = calendars.calendar",
+    )
+    db.cursor.execute("CREATE INDEX events_uid ON events (uid)")
+    # the ids of the instances and search rows are kept, so the interval and
+    # full text indexes stay valid
+    join = (
+        "JOIN calendars ON {0}_old.calendar = calendars.calendar "
+        "JOIN events ON {0}_old.href = events.href AND events.calendar = calendars.id"
+    )
+    for table in ["recs_loc", "recs_float"]:
+        _recreate_table(
+            db,
+            table,
+            f"""CREATE TABLE {table} (
+                id INTEGER PRIMARY KEY,
+                dtstart INT NOT NULL,
+                dtend INT NOT NULL,
+                event INTEGER NOT NULL REFERENCES events( id ),
+                rec_inst TEXT NOT NULL,
+                ref TEXT NOT NULL,
+                dtype INT NOT NULL,
+                calendar INTEGER NOT NULL REFERENCES calendars( id ),
+                UNIQUE (event, rec_inst)
+                );""",
+            f"SELECT {table}_old.id, dtstart, dtend, events.id, rec_inst, ref, dtype, "
+            f"calendars.id FROM {table}_old {join.format(table)}",
+        )
+        db.cursor.execute(f"DELETE FROM {table}_index WHERE id NOT IN (SELECT id FROM {table})")
+        db._create_interval_index(table)
+    fields = ", ".join(SEARCH_FIELDS)
+    _recreate_table(
+        db,
+        "search",
+        f"""CREATE TABLE search (
+            id INTEGER PRIMARY KEY,
+            event INTEGER NOT NULL REFERENCES events( id ),
+            ref TEXT NOT NULL,
+            {", ".join(f"{field} TEXT NOT NULL" for field in SEARCH_FIELDS)},
+            UNIQUE (event, ref)
+            );""",
+        f"SELECT search_old.id, events.id, ref, {fields} FROM search_old {join.format('search')}",
+    )
+    db._create_search_index()
+    if db._fulltext:
+        db.cursor.execute("INSERT INTO search_index (search_index) VALUES ('rebuild')")
+
+
+def _migrate_to_11(db: SQLiteDb) -> None:
+    """the settings events were cached with are stored"""
+    db.cursor.execute("ALTER TABLE calendars ADD COLUMN settings TEXT")
+    db.cursor.execute("ALTER TABLE events ADD COLUMN default_tz INT NOT NULL DEFAULT 0")
+    # the db was presumably built with the current settings, the events that
+    # depend on them are parsed again once the settings change
+    db.cursor.execute("UPDATE calendars SET settings = ?", (db._settings(),))
+    # only times with a TZID can be localized in the default timezone
+    rows = db.cursor.execute("SELECT id, item FROM events WHERE item LIKE '%TZID%'").fetchall()
+    default_tz = [(event_id,) for event_id, item in rows if _item_uses_default_timezone(item)]
+    db.cursor.executemany("UPDATE events SET default_tz = 1 WHERE id = ?", default_tz)
+
+
+def _item_uses_default_timezone(item: str) -> bool:
+    """check if any times of the VEVENTs in `item` would be localized in the
+    default timezone, True if `item` cannot be parsed"""
+    try:
+        ical = cal_from_ics(item)
+    except ValueError:
+        return True
+    return any(uses_default_timezone(vevent) for vevent in ical.walk("VEVENT"))
+
+
+def _migrate_to_12(db: SQLiteDb) -> None:
+    """the STATUS of each VEVENT is stored"""
+    db.cursor.execute("ALTER TABLE search ADD COLUMN status TEXT NOT NULL DEFAULT ''")
+    _invalidate(db, "item LIKE '%STATUS%'")
+
+
+def _migrate_to_13(db: SQLiteDb) -> None:
+    """etags also include the files' size and inode"""
+    # the etags of files whose mtime did not change are rewritten, all others
+    # (and those of calendars whose vdir is unknown) differ from the files'
+    # etags anyway, so those files are parsed again on the next update
+    rows = db.cursor.execute("SELECT id, calendar, ctag FROM calendars").fetchall()
+    for calendar_id, calendar, ctag in rows:
+        if calendar not in db._paths:
+            continue
+        vdir = db._paths[calendar]
+        ctag = _migrated_etag(vdir, ctag)
+        if ctag is not None:
+            db.cursor.execute("UPDATE calendars SET ctag = ? WHERE id = ?", (ctag, calendar_id))
+        etags: dict[tuple[str, str | None], str | None] = {}
+        updates = []
+        events = "SELECT id, href, etag FROM events WHERE calendar = ?"
+        for event_id, href, etag in db.cursor.execute(events, (calendar_id,)).fetchall():
+            # contacts' dates are stored with the date's key appended to the
+            # contact's href, see `SQLiteDb.update_vcf_dates()`
+            if ".vcf" in href and not path.isfile(path.join(vdir, href)):
+                href = href[: href.rfind(".vcf") + len(".vcf")]
+            if (href, etag) not in etags:
+                etags[href, etag] = _migrated_etag(path.join(vdir, href), etag)
+            if etags[href, etag] is not None:
+                updates.append((etags[href, etag], event_id))
+        db.cursor.executemany("UPDATE events SET etag = ? WHERE id = ?", updates)
+
+
+def _migrated_etag(fpath: str, etag: str | None) -> str | None:
+    """return the current etag of `fpath` if the file did not change since
+    `etag` was taken in the format used before version 13 of the db, None
+    otherwise"""
+    try:
+        current = get_etag_from_path(fpath)
+    except OSError:
+        return None
+    mtime_ns = int(current.split(";", 1)[0])
+    return current if etag == f"{mtime_ns:.9f}" else None
+
+
+# steps migrating the db in place from the previous version to the key's
+# version, see `SQLiteDb._migrate()`
+MIGRATIONS: dict[int, Callable[[SQLiteDb], None]] = {
+    6: _migrate_to_6,
+    7: _migrate_to_7,
+    8: _migrate_to_8,
+    9: _migrate_to_9,
+    10: _migrate_to_10,
+    11: _migrate_to_11,
+    12: _migrate_to_12,
+    13: _migrate_to_13,
+}
+
+
+# recurrence instances of an event per table, mapping rec_inst to
+# (dtstart, dtend, ref, dtype)
+Instances = dict[str, dict[str, tuple[int, int, str, EventType]]]
+# an event's instances, if it recurs forever, the text of each VEVENT to
+# search in (see `get_search_row()`), its UID and if any of its times were
+# localized in the default timezone
+ExpandedItem = tuple[Instances, bool, list[tuple[str, ...]], str | None, bool]
+
+
+def expand_item(
+    vevent_str: str,
+    href: str,
+    calendar: str,
+    default_timezone: pytz.BaseTzInfo,
+    window: tuple[dt.datetime, dt.datetime] | None = None,
+) -> ExpandedItem:
+    """parse, check, sanitize and expand all VEVENTs in `vevent_str`
+
+    This does not need a database connection, so it can also be run in a
+    worker process, see `SQLiteDb.update_expanded()`.
+
+    :param vevent_str: the .ics item, we assume that even if it contains more
+        than one VEVENT, that they are all part of the same event and all have
+        the same UID
+    :param href: the item's href, only used for logging
+    :param calendar: the item's calendar, only used for logging
+    :param window: only expand never ending recurrence rules in this window
+    """
+    vevents, default_tz = parse_item(vevent_str, href, calendar, default_timezone)
+    instances: Instances = {"recs_loc": {}, "recs_float": {}}
+    for vevent in vevents:
+        expand_instances(vevent, href, instances, window)
+    search_rows = [get_search_row(vevent) for vevent in vevents]
+    uid = str(vevents[0]["UID"]) if vevents and "UID" in vevents[0] else None
+    unbounded = any(is_unbounded(vevent) for vevent in vevents)
+    return instances, unbounded, search_rows, uid, default_tz
+
+
+def parse_item(
+    vevent_str: str, href: str, calendar: str, default_timezone: pytz.BaseTzInfo
+) -> tuple[list[icalendar.cal.Event], bool]:
+    """parse, check and sanitize all VEVENTs in `vevent_str`, see
+    `expand_item()`
+
+    :returns: the VEVENTs, in the order `expand_instances()` needs them, and
+        if any of their times were localized in the default timezone
+    """
+    ical = cal_from_ics(vevent_str)
+    check_for_errors(ical, calendar, href)
+    if not assert_only_one_uid(ical):
+        logger.warning(
+            f"The .ics file at {calendar}/{href} contains multiple UIDs.\n"
+            "This should not occur in vdir .ics files.\n"
+            "If you didn't edit the file by hand, please report a bug "
+            "at https://github.com/pimutils/khal/issues .\n"
+            "If you want to import it, please use `khal import FILE`."
+        )
+        raise NonUniqueUID
+    vevents = [c for c in ical.walk() if c.name == "VEVENT"]
+    default_tz = any(uses_default_timezone(vevent) for vevent in vevents)
+    vevents = [sanitize_vevent(vevent, default_timezone, href, calendar) for vevent in vevents]
+    vevents.sort(key=sort_vevent_key)
+    for vevent in vevents:
+        check_for_errors(vevent, calendar, href)
+        check_support(vevent, href, calendar)
+    return vevents, default_tz
+
+
+def expand_instances(
+    vevent: icalendar.cal.Event,
+    href: str,
+    instances: Instances,
+    window: tuple[dt.datetime, dt.datetime] | None = None,
+) -> None:
+    """expand `vevent`'s recurrence rules (if needed) and add all its
+    instances to `instances`
+
+    VEVENTs with a RECURRENCE-ID replace the matching instance, if its RANGE
+    is THISANDFUTURE, all following instances get shifted as well. They
+    therefore need to be added after the VEVENT with the RRULE.
+    """
+    # TODO FIXME this function is a steaming pile of shit
+    rec_id = vevent.get(RECURRENCE_ID)
+    if rec_id is None:
+        rrange = None
+    else:
+        rrange = rec_id.params.get("RANGE")
+
+    # testing on datetime.date won't work as datetime is a child of date
+    if not isinstance(vevent["DTSTART"].dt, dt.datetime):
+        dtype = EventType.DATE
+    else:
+        dtype = EventType.DATETIME
+    if ("TZID" in vevent["DTSTART"].params and dtype == EventType.DATETIME) or getattr(
+        vevent["DTSTART"].dt, "tzinfo", None
+    ):
+        recs = instances["recs_loc"]
+    else:
+        recs = instances["recs_float"]
+
+    thisandfuture = rrange == THISANDFUTURE
+    if thisandfuture:
+        start_shift, duration = calc_shift_deltas(vevent)
+        start_shift_seconds = start_shift.days * 3600 * 24 + start_shift.seconds
+        duration_seconds = duration.days * 3600 * 24 + duration.seconds
+
+    dtstartend = expand_vevent(vevent, href, *(window or (None, None)))
+    if not dtstartend:
+        # Does this event even have dates? Technically it is possible for
+        # events to be empty/non-existent by deleting all their recurrences
+        # through EXDATE.
+        return
+
+    ref = get_ref(vevent)
+    for dtstart, dtend in dtstartend:
+        dbstart = int(utils.to_unix_time(dtstart))
+        dbend = int(utils.to_unix_time(dtend))
+        rec_inst = str(dbstart) if rec_id is None else ref
+
+        if thisandfuture:
+            # rec_inst is stored as TEXT and therefore compared as a string
+            for inst, (_, _, _, inst_dtype) in list(recs.items()):
+                if inst >= rec_inst:
+                    inst_start = int(inst) + start_shift_seconds
+                    recs[inst] = (inst_start, inst_start + duration_seconds, ref, inst_dtype)
+        else:
+            recs[rec_inst] = (dbstart, dbend, ref, dtype)
+
+
+def get_ref(vevent: icalendar.cal.Event) -> str:
+    """return how the instances of `vevent` are referenced in the db, PROTO
+    for master events, the (unix) time of the RECURRENCE-ID otherwise"""
+    rec_id = vevent.get(RECURRENCE_ID)
+    if rec_id is None:
+        return PROTO
+    return str(utils.to_unix_time(rec_id.dt))
+
+
+def get_search_row(vevent: icalendar.cal.Event) -> tuple[str, ...]:
+    """return `vevent`'s ref, the text of all its SEARCH_FIELDS and its
+    STATUS"""
+    row = [get_ref(vevent)]
+    for field in SEARCH_FIELDS:
+        values = vevent.get(field.upper(), [])
+        if not isinstance(values, list):
+            values = [values]
+        texts: list[str] = []
+        for value in values:
+            if hasattr(value, "cats"):  # CATEGORIES
+                texts.extend(str(category) for category in value.cats)
+                continue
+            # ATTENDEE and ORGANIZER
+            if "CN" in getattr(value, "params", {}):
+                texts.append(str(value.params["CN"]))
+            text = str(value)
+            if text.lower().startswith("mailto:"):
+                text = text[len("mailto:") :]
+            texts.append(text)
+        row.append("\n".join(texts))
+    row.append(str(vevent.get("STATUS", "")))
+    return tuple(row)
+
+
+SEARCH_TERM_RE = re.compile(r'(?:(\w+):)?(?:"([^"]*)"?|(\S+))')
+
+
+def parse_search(search_string: str) -> list[tuple[str | None, str, bool]]:
+    """split `search_string` into search terms
+
+    Terms are separated by whitespace and all need to match. A term can be
+    limited to one field by prefixing it with the field's name, e.g.,
+    `location:berlin`. Terms in double quotes are matched as a phrase,
+    otherwise they also match words starting with them.
+
+    :returns: (field or None, term, match prefixes) tuples
+    """
+    terms = []
+    for match in SEARCH_TERM_RE.finditer(search_string):
+        field, phrase, word = match.groups()
+        if field is not None and field.lower() not in SEARCH_FIELDS:
+            # not a field, e.g., a time like 10:30
+            if word is None:
+                word = f'{field}:"{phrase}"'
+            else:
+                word = f"{field}:{word}"
+            field, phrase = None, None
+        if phrase is not None:
+            if phrase.strip():
+                terms.append((field and field.lower(), phrase, False))
+        else:
+            terms.append((field and field.lower(), word, True))
+    return terms
+
+
+def fts_query(terms: list[tuple[str | None, str, bool]]) -> str:
+    """turn `terms` (see `parse_search()`) into an FTS5 query"""
+    query = []
+    for field, term, prefix in terms:
+        phrase = '"' + term.replace('"', '""') + '"'
+        if prefix:
+            phrase += "*"
+        query.append(f"{field} : {phrase}" if field else phrase)
+    return " AND ".join(query)
 
 
 def check_support(vevent: icalendar.cal.Event, href: str, calendar: str) -> None:
@@ -23,10 +23,11 @@
 helper functions."""
 
 import datetime as dt
+import functools
 import logging
 import os
-from collections.abc import Callable
-from typing import Any
+from collections.abc import Callable, Iterator, Mapping
+from typing import Any, Literal
 
 import icalendar
 import icalendar.cal
@@ -70,13 +71,13 @@ class Event:
         etag: str | None = None,
         calendar: str | None = None,
         color: str | None = None,
-        start: dt.datetime | None = None,
-        end: dt.datetime | None = None,
+        start: dt.datetime | dt.date | None = None,
+        end: dt.datetime | dt.date | None = None,
         addresses: list[str] | None = None,
     ):
         """
-        :param start: start datetime of this event instance
-        :param end: end datetime of this event instance
+        :param start: start datetime (or date) of this event instance
+        :param end: end datetime (or date) of this event instance
         """
         if self.__class__.__name__ == "Event":
             raise ValueError("do not initialize this class directly")
@@ -94,10 +95,11 @@ class Event:
         self._end: dt.datetime
         self.addresses = addresses if addresses else []
 
+        # all day events store dates here
         if start is None:
             self._start = self._vevents[self.ref]["DTSTART"].dt
         else:
-            self._start = start
+            self._start = start  # type: ignore[assignment]
         if end is None:
             try:
                 self._end = self._vevents[self.ref]["DTEND"].dt
@@ -107,7 +109,7 @@ class Event:
                 except KeyError:
                     self._end = self._start + dt.timedelta(days=1)
         else:
-            self._end = end
+            self._end = end  # type: ignore[assignment]
 
     @classmethod
     def _get_type_from_vDDD(cls, start: icalendar.prop.vDDDTypes) -> type:
@@ -119,7 +121,7 @@ class Event:
         return FloatingEvent
 
     @classmethod
-    def _get_type_from_date(cls, start: dt.datetime) -> type["Event"]:
+    def _get_type_from_date(cls, start: dt.datetime | dt.date) -> type["Event"]:
         if hasattr(start, "tzinfo") and start.tzinfo is not None:
             cls = LocalizedEvent
         elif isinstance(start, dt.datetime):
@@ -133,7 +135,7 @@ class Event:
         cls,
         events_list: list[icalendar.Event],
         ref: str | None = None,
-        start: dt.datetime | None = None,
+        start: dt.datetime | dt.date | None = None,
         **kwargs,
     ) -> "Event":
         assert isinstance(events_list, list)
@@ -607,195 +609,13 @@ class Event:
         relative_to: tuple[dt.date, dt.date] | dt.date,
         env=None,
         colors: bool = True,
-    ):
+    ) -> "EventAttributes":
         """
         :param colors: determines if colors codes should be printed or not
+        :returns: a mapping of all attributes used for formatting this event,
+            each attribute is only computed when it is first looked up
         """
-        env = env or {}
-
-        attributes: dict[str, Any] = {}
-        if isinstance(relative_to, tuple):
-            relative_to_start, relative_to_end = relative_to
-        else:
-            relative_to_start = relative_to_end = relative_to
-
-        if isinstance(relative_to_end, dt.datetime):
-            relative_to_end = relative_to_end.date()
-        if isinstance(relative_to_start, dt.datetime):
-            relative_to_start = relative_to_start.date()
-
-        if isinstance(self.start_local, dt.datetime):
-            start_local_datetime = self.start_local
-            end_local_datetime = self.end_local
-        else:
-            start_local_datetime = self._locale["local_timezone"].localize(
-                dt.datetime.combine(self.start, dt.time.min)
-            )
-            end_local_datetime = self._locale["local_timezone"].localize(
-                dt.datetime.combine(self.end, dt.time.min)
-            )
-
-        day_start = self._locale["local_timezone"].localize(
-            dt.datetime.combine(relative_to_start, dt.time.min),
-        )
-        day_end = self._locale["local_timezone"].localize(
-            dt.datetime.combine(relative_to_end, dt.time.max),
-        )
-        next_day_start = day_start + dt.timedelta(days=1)
-
-        allday = isinstance(self, AllDayEvent)
-
-        attributes["start"] = self.start_local.strftime(self._locale["datetimeformat"])
-        attributes["start-long"] = self.start_local.strftime(self._locale["longdatetimeformat"])
-        attributes["start-date"] = self.start_local.strftime(self._locale["dateformat"])
-        attributes["start-date-long"] = self.start_local.strftime(self._locale["longdateformat"])
-        attributes["start-time"] = self.start_local.strftime(self._locale["timeformat"])
-
-        attributes["end"] = self.end_local.strftime(self._locale["datetimeformat"])
-        attributes["end-long"] = self.end_local.strftime(self._locale["longdatetimeformat"])
-        attributes["end-date"] = self.end_local.strftime(self._locale["dateformat"])
-        attributes["end-date-long"] = self.end_local.strftime(self._locale["longdateformat"])
-        attributes["end-time"] = self.end_local.strftime(self._locale["timeformat"])
-
-        attributes["duration"] = timedelta2str(self.duration)
-
-        # should only have time attributes at this point (start/end)
-        full = {}
-        for attr in attributes:
-            full[attr + "-full"] = attributes[attr]
-        attributes.update(full)
-
-        if allday:
-            attributes["start"] = attributes["start-date"]
-            attributes["start-long"] = attributes["start-date-long"]
-            attributes["start-time"] = ""
-            attributes["end"] = attributes["end-date"]
-            attributes["end-long"] = attributes["end-date-long"]
-            attributes["end-time"] = ""
-
-        tostr = ""
-        if self.start_local.timetuple() < relative_to_start.timetuple():
-            attributes["start-style"] = self.symbol_strings["right_arrow"]
-        elif self.start_local.timetuple() == relative_to_start.timetuple():
-            attributes["start-style"] = self.symbol_strings["range_start"]
-        else:
-            attributes["start-style"] = attributes["start-time"]
-            tostr = "-"
-
-        if end_local_datetime in [day_end, next_day_start]:
-            if self._locale["timeformat"] == "%H:%M":
-                attributes["end-style"] = "24:00"
-                tostr = "-"
-            else:
-                attributes["end-style"] = self.symbol_strings["range_end"]
-                tostr = ""
-        elif end_local_datetime > day_end:
-            attributes["end-style"] = self.symbol_strings["right_arrow"]
-            tostr = ""
-        else:
-            attributes["end-style"] = attributes["end-time"]
-
-        if self.start < self.end:
-            attributes["to-style"] = "-"
-        else:
-            attributes["to-style"] = ""
-
-        if start_local_datetime < day_start and end_local_datetime > day_end:
-            attributes["start-end-time-style"] = self.symbol_strings["range"]
-        else:
-            attributes["start-end-time-style"] = (
-                attributes["start-style"] + tostr + attributes["end-style"]
-            )
-
-        if allday:
-            if self.start == self.end:
-                attributes["start-end-time-style"] = ""
-            elif self.start == relative_to_start and self.end > relative_to_end:
-                attributes["start-end-time-style"] = self.symbol_strings["range_start"]
-            elif self.start < relative_to_start and self.end > relative_to_end:
-                attributes["start-end-time-style"] = self.symbol_strings["range"]
-            elif self.start < relative_to_start and self.end == relative_to_end:
-                attributes["start-end-time-style"] = self.symbol_strings["range_end"]
-            else:
-                attributes["start-end-time-style"] = ""
-
-        if allday:
-            attributes["end-necessary"] = ""
-            attributes["end-necessary-long"] = ""
-            if self.start_local != self.end_local:
-                attributes["end-necessary"] = attributes["end-date"]
-                attributes["end-necessary-long"] = attributes["end-date-long"]
-        else:
-            attributes["end-necessary"] = attributes["end-time"]
-            attributes["end-necessary-long"] = attributes["end-time"]
-            if self.start_local.date() != self.end_local.date():
-                attributes["end-necessary"] = attributes["end"]
-                attributes["end-necessary-long"] = attributes["end-long"]
-
-        attributes["repeat-symbol"] = self._recur_str
-        attributes["repeat-pattern"] = self.recurpattern
-        attributes["alarm-symbol"] = self._alarm_str
-        attributes["alarms-list"] = [
-            {
-                "delta": alarm[0].total_seconds(),
-                "description": str(alarm[1]),
-                "delta-formatted": timedelta2str(alarm[0]),
-            }
-            for alarm in self.alarms
-        ]
-        attributes["status-symbol"] = self._status_str
-        attributes["partstat-symbol"] = self._partstat_str
-        attributes["title"] = self.summary
-        attributes["organizer"] = self.organizer.strip()
-
-        formatters = FORMATTERS.values()
-        if len(formatters) == 1:
-            fmt: Callable[[str], str] = list(formatters)[0]
-        else:
-
-            def fmt(s: str) -> str:
-                return s.strip()
-
-        attributes["description"] = fmt(self.description)
-        attributes["description-separator"] = ""
-        if attributes["description"]:
-            attributes["description-separator"] = " :: "
-        attributes["location"] = self.location.strip()
-        attributes["attendees"] = self.attendees
-        attributes["all-day"] = str(allday)
-        attributes["categories"] = self.categories
-        attributes["uid"] = self.uid
-        attributes["url"] = self.url
-        attributes["url-separator"] = ""
-        if attributes["url"]:
-            attributes["url-separator"] = " :: "
-
-        if "calendars" in env and self.calendar in env["calendars"]:
-            cal = env["calendars"][self.calendar]
-            attributes["calendar-color"] = cal.get("color", "")
-            attributes["calendar"] = cal.get("displayname", self.calendar)
-        else:
-            attributes["calendar-color"] = attributes["calendar"] = ""
-            attributes["calendar"] = self.calendar
-
-        if colors:
-            attributes["reset"] = style("", reset=True)
-            attributes["bold"] = style("", bold=True, reset=False)
-            for c in ["black", "red", "green", "yellow", "blue", "magenta", "cyan", "white"]:
-                attributes[c] = style("", reset=False, fg=c)
-                attributes[c + "-bold"] = style("", reset=False, fg=c, bold=True)
-        else:
-            attributes["reset"] = attributes["bold"] = ""
-            for c in ["black", "red", "green", "yellow", "blue", "magenta", "cyan", "white"]:
-                attributes[c] = attributes[c + "-bold"] = ""
-
-        attributes["nl"] = "\n"
-        attributes["tab"] = "\t"
-        attributes["bell"] = "\a"
-
-        attributes["status"] = self.status + " " if self.status else ""
-        attributes["cancelled"] = "CANCELLED " if self.status == "CANCELLED" else ""
-        return attributes
+        return EventAttributes(self, relative_to, env, colors)
 
     def duplicate(self) -> "Event":
         """duplicate this event's PROTO event"""
@@ -1046,3 +866,293 @@ def _create_timezone_static(tz: StaticTzInfo) -> icalendar.Timezone:
     subcomp.add("TZOFFSETFROM", tz._utcoffset)  # type: ignore
     timezone.add_component(subcomp)
     return timezone
+
+
+COLORS = ["black", "red", "green", "yellow", "blue", "magenta", "cyan", "white"]
+
+# the formats of the time attributes, e.g. `start-date` and `end-date`
+TIME_FORMATS: dict[
+    str,
+    Literal["datetimeformat", "longdatetimeformat", "dateformat", "longdateformat", "timeformat"],
+] = {
+    "": "datetimeformat",
+    "-long": "longdatetimeformat",
+    "-date": "dateformat",
+    "-date-long": "longdateformat",
+    "-time": "timeformat",
+}
+# which of the `*-full` attributes the time attributes of allday events use
+ALLDAY_TIME_ATTRIBUTES = {
+    "": "-date",
+    "-long": "-date-long",
+    "-date": "-date",
+    "-date-long": "-date-long",
+    "-time": None,
+}
+
+
+@functools.cache
+def _color_attributes(colors: bool) -> dict[str, str]:
+    attributes = {}
+    if colors:
+        attributes["reset"] = style("", reset=True)
+        attributes["bold"] = style("", bold=True, reset=False)
+        for c in COLORS:
+            attributes[c] = style("", reset=False, fg=c)
+            attributes[c + "-bold"] = style("", reset=False, fg=c, bold=True)
+    else:
+        attributes["reset"] = attributes["bold"] = ""
+        for c in COLORS:
+            attributes[c] = attributes[c + "-bold"] = ""
+    return attributes
+
+
+def _color_attribute(key: str, attributes: "EventAttributes") -> str:
+    return _color_attributes(attributes.colors)[key]
+
+
+@functools.lru_cache(maxsize=16)
+def _day_bounds(
+    local_timezone: pytz.BaseTzInfo, start: dt.date, end: dt.date
+) -> tuple[dt.datetime, dt.datetime, dt.datetime]:
+    """the start of `start`, the end of `end` and the start of the day after `start`"""
+    day_start = local_timezone.localize(dt.datetime.combine(start, dt.time.min))
+    day_end = local_timezone.localize(dt.datetime.combine(end, dt.time.max))
+    return day_start, day_end, day_start + dt.timedelta(days=1)
+
+
+class EventAttributes(Mapping[str, Any]):
+    """the attributes of an `Event` used for formatting it, relative to the
+    day(s) it is displayed on
+
+    Attributes are only computed when they are looked up (e.g., by
+    `str.format_map()`), most format strings only need a few of them.
+    """
+
+    def __init__(
+        self,
+        event: Event,
+        relative_to: tuple[dt.date, dt.date] | dt.date,
+        env: dict | None,
+        colors: bool,
+    ) -> None:
+        if isinstance(relative_to, tuple):
+            relative_to_start, relative_to_end = relative_to
+        else:
+            relative_to_start = relative_to_end = relative_to
+        if isinstance(relative_to_end, dt.datetime):
+            relative_to_end = relative_to_end.date()
+        if isinstance(relative_to_start, dt.datetime):
+            relative_to_start = relative_to_start.date()
+
+        self.event = event
+        self.relative_to_start: dt.date = relative_to_start
+        self.relative_to_end: dt.date = relative_to_end
+        self.env = env or {}
+        self.colors = colors
+        self.allday = isinstance(event, AllDayEvent)
+        self._values: dict[str, Any] = {}
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        if key not in ATTRIBUTES:
+            raise KeyError(key)
+        value = self._values[key] = ATTRIBUTES[key](self)
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._values[key] = value
+
+    def __iter__(self) -> Iterator[str]:
+        yield from ATTRIBUTES
+        yield from (key for key in self._values if key not in ATTRIBUTES)
+
+    def __len__(self) -> int:
+        return len(ATTRIBUTES) + sum(1 for key in self._values if key not in ATTRIBUTES)
+
+    def __contains__(self, key: object) -> bool:
+        return key in ATTRIBUTES or key in self._values
+
+    @functools.cached_property
+    def start_local(self) -> dt.datetime | dt.date:
+        return self.event.start_local
+
+    @functools.cached_property
+    def end_local(self) -> dt.datetime | dt.date:
+        return self.event.end_local
+
+    def _time(self, prefix: str, suffix: str) -> str:
+        """the `*-full` time attributes"""
+        if suffix == "duration":
+            return timedelta2str(self.event.duration)
+        local = self.start_local if prefix == "start" else self.end_local
+        return local.strftime(self.event._locale[TIME_FORMATS[suffix]])
+
+    def _allday_time(self, prefix: str, suffix: str) -> str:
+        if not self.allday:
+            return self[f"{prefix}{suffix}-full"]
+        allday_suffix = ALLDAY_TIME_ATTRIBUTES[suffix]
+        return "" if allday_suffix is None else self[f"{prefix}{allday_suffix}-full"]
+
+    @functools.cached_property
+    def _styles(self) -> dict[str, str]:
+        """`start-style`, `end-style`, `to-style` and `start-end-time-style`"""
+        event = self.event
+        local_timezone = event._locale["local_timezone"]
+        if isinstance(self.start_local, dt.datetime):
+            start_local_datetime = self.start_local
+            end_local_datetime = self.end_local
+        else:
+            start_local_datetime = local_timezone.localize(
+                dt.datetime.combine(event.start, dt.time.min)
+            )
+            end_local_datetime = local_timezone.localize(
+                dt.datetime.combine(event.end, dt.time.min)
+            )
+
+        day_start, day_end, next_day_start = _day_bounds(
+            local_timezone, self.relative_to_start, self.relative_to_end
+        )
+
+        styles = {}
+        tostr = ""
+        if self.start_local.timetuple() < self.relative_to_start.timetuple():
+            styles["start-style"] = event.symbol_strings["right_arrow"]
+        elif self.start_local.timetuple() == self.relative_to_start.timetuple():
+            styles["start-style"] = event.symbol_strings["range_start"]
+        else:
+            styles["start-style"] = self["start-time"]
+            tostr = "-"
+
+        if end_local_datetime in [day_end, next_day_start]:
+            if event._locale["timeformat"] == "%H:%M":
+                styles["end-style"] = "24:00"
+                tostr = "-"
+            else:
+                styles["end-style"] = event.symbol_strings["range_end"]
+                tostr = ""
+        elif end_local_datetime > day_end:
+            styles["end-style"] = event.symbol_strings["right_arrow"]
+            tostr = ""
+        else:
+            styles["end-style"] = self["end-time"]
+
+        if event.start < event.end:
+            styles["to-style"] = "-"
+        else:
+            styles["to-style"] = ""
+
+        if start_local_datetime < day_start and end_local_datetime > day_end:
+            styles["start-end-time-style"] = event.symbol_strings["range"]
+        else:
+            styles["start-end-time-style"] = styles["start-style"] + tostr + styles["end-style"]
+
+        if self.allday:
+            if event.start == event.end:
+                styles["start-end-time-style"] = ""
+            elif event.start == self.relative_to_start and event.end > self.relative_to_end:
+                styles["start-end-time-style"] = event.symbol_strings["range_start"]
+            elif event.start < self.relative_to_start and event.end > self.relative_to_end:
+                styles["start-end-time-style"] = event.symbol_strings["range"]
+            elif event.start < self.relative_to_start and event.end == self.relative_to_end:
+                styles["start-end-time-style"] = event.symbol_strings["range_end"]
+            else:
+                styles["start-end-time-style"] = ""
+        return styles
+
+    def _end_necessary(self, long: bool) -> str:
+        if self.allday:
+            if self.start_local != self.end_local:
+                return self["end-date-long" if long else "end-date"]
+            return ""
+        start_local, end_local = self.start_local, self.end_local
+        assert isinstance(start_local, dt.datetime)
+        assert isinstance(end_local, dt.datetime)
+        if start_local.date() != end_local.date():
+            return self["end-long" if long else "end"]
+        return self["end-time"]
+
+    def _description(self) -> str:
+        formatters = FORMATTERS.values()
+        if len(formatters) == 1:
+            fmt: Callable[[str], str] = list(formatters)[0]
+        else:
+
+            def fmt(s: str) -> str:
+                return s.strip()
+
+        return fmt(self.event.description)
+
+    def _calendar(self, key: str) -> str:
+        if "calendars" in self.env and self.event.calendar in self.env["calendars"]:
+            cal = self.env["calendars"][self.event.calendar]
+            if key == "calendar-color":
+                return cal.get("color", "")
+            return cal.get("displayname", self.event.calendar)
+        return "" if key == "calendar-color" else self.event.calendar
+
+
+def _time_attributes() -> dict[str, Callable[[EventAttributes], Any]]:
+    attributes: dict[str, Callable[[EventAttributes], Any]] = {}
+    for prefix in ["start", "end"]:
+        for suffix in TIME_FORMATS:
+            attributes[prefix + suffix] = functools.partial(
+                EventAttributes._allday_time, prefix=prefix, suffix=suffix
+            )
+    attributes["duration"] = lambda a: a["duration-full"]
+    for prefix in ["start", "end"]:
+        for suffix in TIME_FORMATS:
+            attributes[f"{prefix}{suffix}-full"] = functools.partial(
+                EventAttributes._time, prefix=prefix, suffix=suffix
+            )
+    attributes["duration-full"] = functools.partial(
+        EventAttributes._time, prefix="", suffix="duration"
+    )
+    return attributes
+
+
+# how to compute each attribute, in the order they are listed in
+ATTRIBUTES: dict[str, Callable[[EventAttributes], Any]] = {
+    **_time_attributes(),
+    "start-style": lambda a: a._styles["start-style"],
+    "end-style": lambda a: a._styles["end-style"],
+    "to-style": lambda a: a._styles["to-style"],
+    "start-end-time-style": lambda a: a._styles["start-end-time-style"],
+    "end-necessary": lambda a: a._end_necessary(long=False),
+    "end-necessary-long": lambda a: a._end_necessary(long=True),
+    "repeat-symbol": lambda a: a.event._recur_str,
+    "repeat-pattern": lambda a: a.event.recurpattern,
+    "alarm-symbol": lambda a: a.event._alarm_str,
+    "alarms-list": lambda a: [
+        {
+            "delta": alarm[0].total_seconds(),
+            "description": str(alarm[1]),
+            "delta-formatted": timedelta2str(alarm[0]),
+        }
+        for alarm in a.event.alarms
+    ],
+    "status-symbol": lambda a: a.event._status_str,
+    "partstat-symbol": lambda a: a.event._partstat_str,
+    "title": lambda a: a.event.summary,
+    "organizer": lambda a: a.event.organizer.strip(),
+    "description": EventAttributes._description,
+    "description-separator": lambda a: " :: " if a["description"] else "",
+    "location": lambda a: a.event.location.strip(),
+    "attendees": lambda a: a.event.attendees,
+    "all-day": lambda a: str(a.allday),
+    "categories": lambda a: a.event.categories,
+    "uid": lambda a: a.event.uid,
+    "url": lambda a: a.event.url,
+    "url-separator": lambda a: " :: " if a["url"] else "",
+    "calendar-color": lambda a: a._calendar("calendar-color"),
+    "calendar": lambda a: a._calendar("calendar"),
+    **{key: functools.partial(_color_attribute, key) for key in _color_attributes(True)},
+    "nl": lambda a: "\n",
+    "tab": lambda a: "\t",
+    "bell": lambda a: "\a",
+    "status": lambda a: a.event.status + " " if a.event.status else "",
+    "cancelled": lambda a: "CANCELLED " if a.event.status == "CANCELLED" else "",
+}
@@ -55,6 +55,10 @@ class UpdateFailed(Error):
     """could not update the event in the database"""
 
 
+class UpdateLocked(Error):
+    """another process is still updating the database"""
+
+
 class DuplicateUid(Error):
     """an event with this UID already exists"""
 
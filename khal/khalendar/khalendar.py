@@ -26,15 +26,30 @@ calendars. Each calendar is defined by the contents of a vdir, but uses an
 SQLite db for caching (see backend if you're interested).
 """
 
+import copy
 import datetime as dt
+import functools
+import heapq
 import itertools
 import logging
 import os
 import os.path
-from collections.abc import Iterable
-
-from khal.custom_types import CalendarConfiguration, EventCreationTypes, LocaleConfiguration
-from khal.icalendar import new_vevent
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, namedtuple
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any
+
+import icalendar
+
+from khal.custom_types import (
+    CalendarConfiguration,
+    EventCreationTypes,
+    EventTuple,
+    LocaleConfiguration,
+)
+from khal.icalendar import cal_from_ics, new_vevent
+from khal.utils import to_unix_time
 
 from . import backend
 from .event import Event
@@ -45,17 +60,64 @@ from .exceptions import (
     ReadOnlyCalendarError,
     UnsupportedFeatureError,
     UpdateFailed,
+    UpdateLocked,
 )
 from .vdir import (
     AlreadyExistingError,
     CollectionNotFoundError,
+    Item,
     Vdir,
     WrongEtagError,
-    get_etag_from_file,
+    get_etag_from_path,
 )
+from .watcher import VdirWatcher
 
 logger = logging.getLogger("khal")
 
+# how many parsed .ics files are kept in memory, see
+# `CalendarCollection._get_vevents()`
+PARSED_CACHE_SIZE = 512
+
+# below this many changed events, the db is updated without starting any
+# worker processes
+PARALLEL_THRESHOLD = 200
+
+# how many events `CalendarCollection.insert_many()` hands to its threads at
+# once
+INSERT_CHUNK_SIZE = 256
+
+# fields of the instances returned by `CalendarCollection.iter_instances()`
+# that are read from the db without parsing any events, in the db's order
+INSTANCE_DB_FIELDS = (
+    "calendar",
+    "href",
+    "ref",
+    "etag",
+    "start",
+    "end",
+    "uid",
+    "summary",
+    "location",
+    "status",
+)
+
+
+@functools.cache
+def instance_type(fields: tuple[str, ...]) -> type[Any]:
+    """return the type of the instances with `fields` returned by
+    `CalendarCollection.iter_instances()`, a named tuple (and therefore a
+    class with empty `__slots__`)"""
+    return namedtuple("EventInstance", fields)  # type: ignore[misc]
+
+
+def _copy_component(component: icalendar.cal.Component) -> icalendar.cal.Component:
+    """return a copy of `component` that can be modified without affecting
+    the original, property values are shared (they are only ever replaced)
+    """
+    new = copy.copy(component)
+    new.subcomponents = [_copy_component(sub) for sub in component.subcomponents]
+    return new
+
 
 class CalendarCollection:
     """CalendarCollection allows access to various calendars stored in vdirs
@@ -74,7 +136,15 @@ class CalendarCollection:
         highlight_event_days: bool = False,
         locale: LocaleConfiguration | None = None,
         dbpath: str | None = None,
+        workers: int = 0,
+        update: bool = True,
     ) -> None:
+        """
+        :param workers: number of processes used for parsing events when
+            updating the db, 0 means as many as there are CPUs
+        :param update: update the db from the vdirs right away, otherwise
+            `update_db()` or `update_hrefs()` need to be called
+        """
         assert locale
         assert dbpath is not None
         assert calendars is not None
@@ -107,9 +177,23 @@ class CalendarCollection:
         self.priority = priority
         self.highlight_event_days = highlight_event_days
         self._locale = locale
-        self._backend = backend.SQLiteDb(self.names, dbpath, self._locale)
+        self._workers = workers
+        self._backend = backend.SQLiteDb(
+            self.names,
+            dbpath,
+            self._locale,
+            paths={name: calendar["path"] for name, calendar in self._calendars.items()},
+        )
         self._last_ctags: dict[str, str] = {}
-        self.update_db()
+        self._parsed: OrderedDict[tuple[str, str], tuple[str, str, list[icalendar.Event]]] = (
+            OrderedDict()
+        )
+        # calendars with events per day, see `get_calendars_between()`, only
+        # valid as long as the ctags in the db did not change
+        self._occupancy: dict[dt.date, set[str]] = {}
+        self._occupancy_ctags: dict[str, str | None] = {}
+        if update:
+            self.update_db()
 
     @property
     def writable_names(self) -> list[str]:
@@ -123,6 +207,11 @@ class CalendarCollection:
     def names(self) -> Iterable[str]:
         return self._calendars.keys()
 
+    @property
+    def workers(self) -> int:
+        """number of processes used for parsing events, 0 means one per CPU"""
+        return self._workers
+
     @property
     def default_calendar_name(self) -> str | None:
         return self._default_calendar_name
@@ -142,7 +231,7 @@ class CalendarCollection:
             raise ValueError(f'Calendar "{default}" is read-only and cannot be used as default')
 
     def _local_ctag(self, calendar: str) -> str:
-        return get_etag_from_file(self._calendars[calendar]["path"])
+        return get_etag_from_path(self._calendars[calendar]["path"])
 
     def get_floating(self, start: dt.datetime, end: dt.datetime) -> Iterable[Event]:
         for args in self._backend.get_floating(start, end):
@@ -152,6 +241,134 @@ class CalendarCollection:
         for args in self._backend.get_localized(start, end):
             yield self._construct_event(*args)
 
+    def iter_instances(
+        self,
+        start: dt.datetime,
+        end: dt.datetime,
+        fields: Iterable[str] = ("calendar", "start", "end", "uid", "summary"),
+    ) -> Iterator[tuple]:
+        """return the instances of all events between `start` and `end` (naive
+        datetimes in local time) as named tuples of `fields`, sorted by start
+
+        Unlike `get_localized()` and `get_floating()` this does not construct
+        `Event` objects, the fields in INSTANCE_DB_FIELDS are read from the db
+        as they were stored when the events were indexed. Any other attribute
+        of `Event` (e.g., `description`) can be requested too, but then the
+        events are parsed (and cached) as usual. So is the summary of events
+        from birthday calendars, which includes the age.
+
+        `start` and `end` of an instance are timezone aware datetimes in the
+        local timezone, naive datetimes for floating events or dates for all
+        day events (with `end` being the day after the event).
+
+        :raises ValueError: if any of `fields` is unknown
+        """
+        fields = tuple(fields)
+        for field in fields:
+            if field not in INSTANCE_DB_FIELDS and not hasattr(Event, field):
+                raise ValueError(f"unknown field `{field}`")
+        instance = instance_type(fields)
+        parsed = [field for field in fields if field not in INSTANCE_DB_FIELDS]
+        bdays: set[str] = set()
+        if "summary" in fields:
+            bdays = {
+                name
+                for name, calendar in self._calendars.items()
+                if calendar.get("ctype") == "birthdays"
+            }
+        indexes = [INSTANCE_DB_FIELDS.index(field) for field in fields if field not in parsed]
+        local_timezone = self._locale["local_timezone"]
+
+        def sort_key(row: tuple) -> dt.datetime:
+            start = row[4]
+            if not isinstance(start, dt.datetime):
+                start = dt.datetime.combine(start, dt.time.min)
+            return start if start.tzinfo is not None else local_timezone.localize(start)
+
+        item = bool(parsed or bdays)
+        rows = heapq.merge(
+            self._backend.get_instances(
+                local_timezone.localize(start), local_timezone.localize(end), item=item
+            ),
+            self._backend.get_instances(start, end, item=item),
+            key=sort_key,
+        )
+        for row in rows:
+            values = list(row)
+            calendar, href, ref, etag, ev_start, ev_end = row[:6]
+            if isinstance(ev_start, dt.datetime) and ev_start.tzinfo is not None:
+                assert isinstance(ev_end, dt.datetime)
+                values[4] = ev_start.astimezone(local_timezone)
+                values[5] = ev_end.astimezone(local_timezone)
+            if not parsed and calendar not in bdays:
+                yield instance._make([values[index] for index in indexes])
+                continue
+            item_str = row[10]
+            assert item_str is not None
+            event = self._construct_event(item_str, href, ev_start, ev_end, ref, etag, calendar)
+            yield instance._make(
+                [
+                    values[INSTANCE_DB_FIELDS.index(field)]
+                    if field in INSTANCE_DB_FIELDS and (field != "summary" or calendar not in bdays)
+                    else getattr(event, field)
+                    for field in fields
+                ]
+            )
+
+    def get_events_by_range(
+        self, ranges: list[tuple[dt.datetime, dt.datetime]]
+    ) -> Iterator[tuple[list[Event], list[Event]]]:
+        """return the events for each of `ranges`
+
+        Yields the same (localized, floating) events as calling
+        `get_localized()` and `get_floating()` for each range would, but only
+        queries the db once for all of them. Each instance is only constructed
+        once, even if it shows up in several ranges.
+
+        :param ranges: (start, end) pairs of naive datetimes in local time,
+            sorted and not overlapping, e.g., the days of an agenda
+        """
+        if not ranges:
+            return
+        localize = self._locale["local_timezone"].localize
+        start, end = ranges[0][0], ranges[-1][1]
+        localized = self._bucket(
+            self._backend.get_localized(localize(start), localize(end)),
+            [(to_unix_time(localize(start)), to_unix_time(localize(end))) for start, end in ranges],
+            floating=False,
+        )
+        floating = self._bucket(
+            self._backend.get_floating(start, end),
+            [(to_unix_time(start), to_unix_time(end)) for start, end in ranges],
+            floating=True,
+        )
+        yield from zip(localized, floating)
+
+    def _bucket(
+        self, rows: Iterable[EventTuple], bounds: list[tuple[float, float]], floating: bool
+    ) -> Iterator[list[Event]]:
+        """sort `rows` (ordered by start) into `bounds` (unix timestamps)
+
+        An instance is put into every range it would have been returned for
+        by the backend's `get_localized()` or `get_floating()` respectively.
+        """
+        rows = iter(rows)
+        row = next(rows, None)
+        # instances that started before the end of the current range
+        active: list[tuple[float, float, Event]] = []
+        for start, end in bounds:
+            while row is not None and to_unix_time(row[2]) <= end:
+                event = self._construct_event(*row)
+                active.append((to_unix_time(row[2]), to_unix_time(row[3]), event))
+                row = next(rows, None)
+            yield [
+                event
+                for ev_start, ev_end, event in active
+                if backend.overlaps(ev_start, ev_end, start, end, floating)
+            ]
+            # anything not ending in this range might still show up in the next
+            active = [instance for instance in active if instance[1] > end]
+
     def get_events_on(self, day: dt.date) -> Iterable[Event]:
         """return all events on `day`"""
         start = dt.datetime.combine(day, dt.time.min)
@@ -162,6 +379,8 @@ class CalendarCollection:
         return itertools.chain(localized_events, floating_events)
 
     def get_calendars_on(self, day: dt.date) -> list[str]:
+        if day in self._occupancy:
+            return list(self._occupancy[day])
         start = dt.datetime.combine(day, dt.time.min)
         end = dt.datetime.combine(day, dt.time.max)
         localize = self._locale["local_timezone"].localize
@@ -171,6 +390,46 @@ class CalendarCollection:
         )
         return list(set(calendars))
 
+    def get_calendars_between(self, start: dt.date, end: dt.date) -> dict[dt.date, set[str]]:
+        """return the calendars with events on each day from `start` to `end`
+        (inclusive)
+
+        The result is the same as calling `get_calendars_on()` for each day,
+        but it only queries the db once. It is also cached, so later calls to
+        `get_calendars_on()` for those days do not need the db at all.
+        """
+        self._check_occupancy()
+        days = [start + dt.timedelta(days=n) for n in range((end - start).days + 1)]
+        if not days:
+            return {}
+        occupancy: dict[dt.date, set[str]] = {day: set() for day in days}
+        localize = self._locale["local_timezone"].localize
+        floating_bounds = [
+            (dt.datetime.combine(day, dt.time.min), dt.datetime.combine(day, dt.time.max))
+            for day in days
+        ]
+        localized_bounds = [(localize(first), localize(last)) for first, last in floating_bounds]
+        for floating, bounds, get_spans in [
+            (True, floating_bounds, self._backend.get_floating_calendar_spans),
+            (False, localized_bounds, self._backend.get_localized_calendar_spans),
+        ]:
+            starts = [to_unix_time(day_start) for day_start, _ in bounds]
+            ends = [to_unix_time(day_end) for _, day_end in bounds]
+            for calendar, ev_start, ev_end in get_spans(bounds[0][0], bounds[-1][1]):
+                # only check those days the instance might overlap with
+                for index in range(bisect_left(ends, ev_start), bisect_right(starts, ev_end)):
+                    if backend.overlaps(ev_start, ev_end, starts[index], ends[index], floating):
+                        occupancy[days[index]].add(calendar)
+        self._occupancy.update(occupancy)
+        return occupancy
+
+    def _check_occupancy(self) -> None:
+        """drop the cached calendars per day if the db has changed since"""
+        ctags = {calendar: self._backend.get_ctag(calendar) for calendar in self._calendars}
+        if ctags != self._occupancy_ctags:
+            self._occupancy.clear()
+            self._occupancy_ctags = ctags
+
     def update(self, event: Event) -> None:
         """update `event` in vdir and db"""
         assert event.etag is not None
@@ -179,6 +438,8 @@ class CalendarCollection:
         assert event.raw is not None
         if self._calendars[event.calendar]["readonly"]:
             raise ReadOnlyCalendarError()
+        self._parsed.pop((event.calendar, event.href), None)
+        self._occupancy.clear()
         with self._backend.at_once():
             event.etag = self._storages[event.calendar].update(event.href, event, event.etag)
             self._backend.update(event.raw, event.href, event.etag, calendar=event.calendar)
@@ -193,12 +454,9 @@ class CalendarCollection:
             raise ReadOnlyCalendarError()
 
         with self._backend.at_once():
-            try:
-                href, etag = self._storages[calendar].upload(event)
-            except AlreadyExistingError as error:
-                href = error.existing_href
-                _, etag = self._storages[calendar].get(href)
-                etag = self._storages[calendar].update(href, event, etag)
+            href, etag = self._write(event, calendar, self._find_in(event.uid, calendar))
+            self._parsed.pop((calendar, href), None)
+            self._occupancy.clear()
             self._backend.update(event.raw, href, etag, calendar=calendar)
             self._backend.set_ctag(self._local_ctag(calendar), calendar=calendar)
 
@@ -221,15 +479,90 @@ class CalendarCollection:
         if self._calendars[calendar]["readonly"]:
             raise ReadOnlyCalendarError()
 
+        existing = self._find_in(event.uid, calendar)
+        if existing is not None:
+            raise DuplicateUid(existing)
         with self._backend.at_once():
             try:
                 event.href, event.etag = self._storages[calendar].upload(event)
             except AlreadyExistingError as Error:
                 href = getattr(Error, "existing_href", None)
                 raise DuplicateUid(href)
+            self._parsed.pop((calendar, event.href), None)
+            self._occupancy.clear()
             self._backend.update(event.raw, event.href, event.etag, calendar=calendar)
             self._backend.set_ctag(self._local_ctag(calendar), calendar=calendar)
 
+    def find_by_uid(self, uid: str) -> list[tuple[str, str]]:
+        """find the events with `uid` in all calendars, using the db only
+
+        :returns: list of (calendar, href)
+        """
+        return [(calendar, href) for calendar, href, _ in self._backend.find_by_uid(uid)]
+
+    def _find_in(self, uid: str | None, calendar: str) -> str | None:
+        """return the href of the event with `uid` in `calendar`, if any"""
+        if not uid:
+            return None
+        for other, href in self.find_by_uid(uid):
+            if other == calendar:
+                return href
+        return None
+
+    def _write(self, event: Event | Item, calendar: str, href: str | None) -> tuple[str, str]:
+        """write `event` to the vdir of `calendar`, replacing the event at
+        `href` or with the same href, but don't touch the db
+
+        :returns: href and etag of the written file
+        """
+        storage = self._storages[calendar]
+        if href is None:
+            try:
+                return storage.upload(event)
+            except AlreadyExistingError as error:
+                href = error.existing_href
+        _, etag = storage.get(href)
+        return href, storage.update(href, event, etag)
+
+    def insert_many(self, events: Iterable[Item], collection: str) -> int:
+        """Insert many new events into the vdir of `collection` and the db
+
+        Events with the same uid/href as an existing event replace it, like
+        with `force_update()`. The files are written by a pool of threads (a
+        chunk of `events` at a time), all events are then indexed in a single
+        transaction (in parallel if there are many) and the ctag is only
+        updated once at the end. If writing an event fails, the events
+        written until then are still indexed before the error is raised.
+
+        :returns: the number of events written
+        """
+        if self._calendars[collection]["readonly"]:
+            raise ReadOnlyCalendarError()
+
+        def write(job: tuple[Item, str | None]) -> str:
+            event, existing = job
+            href, _ = self._write(event, collection, existing)
+            return href
+
+        events = iter(events)
+        hrefs: set[str] = set()
+        try:
+            with ThreadPoolExecutor() as pool:
+                while chunk := list(itertools.islice(events, INSERT_CHUNK_SIZE)):
+                    # the db can only be used from this thread, so look up
+                    # existing events here
+                    jobs = [(event, self._find_in(event.uid, collection)) for event in chunk]
+                    futures = [pool.submit(write, job) for job in jobs]
+                    hrefs.update(f.result() for f in futures if f.exception() is None)
+                    for future in futures:
+                        future.result()
+        finally:
+            with self._backend.at_once():
+                self._update_vevents(sorted(hrefs), collection)
+                self._backend.set_ctag(self._local_ctag(collection), calendar=collection)
+            self._occupancy.clear()
+        return len(hrefs)
+
     def delete(self, href: str, etag: str | None, calendar: str) -> None:
         """Delete an event specified by `href` from `calendar`"""
         if self._calendars[calendar]["readonly"]:
@@ -238,6 +571,8 @@ class CalendarCollection:
             self._storages[calendar].delete(href, etag)
         except WrongEtagError:
             raise EtagMissmatch()
+        self._parsed.pop((calendar, href), None)
+        self._occupancy.clear()
         self._backend.delete(href, calendar=calendar)
 
     def delete_instance(
@@ -277,8 +612,8 @@ class CalendarCollection:
         calendar: str | None = None,
     ) -> Event:
         assert calendar is not None
-        event = Event.fromString(
-            item,
+        event = Event.fromVEvents(
+            self._get_vevents(item, href, etag, calendar),
             locale=self._locale,
             href=href,
             calendar=calendar,
@@ -292,9 +627,38 @@ class CalendarCollection:
         )
         return event
 
+    def _get_vevents(
+        self, item: str, href: str, etag: str | None, calendar: str
+    ) -> list[icalendar.Event]:
+        """return (copies of) the VEVENTs in `item`
+
+        As all instances of a recurring event share the same item, parsed
+        items are kept in a LRU cache, keyed by calendar and href. A cached
+        item is only used as long as its etag (and content) did not change.
+        """
+        key = (calendar, href)
+        cached = self._parsed.get(key)
+        if cached is not None and etag is not None and cached[:2] == (etag, item):
+            self._parsed.move_to_end(key)
+            vevents = cached[2]
+        else:
+            vevents = [c for c in cal_from_ics(item).walk() if c.name == "VEVENT"]
+            if etag is not None:
+                self._parsed[key] = (etag, item, vevents)
+                if len(self._parsed) > PARSED_CACHE_SIZE:
+                    self._parsed.popitem(last=False)
+        return [_copy_component(vevent) for vevent in vevents]
+
     def change_collection(self, event: Event, new_collection: str) -> None:
-        """Moves `event` to a new collection (calendar)"""
+        """Moves `event` to a new collection (calendar)
+
+        :raises DuplicateUid: if `new_collection` already has an event with
+            the same UID
+        """
         href, etag, calendar = event.href, event.etag, event.calendar
+        existing = self._find_in(event.uid, new_collection)
+        if existing is not None:
+            raise DuplicateUid(existing)
         event.etag = None
         self.insert(event, new_collection)
         assert href is not None
@@ -328,10 +692,29 @@ class CalendarCollection:
         """update the db from the vdir,
 
         should be called after every change to the vdir
+
+        If another process is already updating the db, this waits for it
+        (up to `backend.LOCK_TIMEOUT` seconds) instead of updating the same
+        calendars again. If it takes longer, the db is used as it is and
+        `needs_update()` stays True.
+
+        This also moves the horizon, within which the instances of never
+        ending recurring events are stored, along with the current date.
         """
-        for calendar in self._calendars:
-            if self._needs_update(calendar, remember=True):
-                self._db_update(calendar)
+        stale = [c for c in self._calendars if self._needs_update(c, remember=True)]
+        if stale or self._backend.horizon_outdated():
+            with self._backend.update_lock(backend.LOCK_TIMEOUT) as locked:
+                if locked:
+                    for calendar in stale:
+                        # another process might have updated it while we waited
+                        if self._needs_update(calendar, remember=True):
+                            self._db_update(calendar)
+                    self._backend.extend_horizon()
+                else:
+                    logger.warning(
+                        "Another khal process is updating the database, events might be outdated."
+                    )
+        self._check_occupancy()
 
     def needs_update(self) -> bool:
         """Check if you need to call update_db.
@@ -367,36 +750,146 @@ class CalendarCollection:
             self._last_ctags[calendar] = local_ctag
         return local_ctag != self._backend.get_ctag(calendar)
 
+    def diff(self, calendar: str) -> tuple[set[str], set[str], set[str]]:
+        """compare the items in the vdir of `calendar` with those in the db
+
+        :returns: hrefs of the items that have been added to, changed in and
+            deleted from the vdir since the db was last updated
+        """
+        storage = self._storages[calendar]
+        storage_etags = dict(storage.list())
+        db_etags = dict(self._backend.list(calendar))
+        if self._calendars[calendar].get("ctype") == "birthdays":
+            # each date of a contact is stored as its own event, with the
+            # date's key appended to the contact's href
+            end = len(storage.fileext)
+            db_etags = {
+                href[: href.rfind(storage.fileext) + end]: etag for href, etag in db_etags.items()
+            }
+        added = storage_etags.keys() - db_etags.keys()
+        deleted = db_etags.keys() - storage_etags.keys()
+        changed = {
+            href
+            for href in storage_etags.keys() & db_etags.keys()
+            if storage_etags[href] != db_etags[href]
+        }
+        return added, changed, deleted
+
     def _db_update(self, calendar: str) -> None:
         """implements the actual db update on a per calendar base"""
         local_ctag = self._local_ctag(calendar)
-        db_hrefs = {href for href, etag in self._backend.list(calendar)}
-        storage_hrefs: set[str] = set()
-        bdays = self._calendars[calendar].get("ctype") == "birthdays"
-
+        added, changed, deleted = self.diff(calendar)
+        logger.debug(
+            f"Updating {calendar}: {len(added)} added, {len(changed)} changed, "
+            f"{len(deleted)} deleted"
+        )
         with self._backend.at_once():
-            for href, etag in self._storages[calendar].list():
-                storage_hrefs.add(href)
-                db_etag = self._backend.get_etag(href, calendar=calendar)
-                if etag != db_etag:
-                    logger.debug(f"Updating {href} because {etag} != {db_etag}")
-                    self._update_vevent(href, calendar=calendar)
-            for href in db_hrefs - storage_hrefs:
-                if bdays:
-                    for sh in storage_hrefs:
-                        if href.startswith(sh):
-                            break
-                    else:
-                        self._backend.delete(href, calendar=calendar)
-                else:
-                    self._backend.delete(href, calendar=calendar)
+            self._update_vevents(sorted(added | changed), calendar)
+            if self._calendars[calendar].get("ctype") == "birthdays":
+                for href in deleted:
+                    self._backend.deletelike(href + "%", calendar=calendar)
+            else:
+                self._backend.delete_many(deleted, calendar=calendar)
+            for href in deleted:
+                self._parsed.pop((calendar, href), None)
             self._backend.set_ctag(local_ctag, calendar=calendar)
             self._last_ctags[calendar] = local_ctag
 
+    def update_hrefs(
+        self,
+        calendar: str,
+        hrefs: Iterable[str],
+        timeout: float | None = backend.LOCK_TIMEOUT,
+    ) -> tuple[dt.date, dt.date] | None:
+        """update the db for the items `hrefs` of `calendar` only
+
+        Use this instead of `update_db()` if it is known which items have been
+        added, changed or deleted (e.g., by a sync). Afterwards the db is
+        considered up to date with the vdir.
+
+        :param timeout: how long to wait (in seconds) for another process
+            updating the db, None means forever
+        :raises UpdateLocked: if another process is still updating the db
+            after `timeout`, nothing has been updated then
+        :returns: the first and the last day on which events have been changed
+            (including the days they have been moved away from), None if no
+            events were affected
+        """
+        storage = self._storages[calendar]
+        bdays = self._calendars[calendar].get("ctype") == "birthdays"
+        hrefs = set(hrefs)
+        for href in list(hrefs):
+            if not href.endswith(storage.fileext):
+                logger.warning(f"Skipping {href}, only {storage.fileext} files are calendar items.")
+                hrefs.discard(href)
+        local_ctag = self._local_ctag(calendar)
+        changed, deleted = [], []
+        for href in sorted(hrefs):
+            try:
+                etag = get_etag_from_path(os.path.join(storage.path, href))
+            except FileNotFoundError:
+                deleted.append(href)
+                continue
+            if etag != self._backend.get_etag(href, calendar=calendar):
+                changed.append(href)
+
+        days: list[dt.date] = []
+        with self._backend.update_lock(timeout) as locked:
+            if not locked:
+                raise UpdateLocked(f"Another khal process is updating calendar {calendar}.")
+            with self._backend.at_once():
+                days.extend(self._get_days(calendar, changed + deleted, bdays))
+                self._update_vevents(changed, calendar)
+                if bdays:
+                    for href in deleted:
+                        self._backend.deletelike(href + "%", calendar=calendar)
+                else:
+                    self._backend.delete_many(deleted, calendar=calendar)
+                for href in deleted:
+                    self._parsed.pop((calendar, href), None)
+                days.extend(self._get_days(calendar, changed, bdays))
+                self._backend.set_ctag(local_ctag, calendar=calendar)
+                self._last_ctags[calendar] = local_ctag
+                self._backend.extend_horizon()
+        self._occupancy.clear()
+        if not days:
+            return None
+        return min(days), max(days)
+
+    def watch(self) -> VdirWatcher | None:
+        """return a watcher for changes to the calendars' vdirs, feed its
+        changes to `update_hrefs()`
+
+        :returns: None if watching is not supported on this platform
+        """
+        try:
+            return VdirWatcher(self._storages)
+        except OSError as error:
+            logger.debug(f"Cannot watch vdirs for changes: {error}")
+            return None
+
+    def _get_days(self, calendar: str, hrefs: list[str], bdays: bool) -> Iterator[dt.date]:
+        """yield the first and the last day of the instances of `hrefs`"""
+        local_timezone = self._locale["local_timezone"]
+        for start, end, floating in self._backend.get_spans(hrefs, calendar, prefix=bdays):
+            for timestamp in (start, end):
+                utc = dt.datetime.fromtimestamp(timestamp, dt.timezone.utc)
+                yield utc.date() if floating else utc.astimezone(local_timezone).date()
+
+    def _update_vevents(self, hrefs: list[str], calendar: str) -> None:
+        """update the db for all `hrefs`, in parallel if there are many"""
+        bdays = self._calendars[calendar].get("ctype") == "birthdays"
+        if bdays or len(hrefs) < PARALLEL_THRESHOLD or self._workers == 1:
+            for href in hrefs:
+                self._update_vevent(href, calendar=calendar)
+        else:
+            self._update_vevents_parallel(hrefs, calendar)
+
     def _update_vevent(self, href: str, calendar: str) -> bool:
         """should only be called during db_update, only updates the db,
         does not check for readonly"""
         event, etag = self._storages[calendar].get(href)
+        self._parsed.pop((calendar, href), None)
         try:
             if self._calendars[calendar].get("ctype") == "birthdays":
                 update = self._backend.update_vcf_dates
@@ -405,13 +898,47 @@ class CalendarCollection:
             update(event.raw, href=href, etag=etag, calendar=calendar)
             return True
         except Exception as e:
-            if not isinstance(e, UpdateFailed | UnsupportedFeatureError | NonUniqueUID):
-                logger.exception("Unknown exception happened.")
-            logger.warning(
-                f"Skipping {calendar}/{href}: {e!s}\nThis event will not be available in khal."
-            )
+            self._update_failed(e, href, calendar)
             return False
 
+    def _update_vevents_parallel(self, hrefs: list[str], calendar: str) -> None:
+        """like `_update_vevent()` for many `hrefs` at once
+
+        The events are parsed and expanded by a pool of worker processes,
+        while this process reads the files and writes the results into the
+        db (in the order of `hrefs`).
+        """
+        storage = self._storages[calendar]
+        window = self._backend.get_window(calendar)
+        jobs: list[tuple[str, str, str, Future]] = []
+        with ProcessPoolExecutor(max_workers=self._workers or None) as pool:
+            for href in hrefs:
+                item, etag = storage.get(href)
+                future = pool.submit(
+                    backend.expand_item,
+                    item.raw,
+                    href,
+                    calendar,
+                    self._locale["default_timezone"],
+                    window,
+                )
+                jobs.append((href, etag, item.raw, future))
+            for href, etag, raw, future in jobs:
+                self._parsed.pop((calendar, href), None)
+                try:
+                    expanded = future.result()
+                    self._backend.update_expanded(raw, href, etag, calendar, expanded)
+                except Exception as e:
+                    self._backend.delete(href, calendar=calendar)
+                    self._update_failed(e, href, calendar)
+
+    def _update_failed(self, error: Exception, href: str, calendar: str) -> None:
+        if not isinstance(error, UpdateFailed | UnsupportedFeatureError | NonUniqueUID):
+            logger.exception("Unknown exception happened.")
+        logger.warning(
+            f"Skipping {calendar}/{href}: {error!s}\nThis event will not be available in khal."
+        )
+
     def search(self, search_string: str) -> Iterable[Event]:
         """search for the db for events matching `search_string`"""
         return (self._construct_event(*args) for args in self._backend.search(search_string))
@@ -57,12 +57,27 @@ def _generate_href(uid: str | None = None, safe: str = SAFE_UID_CHARS) -> str:
         return uid
 
 
+def _etag_from_stat(stat: os.stat_result) -> str:
+    """Build an etag from the result of a `stat()` call"""
+    return f"{stat.st_mtime_ns};{stat.st_size};{stat.st_ino}"
+
+
+def get_etag_from_path(fpath: str) -> str:
+    """Get mtime-based etag from a filepath (of a file or a directory).
+
+    Only uses `stat()` and therefore neither opens nor syncs the file, use this
+    for reading. Files written by `atomic_write` or `get_etag_from_file` are
+    already synced.
+    """
+    return _etag_from_stat(os.stat(fpath))
+
+
 def get_etag_from_file(f) -> str:
     """Get mtime-based etag from a filepath, file-like object or raw file
     descriptor.
 
     This function will flush/sync the file as much as necessary to obtain a
-    correct mtime.
+    correct mtime, it should therefore only be used after writing to `f`.
     """
     close_f = False
     if hasattr(f, "read"):
@@ -84,10 +99,7 @@ def get_etag_from_file(f) -> str:
         if close_f:
             os.close(f)
 
-    mtime = getattr(stat, "st_mtime_ns", None)
-    if mtime is None:
-        mtime = stat.st_mtime
-    return f"{mtime:.9f}"
+    return _etag_from_stat(stat)
 
 
 class VdirError(IOError):
@@ -205,16 +217,16 @@ class VdirBase:
         return _generate_href(uid) + self.fileext
 
     def list(self) -> Iterable[tuple[str, str]]:
-        for fname in os.listdir(self.path):
-            fpath = os.path.join(self.path, fname)
-            if os.path.isfile(fpath) and fname.endswith(self.fileext):
-                yield fname, get_etag_from_file(fpath)
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if entry.name.endswith(self.fileext) and entry.is_file():
+                    yield entry.name, _etag_from_stat(entry.stat())
 
     def get(self, href: str) -> tuple[Item, str]:
         fpath = self._get_filepath(href)
         try:
             with open(fpath, "rb") as f:
-                return (Item(f.read().decode(self.encoding)), get_etag_from_file(fpath))
+                return (Item(f.read().decode(self.encoding)), _etag_from_stat(os.fstat(f.fileno())))
         except OSError as e:
             if e.errno == errno.ENOENT:
                 raise NotFoundError(href)
@@ -257,7 +269,7 @@ class VdirBase:
         fpath = self._get_filepath(href)
         if not os.path.exists(fpath):
             raise NotFoundError(item.uid)
-        actual_etag = get_etag_from_file(fpath)
+        actual_etag = get_etag_from_path(fpath)
         if etag != actual_etag:
             raise WrongEtagError(etag, actual_etag)
 
@@ -274,7 +286,7 @@ class VdirBase:
         fpath = self._get_filepath(href)
         if not os.path.isfile(fpath):
             raise NotFoundError(href)
-        actual_etag = get_etag_from_file(fpath)
+        actual_etag = get_etag_from_path(fpath)
         if etag != actual_etag:
             raise WrongEtagError(etag, actual_etag)
         os.remove(fpath)
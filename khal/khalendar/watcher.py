@@ -0,0 +1,127 @@
+# Copyright (c) 2013-2022 khal contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+Watching vdirs for changes with Linux' inotify.
+"""
+
+import ctypes
+import errno
+import os
+import struct
+from collections.abc import Mapping
+
+from .vdir import VdirBase
+
+# see inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+# items are written either in place (IN_CLOSE_WRITE), by renaming
+# (IN_MOVED_TO) or by hard linking (IN_CREATE) a temporary file
+WATCH_MASK = (
+    IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+# after these, we don't know what changed anymore
+LOST_TRACK = IN_Q_OVERFLOW | IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED
+
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class VdirWatcher:
+    """watches vdirs for added, changed and deleted items
+
+    Only available on Linux, raises OSError otherwise. Use `fileno()` to wait
+    for changes (e.g., with select) and `read()` to get them.
+    """
+
+    def __init__(self, vdirs: Mapping[str, VdirBase]) -> None:
+        """
+        :param vdirs: the vdirs to watch by the calendar's name
+        """
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            inotify_init1, inotify_add_watch = libc.inotify_init1, libc.inotify_add_watch
+        except (OSError, AttributeError):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._fd = inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "could not initialize inotify")
+        self._watches: dict[int, tuple[str, str]] = {}
+        for name, vdir in vdirs.items():
+            wd = inotify_add_watch(self._fd, os.fsencode(vdir.path), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                self.close()
+                raise OSError(error, f"could not watch {vdir.path}")
+            self._watches[wd] = (name, vdir.fileext)
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+    def read(self) -> dict[str, set[str] | None]:
+        """return all items changed since the last call, by calendar
+
+        If it is not known what changed in a calendar (e.g., because the
+        kernel dropped some changes) its items are None, the whole calendar
+        then needs to be checked for changes.
+        """
+        changes: dict[str, set[str] | None] = {}
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return changes
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    changes = {calendar: None for calendar, _ in self._watches.values()}
+                    continue
+                if wd not in self._watches:
+                    continue
+                calendar, fileext = self._watches[wd]
+                if mask & LOST_TRACK:
+                    changes[calendar] = None
+                elif name.endswith(fileext):
+                    hrefs = changes.setdefault(calendar, set())
+                    if hrefs is not None:
+                        hrefs.add(name)
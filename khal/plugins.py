@@ -1,34 +1,48 @@
-from collections.abc import Callable, Mapping
-from importlib import metadata as importlib_metadata
+from collections.abc import Callable, Iterator, Mapping
+from typing import Any, Generic, TypeVar
 
 # This is a shameless ripoff of mdformat's plugin extension API.
 # see:
 #   https://github.com/executablebooks/mdformat/blob/master/src/mdformat/plugins.py
 #   https://setuptools.pypa.io/en/latest/userguide/entry_point.html
 
+T = TypeVar("T")
 
-def _load_formatters() -> dict[str, Callable[[str], str]]:
-    formatter_entrypoints = importlib_metadata.entry_points(group="khal.formatter")
-    return {ep.name: ep.load() for ep in formatter_entrypoints}
 
+class _EntryPoints(Mapping[str, T], Generic[T]):
+    """all plugins of one entry point group, by name
 
-FORMATTERS: Mapping[str, Callable[[str], str]] = _load_formatters()
+    Looking up entry points is rather slow, therefore the plugins are only
+    discovered (and loaded) when they are first needed.
+    """
 
+    def __init__(self, group: str) -> None:
+        self._group = group
+        self._plugins: dict[str, T] | None = None
 
-def _load_color_themes() -> dict[str, list[tuple[str, ...]]]:
-    color_theme_entrypoints = importlib_metadata.entry_points(group="khal.color_theme")
-    return {ep.name: ep.load() for ep in color_theme_entrypoints}
+    def _load(self) -> dict[str, T]:
+        if self._plugins is None:
+            from importlib import metadata as importlib_metadata
 
+            entrypoints = importlib_metadata.entry_points(group=self._group)
+            self._plugins = {ep.name: ep.load() for ep in entrypoints}
+        return self._plugins
 
-THEMES: dict[
-    str,
-    list[tuple[str, ...]],
-] = _load_color_themes()
+    def __getitem__(self, name: str) -> T:
+        return self._load()[name]
 
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._load())
 
-def _load_commands() -> dict[str, Callable]:
-    command_entrypoints = importlib_metadata.entry_points(group="khal.commands")
-    return {ep.name: ep.load() for ep in command_entrypoints}
+    def __len__(self) -> int:
+        return len(self._load())
 
+    def __repr__(self) -> str:
+        return f"<plugins {self._group}: {self._plugins!r}>"
 
-COMMANDS: dict[str, Callable] = _load_commands()
+
+FORMATTERS: Mapping[str, Callable[[str], str]] = _EntryPoints("khal.formatter")
+
+THEMES: Mapping[str, list[tuple[str, ...]]] = _EntryPoints("khal.color_theme")
+
+COMMANDS: Mapping[str, Callable[..., Any]] = _EntryPoints("khal.commands")
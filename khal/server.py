@@ -0,0 +1,331 @@
+# Copyright (c) 2013-2022 khal contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+`khal serve`, run khal commands for `khalc` without starting a new process.
+
+The server keeps the configuration and the collections (and with them the
+connection to the caching db) around between commands and keeps them up to
+date by watching the vdirs for changes (or, where that isn't supported, by
+checking them whenever it is idle). Commands are run
+one after the other, each with its own stdout and stderr which are sent back
+to the client.
+"""
+
+import importlib
+import io
+import json
+import locale
+import logging
+import os
+import socket
+import socketserver
+import sys
+import time
+import traceback
+from typing import TYPE_CHECKING
+
+import tzlocal
+import xdg.BaseDirectory
+
+from . import cli_utils, client
+from .khalendar.exceptions import UpdateLocked
+from .settings import NoConfigFile, find_configuration_file, get_config
+
+if TYPE_CHECKING:
+    from .khalendar import CalendarCollection
+    from .khalendar.watcher import VdirWatcher
+
+logger = logging.getLogger("khal")
+
+
+class WarmState:
+    """configurations and collections shared between commands"""
+
+    def __init__(self) -> None:
+        self._configs: dict[tuple[str, tuple], tuple[int, dict]] = {}
+        self._collections: dict[tuple, tuple[dict, CalendarCollection, VdirWatcher | None]] = {}
+        # changes the watchers reported, but which could not be applied yet
+        self._pending: dict[tuple, dict[str, set[str] | None]] = {}
+
+    def get_config(self, config_path: str | None) -> dict:
+        """return the configuration, only read it again if the file changed
+
+        The configuration's defaults depend on the timezone and the XDG base
+        directories, clients with different ones get different configurations.
+        """
+        if config_path is None:
+            config_path = find_configuration_file()
+        if config_path is None or not os.path.exists(config_path):
+            raise NoConfigFile()
+        config_path = os.path.abspath(config_path)
+        mtime = os.stat(config_path).st_mtime_ns
+        environment = tuple(
+            sorted(item for item in os.environ.items() if item[0].startswith(("TZ", "XDG_")))
+        )
+        key = (config_path, environment)
+        if key in self._configs:
+            cached_mtime, conf = self._configs[key]
+            if cached_mtime == mtime:
+                return conf
+            self._drop_collections(conf)
+        conf = get_config(config_path)
+        self._configs[key] = (mtime, conf)
+        return conf
+
+    def _drop_collections(self, conf: dict) -> None:
+        for key in [key for key, (c, _, _) in self._collections.items() if c is conf]:
+            watcher = self._collections.pop(key)[2]
+            if watcher is not None:
+                watcher.close()
+            self._pending.pop(key, None)
+
+    def get_collection(self, conf: dict, selection: set[str] | None) -> "CalendarCollection":
+        """return an up to date collection of the selected calendars"""
+        key = (id(conf), None if selection is None else frozenset(selection))
+        if key not in self._collections:
+            collection = cli_utils.new_collection(conf, selection)
+            self._collections[key] = (conf, collection, collection.watch())
+        self._refresh(key)
+        return self._collections[key][1]
+
+    def _refresh(self, key: tuple) -> None:
+        """update the collection with the changes to its vdirs
+
+        Without a watcher, all vdirs need to be checked for changes.
+        """
+        _, collection, watcher = self._collections[key]
+        if watcher is None:
+            if collection.needs_update():
+                logger.debug("vdirs have changed, updating")
+                collection.update_db()
+            return
+        changes = self._pending.setdefault(key, {})
+        for calendar, hrefs in watcher.read().items():
+            known = changes.get(calendar, set())
+            changes[calendar] = None if hrefs is None or known is None else known | hrefs
+        if not changes:
+            return
+        logger.debug("vdirs have changed, updating")
+        if None in changes.values():
+            collection.update_db()
+            if collection.needs_update():
+                # another process is updating the db, try again later
+                return
+            changes.clear()
+        for calendar in list(changes):
+            hrefs = changes[calendar]
+            assert hrefs is not None
+            try:
+                collection.update_hrefs(calendar, hrefs, timeout=0)
+            except UpdateLocked:
+                # another process is updating the db, try again later, the
+                # db can be used as it is until then
+                logger.debug(f"Postponing the update of {calendar}, the db is locked")
+                continue
+            del changes[calendar]
+
+    def update(self) -> None:
+        """update all collections whose vdirs have been changed"""
+        for key in list(self._collections):
+            try:
+                self._refresh(key)
+            except Exception as error:
+                logger.error(f"Updating the collection failed: {error}")
+                logger.debug(error, exc_info=True)
+
+
+class _FrameWriter(io.RawIOBase):
+    """sends everything written to it as frames of one kind to the client"""
+
+    def __init__(self, wfile, kind: bytes, tty: bool) -> None:
+        self._wfile = wfile
+        self._kind = kind
+        self._tty = tty
+
+    def writable(self) -> bool:
+        return True
+
+    def isatty(self) -> bool:
+        return self._tty
+
+    def write(self, data) -> int:
+        send_frame(self._wfile, self._kind, bytes(data))
+        return len(data)
+
+
+def send_frame(wfile, kind: bytes, payload: bytes) -> None:
+    wfile.write(kind + len(payload).to_bytes(4, "big") + payload)
+    wfile.flush()
+
+
+def _text_output(wfile, kind: bytes, tty: bool) -> io.TextIOWrapper:
+    return io.TextIOWrapper(
+        io.BufferedWriter(_FrameWriter(wfile, kind, tty)),
+        encoding="utf-8",
+        line_buffering=True,
+    )
+
+
+def _set_environment(values: dict[str, str | None]) -> dict[str, str | None]:
+    """set (or unset, if None) the environment variables in `values` and
+    update everything that was derived from them when they were read
+
+    :returns: the previous values
+    """
+    previous = {name: os.environ.get(name) for name in values}
+    for name, value in values.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+    changed = [name for name in values if values[name] != previous[name]]
+    if any(name.startswith("TZ") for name in changed):
+        time.tzset()
+        tzlocal.reload_localzone()
+    if any(name.startswith(("LANG", "LC_")) for name in changed):
+        try:
+            locale.setlocale(locale.LC_ALL, "")
+        except locale.Error as error:
+            logger.debug(f"Cannot set the locale: {error}")
+    if any(name.startswith("XDG_") for name in changed):
+        importlib.reload(xdg.BaseDirectory)
+    return previous
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        request = json.loads(self.rfile.readline())
+        argv = request["argv"]
+        if client.get_command(argv) not in client.SERVED_COMMANDS:
+            send_frame(self.wfile, client.STDERR, b"This command cannot be run by khal serve.\n")
+            send_frame(self.wfile, client.EXIT, b"2")
+            return
+        code = self.run(argv, request)
+        send_frame(self.wfile, client.EXIT, str(code).encode())
+
+    def run(self, argv: list[str], request: dict) -> int:
+        from .cli import main_khal
+
+        environment: dict[str, str | None] = {
+            name: None for name in os.environ if client.is_forwarded(name)
+        }
+        environment.update(request["env"])
+        environment.update(COLUMNS=str(request["columns"]), LINES=str(request["lines"]))
+        saved_cwd = os.getcwd()
+        saved_streams = sys.stdin, sys.stdout, sys.stderr
+        saved_handlers, saved_level = logger.handlers[:], logger.level
+
+        os.chdir(request["cwd"])
+        saved_env = _set_environment(environment)
+        sys.stdin = io.StringIO()
+        sys.stdout = _text_output(self.wfile, client.STDOUT, request["stdout_tty"])
+        sys.stderr = _text_output(self.wfile, client.STDERR, request["stderr_tty"])
+        try:
+            main_khal.main(args=argv, prog_name="khal")
+        except SystemExit as exit:
+            if exit.code is None or isinstance(exit.code, int):
+                code = exit.code or 0
+            else:
+                print(exit.code, file=sys.stderr)
+                code = 1
+        except Exception:
+            traceback.print_exc()
+            code = 1
+        else:
+            code = 0
+        finally:
+            for stream in (sys.stdout, sys.stderr):
+                try:
+                    stream.flush()
+                except OSError:
+                    pass
+            sys.stdin, sys.stdout, sys.stderr = saved_streams
+            logger.handlers, logger.level = saved_handlers, saved_level
+            _set_environment(saved_env)
+            os.chdir(saved_cwd)
+        return code
+
+    def finish(self) -> None:
+        try:
+            super().finish()
+        except OSError:
+            # the client went away
+            pass
+
+
+class Server(socketserver.UnixStreamServer):
+    def __init__(self, socket_path: str, state: WarmState) -> None:
+        self.state = state
+        super().__init__(socket_path, _Handler)
+
+    def handle_error(self, request, client_address) -> None:
+        error = sys.exc_info()[1]
+        if isinstance(error, OSError):
+            logger.debug(f"Lost connection to client: {error}")
+        else:
+            logger.exception("Handling a request failed")
+
+    def verify_request(self, request, client_address) -> bool:
+        if client.is_trusted_peer(request):
+            return True
+        logger.warning("Refusing a connection from another user")
+        return False
+
+    def service_actions(self) -> None:
+        self.state.update()
+
+
+def _is_serving(socket_path: str) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+
+def serve(conf_path: str | None, socket_path: str, poll_interval: float = 1.0) -> None:
+    """run `khal serve` until it is interrupted or terminated"""
+    state = WarmState()
+    # loading everything now makes the first command as fast as all others
+    state.get_collection(state.get_config(conf_path), None)
+
+    socket_dir = os.path.dirname(os.path.abspath(socket_path))
+    os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+    if not client.is_private_dir(socket_dir):
+        raise OSError(
+            f"{socket_dir} must be a directory owned by you and inaccessible to "
+            "other users (mode 0700)"
+        )
+    if os.path.exists(socket_path):
+        if _is_serving(socket_path):
+            raise OSError(f"khal serve is already listening on {socket_path}")
+        os.unlink(socket_path)
+
+    cli_utils.warm_state = state
+    server = Server(socket_path, state)
+    logger.info(f"Listening on {socket_path}")
+    try:
+        server.serve_forever(poll_interval=poll_interval)
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
+        cli_utils.warm_state = None
@@ -1,9 +1,10 @@
 from .exceptions import InvalidSettingsError, NoConfigFile
-from .settings import find_configuration_file, get_config
+from .settings import find_configuration_file, get_cached_config, get_config
 
 __all__ = [
     "InvalidSettingsError",
     "NoConfigFile",
     "find_configuration_file",
+    "get_cached_config",
     "get_config",
 ]
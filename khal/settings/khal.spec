@@ -80,6 +80,11 @@ addresses = force_list(default='')
 # khal stores its internal caching database here, by default this will be in the *$XDG_CACHE_HOME/khal/khal.db* (this will most likely be *~/.cache/khal/khal.db*).
 path = expand_db_path(default=None)
 
+# The number of processes khal uses to parse events when (re-)building the
+# caching database, e.g., on the first run or after many events have changed.
+# If set to 0, one process per CPU is used, 1 disables parallel parsing.
+workers = integer(min=0, default=0)
+
 # It is mandatory to set (long)date-, time-, and datetimeformat options, all others options in the **[locale]** section are optional and have (sensible) defaults.
 [locale]
 
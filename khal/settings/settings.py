@@ -22,11 +22,16 @@
 
 import logging
 import os
+import pickle
+import re
+from hashlib import sha1
 
 import xdg.BaseDirectory
 from configobj import ConfigObj, ConfigObjError, flatten_errors, get_extra_values
+from tzlocal import get_localzone
 
-from khal import __productname__
+from khal import __productname__, __version__
+from khal.khalendar.vdir import atomic_write
 
 try:
     # Available from configobj 5.1.0
@@ -34,7 +39,7 @@ try:
 except ModuleNotFoundError:
     from validate import Validator
 
-from collections.abc import Callable
+from collections.abc import Callable, Iterable
 
 from .exceptions import CannotParseConfigFileError, InvalidSettingsError, NoConfigFile
 from .utils import (
@@ -76,6 +81,7 @@ def get_config(
     config_path: str | None = None,
     _get_color_from_vdir: Callable = get_color_from_vdir,
     _get_vdir_type: Callable = get_vdir_type,
+    dependencies: list[str] | None = None,
 ) -> ConfigObj:
     """reads the config file, validates it and return a config dict
 
@@ -83,6 +89,8 @@ def get_config(
                         default locations will be searched
     :param _get_color_from_vdir: override get_color_from_vdir for testing purposes
     :param _get_vdir_type: override get_vdir_type for testing purposes
+    :param dependencies: if given, all files and directories the
+        configuration depends on are appended to it
     :returns: configuration
     """
     if config_path is None:
@@ -137,7 +145,9 @@ def get_config(
     if abort or not results:
         raise InvalidSettingsError()
 
-    config_checks(user_config, _get_color_from_vdir, _get_vdir_type)
+    if dependencies is not None:
+        dependencies.extend([config_path, SPECPATH])
+    config_checks(user_config, _get_color_from_vdir, _get_vdir_type, dependencies)
 
     extras = get_extra_values(user_config)
     for section, value in extras:
@@ -153,6 +163,76 @@ def get_config(
     return user_config
 
 
+def get_cached_config(config_path: str | None = None) -> ConfigObj:
+    """like `get_config()`, but the configuration is cached
+
+    The validated configuration is kept in khal's cache directory until
+    the config file, the spec, or any of the vdirs (or the directories they
+    were discovered in) change, or anything in the environment the
+    configuration's defaults and paths depend on, see `_get_environment()`.
+    """
+    if config_path is None:
+        config_path = find_configuration_file()
+    if config_path is None or not os.path.exists(config_path):
+        raise NoConfigFile()
+    config_path = os.path.abspath(config_path)
+    key = sha1(config_path.encode()).hexdigest()[:16]
+    cache_path = os.path.join(xdg.BaseDirectory.xdg_cache_home, "khal", f"config-{key}.pickle")
+    environment = _get_environment(config_path)
+
+    try:
+        with open(cache_path, "rb") as f:
+            version, mtimes, cached_environment, config = pickle.load(f)
+        if (
+            version == __version__
+            and cached_environment == environment
+            and _get_mtimes(mtimes) == mtimes
+        ):
+            logger.debug(f"using the cached config from {cache_path}")
+            return config
+    except FileNotFoundError:
+        pass
+    except Exception as error:
+        logger.debug(f"cannot read the cached config at {cache_path}: {error}")
+
+    dependencies: list[str] = []
+    config = get_config(config_path, dependencies=dependencies)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with atomic_write(cache_path, overwrite=True) as f:
+            pickle.dump((__version__, _get_mtimes(dependencies), environment, config), f)
+    except (OSError, pickle.PickleError) as error:
+        logger.debug(f"cannot cache the config at {cache_path}: {error}")
+    return config
+
+
+def _get_mtimes(paths: Iterable[str]) -> dict[str, int | None]:
+    """return the mtime (in ns) of each of `paths`, None if it does not exist"""
+    mtimes: dict[str, int | None] = {}
+    for path in paths:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            mtimes[path] = None
+    return mtimes
+
+
+def _get_environment(config_path: str) -> dict[str, str | None]:
+    """return the parts of the environment the configuration at `config_path`
+    depends on
+
+    These are the local timezone (the default for `local_timezone` and
+    `default_timezone`), the variables determining the default paths and
+    the expansion of `~`, and all variables referenced in the config file.
+    """
+    with open(config_path, errors="replace") as f:
+        names = set(re.findall(r"\$\{?(\w+)", f.read()))
+    names.update(["HOME", "TZ", "XDG_CACHE_HOME", "XDG_CONFIG_HOME", "XDG_DATA_HOME"])
+    environment = {name: os.environ.get(name) for name in sorted(names)}
+    environment["local timezone"] = str(get_localzone())
+    return environment
+
+
 def sectionize(sections: list[str], depth: int = 1) -> str:
     """converts list of string into [list][[of]][[[strings]]]"""
     this_part = depth * "[" + sections[0] + depth * "]"
@@ -240,12 +240,34 @@ def validate_palette_entry(attr, definition: str) -> bool:
     return True
 
 
+def get_vdir_roots(expand_path: str, vdirs: Iterable[str]) -> list[str]:
+    """return all directories in which adding a directory could change the
+    vdirs found by `get_all_vdirs(expand_path)`"""
+    root = expand_path.rstrip("/")
+    while glob.has_magic(root):
+        root = os.path.dirname(root)
+    roots = {root}
+    for vdir in vdirs:
+        path = os.path.dirname(vdir)
+        while len(path) > len(root) and path not in roots:
+            roots.add(path)
+            path = os.path.dirname(path)
+    return sorted(roots)
+
+
 def config_checks(
     config,
     _get_color_from_vdir: Callable = get_color_from_vdir,
     _get_vdir_type: Callable = get_vdir_type,
+    dependencies: list[str] | None = None,
 ) -> None:
-    """do some tests on the config we cannot do with configobj's validator"""
+    """do some tests on the config we cannot do with configobj's validator
+
+    :param dependencies: if given, all files and directories that were read
+        (besides the config file) are appended to it
+    """
+    if dependencies is None:
+        dependencies = []
     # TODO rename or split up, we are also expanding vdirs of type discover
     if len(config["calendars"].keys()) < 1:
         logger.fatal("Found no calendar section in the config file")
@@ -266,7 +288,9 @@ def config_checks(
             logger.debug(f"discovering calendars in {cconfig['path']}")
             vdirs_discovered = get_all_vdirs(cconfig["path"])
             logger.debug(f"found the following vdirs: {vdirs_discovered}")
+            dependencies.extend(get_vdir_roots(cconfig["path"], vdirs_discovered))
             for vdir in vdirs_discovered:
+                dependencies.extend([vdir, join(vdir, "color"), join(vdir, "displayname")])
                 vdir_config = {
                     "path": vdir,
                     "color": _get_color_from_vdir(vdir) or cconfig.get("color", None),
@@ -283,9 +307,9 @@ def config_checks(
         if config["calendars"][calendar]["type"] == "birthdays":
             config["calendars"][calendar]["readonly"] = True
         if config["calendars"][calendar]["color"] == "auto":
-            config["calendars"][calendar]["color"] = _get_color_from_vdir(
-                config["calendars"][calendar]["path"]
-            )
+            path = config["calendars"][calendar]["path"]
+            dependencies.extend([path, join(path, "color")])
+            config["calendars"][calendar]["color"] = _get_color_from_vdir(path)
 
     # check palette settings
     valid_palette = True
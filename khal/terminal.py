@@ -21,6 +21,7 @@
 #
 """all functions related to terminal display are collected here"""
 
+import functools
 from itertools import zip_longest
 from typing import NamedTuple
 
@@ -54,6 +55,7 @@ COLORS: dict[str, NamedColor] = {
 }
 
 
+@functools.cache
 def get_color(
     fg: str | None = None,
     bg: str | None = None,
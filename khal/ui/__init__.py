@@ -20,6 +20,7 @@
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import datetime as dt
+import functools
 import logging
 import signal
 import sys
@@ -31,7 +32,7 @@ import urwid
 
 from khal import plugins, utils
 from khal.khalendar import CalendarCollection
-from khal.khalendar.exceptions import FatalError, ReadOnlyCalendarError
+from khal.khalendar.exceptions import FatalError, ReadOnlyCalendarError, UpdateLocked
 from khal.parse_datetime import timedelta2str
 
 from . import colors
@@ -1134,6 +1135,9 @@ class ClassicView(Pane):
                 weeknumbers=self._conf["locale"]["weeknumbers"],
                 monthdisplay=self._conf["view"]["monthdisplay"],
                 get_styles=collection.get_styles,
+                prefetch=(
+                    collection.get_calendars_between if collection.highlight_event_days else None
+                ),
             ),
             "calendar",
             "calendar focus",
@@ -1535,7 +1539,10 @@ def start_pane(
             meta["last_today"] = today
             pane.calendar.original_widget.reset_styles_range(today - dt.timedelta(days=1), today)
             pane.eventscolumn.original_widget.update_date_line()
-        loop.set_alarm_in(60, redraw_today, pane)
+        # wake up just after midnight
+        tomorrow = dt.datetime.combine(today + dt.timedelta(days=1), dt.time.min)
+        seconds = (tomorrow - dt.datetime.now()).total_seconds() + 1
+        loop.set_alarm_in(min(max(seconds, 1), 60 * 60), redraw_today, pane)
 
     loop.set_alarm_in(60, redraw_today, pane)
 
@@ -1547,7 +1554,57 @@ def start_pane(
             pane.window.alert("detected external vdir modification, updated.")
         loop.set_alarm_in(60, check_for_updates, pane)
 
-    loop.set_alarm_in(60, check_for_updates, pane)
+    def apply_vdir_changes(loop, changes):
+        days = []
+        everything = False
+        error = None
+        try:
+            for calendar, hrefs in list(changes.items()):
+                if hrefs is None:
+                    everything = True
+                else:
+                    days.extend(pane.collection.update_hrefs(calendar, hrefs, timeout=0) or [])
+                    del changes[calendar]
+            if everything:
+                pane.collection.update_db()
+            changes.clear()
+        except UpdateLocked:
+            # another khal process is updating the db, keep the remaining
+            # changes and try again in a moment instead of blocking the UI
+            everything = False
+            loop.set_alarm_in(1, apply_vdir_changes, changes)
+        except Exception as exc:
+            logger.debug(exc, exc_info=True)
+            everything = False
+            error = exc
+            changes.clear()
+        if everything:
+            pane.eventscolumn.base_widget.update(None, None, everything=True)
+        elif days:
+            pane.calendar.original_widget.reset_styles_range(min(days), max(days))
+            pane.eventscolumn.base_widget.update(min(days), max(days), everything=False)
+        if error is not None:
+            pane.window.alert(("alert", f"Failed to apply external vdir modification: {error}"))
+        elif everything or days:
+            pane.window.alert("detected external vdir modification, updated.")
+
+    def on_vdir_change(watcher, changes):
+        new_changes = watcher.read()
+        if new_changes and not changes:
+            # changes usually come in bursts (e.g., while syncing), so
+            # collect them for a moment before updating
+            loop.set_alarm_in(0.2, apply_vdir_changes, changes)
+        for calendar, hrefs in new_changes.items():
+            if hrefs is None or changes.get(calendar, set()) is None:
+                changes[calendar] = None
+            else:
+                changes.setdefault(calendar, set()).update(hrefs)
+
+    watcher = pane.collection.watch()
+    if watcher is None:
+        loop.set_alarm_in(60, check_for_updates, pane)
+    else:
+        loop.watch_file(watcher.fileno(), functools.partial(on_vdir_change, watcher, {}))
 
     colors_ = 2**24 if color_mode == "rgb" else 256
     loop.screen.set_terminal_properties(
@@ -43,6 +43,7 @@ class MarkType(TypedDict):
 
 OnPressType = dict[str, Callable[[dt.date, dt.date | None], str | None]]
 GetStylesSignature = Callable[[dt.date, bool], str | tuple[str, str] | None]
+PrefetchSignature = Callable[[dt.date, dt.date], Any]
 
 
 setlocale(LC_ALL, "")
@@ -388,6 +389,7 @@ class CalendarWalker(urwid.SimpleFocusListWalker):
         weeknumbers: Literal["left", "right", False] = False,
         monthdisplay: Literal["firstday", "firstfullweek"] = "firstday",
         initial: dt.date | None = None,
+        prefetch: PrefetchSignature | None = None,
     ) -> None:
         self.firstweekday = firstweekday
         self.weeknumbers = weeknumbers
@@ -396,6 +398,7 @@ class CalendarWalker(urwid.SimpleFocusListWalker):
         self.on_press = on_press
         self.keybindings = keybindings
         self.get_styles = get_styles
+        self.prefetch = prefetch
         self.reset(initial)
 
     def reset(self, initial: dt.date | None = None) -> None:
@@ -451,8 +454,12 @@ class CalendarWalker(urwid.SimpleFocusListWalker):
 
     def reset_styles_range(self, min_date: dt.date, max_date: dt.date) -> None:
         """reset styles for all (displayed) dates between min_date and max_date"""
-        minr, minc = self.get_date_pos(max(min_date, self.earliest_date))
-        maxr, maxc = self.get_date_pos(min(max_date, self.latest_date))
+        min_date = max(min_date, self.earliest_date)
+        max_date = min(max_date, self.latest_date)
+        if self.prefetch is not None:
+            self.prefetch(min_date, max_date)
+        minr, minc = self.get_date_pos(min_date)
+        maxr, maxc = self.get_date_pos(max_date)
         focus_pos = self.focus, self[self.focus].focus_col
 
         for row in range(minr, maxr + 1):
@@ -585,6 +592,8 @@ class CalendarWalker(urwid.SimpleFocusListWalker):
         """
 
         plain_weeks = calendar.Calendar(self.firstweekday).monthdatescalendar(year, month)
+        if self.prefetch is not None:
+            self.prefetch(plain_weeks[0][0], plain_weeks[-1][-1])
         weeks = []
         for _number, week in enumerate(plain_weeks):
             weeks.append(self._construct_week(week))
@@ -607,6 +616,7 @@ class CalendarWidget(urwid.WidgetWrap):
         monthdisplay: Literal["firstday", "firstfullweek"] = "firstday",
         get_styles: GetStylesSignature | None = None,
         initial: dt.date | None = None,
+        prefetch: PrefetchSignature | None = None,
     ) -> None:
         """A calendar widget that can be used in urwid applications
 
@@ -639,6 +649,9 @@ class CalendarWidget(urwid.WidgetWrap):
            month or in the first row that only contains days of the current month.
         :param get_styles: a function that returns a list of styles for a given date
         :param initial: the date that is selected when the widget is first rendered
+        :param prefetch: a function that is called with the first and the last
+           date of a range before `get_styles` is called for the dates in it,
+           e.g., to look up the styles of all those dates at once
         """
         if initial is None:
             self._initial = dt.date.today()
@@ -703,6 +716,7 @@ class CalendarWidget(urwid.WidgetWrap):
             monthdisplay=monthdisplay,
             get_styles=get_styles,
             initial=self._initial,
+            prefetch=prefetch,
         )
         self.box = CListBox(self.walker)
         frame = urwid.Frame(self.box, header=cnames)
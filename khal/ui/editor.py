@@ -25,6 +25,7 @@ from typing import TYPE_CHECKING, Literal
 
 import urwid
 
+from khal.khalendar.exceptions import DuplicateUid
 from khal.utils import get_weekday_occurrence, get_wrapped_text
 
 from .calendarwidget import CalendarWidget
@@ -649,13 +650,21 @@ class EventEditor(urwid.WidgetWrap):
             self.update_vevent()
             self.event.allday = self.startendeditor.allday
             self.event.increment_sequence()
-            if self.event.etag is None:  # has not been saved before
-                self.event.calendar = self.calendar_chooser.original_widget.active["name"]
-                self.collection.insert(self.event)
-            elif self.calendar_chooser.changed:
-                self.collection.change_collection(self.event, self.calendar_chooser.active["name"])
-            else:
-                self.collection.update(self.event)
+            try:
+                if self.event.etag is None:  # has not been saved before
+                    self.event.calendar = self.calendar_chooser.original_widget.active["name"]
+                    self.collection.insert(self.event)
+                elif self.calendar_chooser.changed:
+                    self.collection.change_collection(
+                        self.event, self.calendar_chooser.active["name"]
+                    )
+                else:
+                    self.collection.update(self.event)
+            except DuplicateUid:
+                self.pane.window.alert(
+                    ("light red", "Can't save: an event with this UID already exists there!")
+                )
+                return
 
             self._save_callback(
                 self.event.start_local,
@@ -27,17 +27,20 @@ import random
 import re
 import string
 from calendar import month_abbr, timegm
-from collections.abc import Iterator
+from collections.abc import Callable, Iterator, Mapping
 from textwrap import wrap
+from typing import TYPE_CHECKING, Any
 
-import icalendar
 import pytz
-import urwid
 from click import style
 
 from .parse_datetime import guesstimedeltafstr
 from .terminal import get_color
 
+if TYPE_CHECKING:
+    import icalendar
+    import urwid
+
 
 def generate_random_uid() -> str:
     """generate a random uid
@@ -57,6 +60,8 @@ ansi_sgr = re.compile(
     "([0-9]+;?)+"
     "m"
 )
+# whitespace (besides spaces) that wrap() replaces
+wrap_whitespace = re.compile(r"[\t\n\x0b\x0c\r]")
 
 
 def find_last_reset(string: str) -> tuple[int, int, str]:
@@ -94,8 +99,14 @@ def color_wrap(text: str, width: int = 70) -> list[str]:
     that code to the next line
     """
     # TODO we really want to ignore all SGR codes when measuring the width
-    lines = wrap(text, width)
+    if 0 < len(text) <= width and not text.endswith(" ") and not wrap_whitespace.search(text):
+        # wrap() would return the text unchanged
+        lines = [text]
+    else:
+        lines = wrap(text, width)
     for num, _ in enumerate(lines):
+        if "\x1b[" not in lines[num]:
+            continue
         sgr = find_unmatched_sgr(lines[num])
         if sgr is not None:
             lines[num] += RESET
@@ -129,9 +140,9 @@ def localize_strip_tz(dates: list[dt.datetime], timezone: dt.tzinfo) -> Iterator
         yield one_date
 
 
-def to_unix_time(dtime: dt.datetime) -> float:
-    """convert a datetime object to unix time in UTC (as a float)"""
-    if getattr(dtime, "tzinfo", None) is not None:
+def to_unix_time(dtime: dt.datetime | dt.date) -> float:
+    """convert a datetime (or date) object to unix time in UTC (as a float)"""
+    if isinstance(dtime, dt.datetime) and dtime.tzinfo is not None:
         dtime = dtime.astimezone(pytz.UTC)
     unix_time = timegm(dtime.timetuple())
     return unix_time
@@ -181,32 +192,75 @@ def relative_timedelta_str(day: dt.date) -> str:
     return f"{approx}{count} {unit} {direction}"
 
 
-def get_wrapped_text(widget: urwid.AttrMap) -> str:
+def get_wrapped_text(widget: "urwid.AttrMap") -> str:
     return widget.original_widget.get_edit_text()
 
 
+def format_fields(format_string: str) -> set[str]:
+    """return the names of all fields used in `format_string`"""
+    fields = set()
+    for _, field_name, format_spec, _ in string.Formatter().parse(format_string):
+        if field_name is not None:
+            fields.add(re.split(r"[.\[]", field_name, maxsplit=1)[0])
+        if format_spec:
+            fields |= format_fields(format_spec)
+    return fields
+
+
+def compile_format(format_string: str) -> Callable[[Mapping[str, Any]], str]:
+    """parse `format_string` once and return a function that formats a row
+
+    If all replacement fields are plain field names (no attribute or index
+    access, conversions or format specs), the row's values are joined
+    directly, otherwise every row is formatted with `str.format_map()`.
+    """
+    parts: list[tuple[str, str | None]] = []
+    for literal, field_name, format_spec, conversion in string.Formatter().parse(format_string):
+        if field_name is not None and (
+            format_spec
+            or conversion
+            or not field_name
+            or field_name.isdigit()
+            or re.search(r"[.\[]", field_name)
+        ):
+            return format_string.format_map
+        parts.append((literal, field_name))
+
+    def fmt(row: Mapping[str, Any]) -> str:
+        chunks = []
+        for literal, field_name in parts:
+            chunks.append(literal)
+            if field_name is not None:
+                chunks.append(str(row[field_name]))
+        return "".join(chunks)
+
+    return fmt
+
+
 def human_formatter(format_string, width=None, colors=True):
     """Create a formatter that formats events to be human readable."""
+    fields = format_fields(format_string)
+    template = compile_format(format_string)
+    convert_color = "calendar-color" in fields
+    convert_alarms = "alarms-list" in fields
+    reset = style("", reset=True) if colors else ""
 
     def fmt(rows):
-        single = isinstance(rows, dict)
+        single = isinstance(rows, Mapping)
         if single:
             rows = [rows]
         results = []
         for row in rows:
-            if "calendar-color" in row:
+            if convert_color and "calendar-color" in row:
                 row["calendar-color"] = get_color(row["calendar-color"])
 
-            if "alarms-list" in row and isinstance(row["alarms-list"], list):
+            if convert_alarms and isinstance(row.get("alarms-list"), list):
                 row["alarms-list"] = ", ".join(
                     alarm["description"] + "@" + alarm["delta-formatted"]
                     for alarm in row["alarms-list"]
                 )
 
-            s = format_string.format(**row)
-
-            if colors:
-                s += style("", reset=True)
+            s = template(row) + reset
 
             if width:
                 results += color_wrap(s, width)
@@ -267,30 +321,37 @@ CONTENT_ATTRIBUTES = [
 ]
 
 
-def json_formatter(fields):
-    """Create a formatter that formats events in JSON."""
-
+def _json_filter(fields) -> Callable[[Mapping[str, Any]], dict[str, Any]]:
+    """return a function that picks `fields` from a row for JSON output"""
     if len(fields) == 1 and fields[0] == "all":
         fields = CONTENT_ATTRIBUTES
+    wanted = set(fields) & set(CONTENT_ATTRIBUTES)
 
-    def fmt(rows):
-        single = isinstance(rows, dict)
-        if single:
-            rows = [rows]
+    def filter_row(row):
+        # only look up the wanted attributes, but keep the order of `row`
+        f = {key: row[key] for key in row if key in wanted}
+
+        if f.get("repeat-symbol", "") != "":
+            f["repeat-symbol"] = f["repeat-symbol"].strip()
+        if f.get("status", "") != "":
+            f["status"] = f["status"].strip()
+        if f.get("cancelled", "") != "":
+            f["cancelled"] = f["cancelled"].strip()
+        return f
+
+    return filter_row
 
-        filtered = []
-        for row in rows:
-            f = dict(filter(lambda e: e[0] in fields and e[0] in CONTENT_ATTRIBUTES, row.items()))
 
-            if f.get("repeat-symbol", "") != "":
-                f["repeat-symbol"] = f["repeat-symbol"].strip()
-            if f.get("status", "") != "":
-                f["status"] = f["status"].strip()
-            if f.get("cancelled", "") != "":
-                f["cancelled"] = f["cancelled"].strip()
+def json_formatter(fields):
+    """Create a formatter that formats events in JSON."""
+    filter_row = _json_filter(fields)
 
-            filtered.append(f)
+    def fmt(rows):
+        single = isinstance(rows, Mapping)
+        if single:
+            rows = [rows]
 
+        filtered = [filter_row(row) for row in rows]
         results = [json.dumps(filtered, ensure_ascii=False)]
 
         if single:
@@ -301,6 +362,19 @@ def json_formatter(fields):
     return fmt
 
 
+def ndjson_formatter(fields):
+    """Create a formatter that formats each event as a JSON object on a line
+    of its own (newline delimited JSON)."""
+    filter_row = _json_filter(fields)
+
+    def fmt(rows):
+        if isinstance(rows, Mapping):
+            return json.dumps(filter_row(rows), ensure_ascii=False)
+        return [json.dumps(filter_row(row), ensure_ascii=False) for row in rows]
+
+    return fmt
+
+
 def alarmstr2trigger(alarms: str) -> Iterator[dt.timedelta]:
     """convert a comma separated list of alarm strings to dt.timedelta"""
     for alarm in alarms.split(","):
@@ -309,8 +383,10 @@ def alarmstr2trigger(alarms: str) -> Iterator[dt.timedelta]:
         yield alarm_trig
 
 
-def str2alarm(alarms: str, description: str) -> Iterator[icalendar.Alarm]:
+def str2alarm(alarms: str, description: str) -> Iterator["icalendar.Alarm"]:
     """convert a comma separated list of alarm strings to icalendar.Alarm"""
+    import icalendar
+
     for alarm_trig in alarmstr2trigger(alarms):
         new_alarm = icalendar.Alarm()
         new_alarm.add("ACTION", "DISPLAY")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Measure the size of khal's cache and how fast it can be queried.
+
+Fills a database with generated events (by default 20 calendars of 1000
+events each, every tenth one recurring weekly for a year) and reports the
+size of the database file and the time some typical queries take, run from
+the root of khal's source tree::
+
+    python misc/benchmark_db.py [NUMBER_OF_CALENDARS] [EVENTS_PER_CALENDAR]
+"""
+
+import datetime as dt
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+import pytz
+
+from khal.khalendar.backend import SQLiteDb
+
+BERLIN = pytz.timezone("Europe/Berlin")
+LOCALE = {
+    "default_timezone": BERLIN,
+    "local_timezone": BERLIN,
+}
+
+EVENT = """BEGIN:VCALENDAR
+BEGIN:VEVENT
+UID:{uid}
+SUMMARY:Event number {number}
+LOCATION:Room {room}
+DTSTART;TZID=Europe/Berlin:{start:%Y%m%dT%H%M%S}
+DTEND;TZID=Europe/Berlin:{end:%Y%m%dT%H%M%S}
+{rrule}END:VEVENT
+END:VCALENDAR
+"""
+
+
+def fill(db: SQLiteDb, calendars: list[str], events: int) -> None:
+    start = dt.datetime(2024, 1, 1, 8)
+    with db.at_once():
+        for calendar in calendars:
+            for number in range(events):
+                uid = str(uuid.uuid4())
+                dtstart = start + dt.timedelta(hours=7 * number)
+                vevent = EVENT.format(
+                    uid=uid,
+                    number=number,
+                    room=number % 50,
+                    start=dtstart,
+                    end=dtstart + dt.timedelta(hours=1),
+                    rrule="RRULE:FREQ=WEEKLY;COUNT=52\n" if number % 10 == 0 else "",
+                )
+                db.update(vevent, f"{uid}.ics", etag=str(number), calendar=calendar)
+
+
+def timeit(name: str, function, repeat: int = 20) -> None:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    print(f"{name:<28} {(time.perf_counter() - start) / repeat * 1000:8.2f} ms")
+
+
+def main(calendars: int = 20, events: int = 1000) -> None:
+    names = [f"calendar_{number}" for number in range(calendars)]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = os.path.join(tmpdir, "khal.db")
+        db = SQLiteDb(names, db_path, locale=LOCALE)
+        start = time.perf_counter()
+        fill(db, names, events)
+        print(f"{'filling the db':<28} {time.perf_counter() - start:8.2f} s")
+        db.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        db.conn.execute("VACUUM")
+        print(f"{'size of the db':<28} {os.path.getsize(db_path) / 2**20:8.2f} MiB")
+
+        month = BERLIN.localize(dt.datetime(2024, 3, 1)), BERLIN.localize(dt.datetime(2024, 4, 1))
+        week = BERLIN.localize(dt.datetime(2024, 3, 4)), BERLIN.localize(dt.datetime(2024, 3, 11))
+        timeit("events in a month", lambda: list(db.get_localized(*month)))
+        timeit("events in a week", lambda: list(db.get_localized(*week)))
+        timeit("calendars in a month", lambda: list(db.get_localized_calendar_spans(*month)))
+        timeit("search", lambda: list(db.search("room 7")), repeat=5)
+        some = names[: max(1, calendars // 4)]
+        db = SQLiteDb(some, db_path, locale=LOCALE)
+        timeit(f"month in {len(some)} calendars", lambda: list(db.get_localized(*month)))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Measure how many events per second khal's formatters can format.
+
+Formats a year of generated events (about 10000 instances) with khal list's
+default agenda format and with json output of the default fields, run
+from the root of khal's source tree::
+
+    python misc/benchmark_formatters.py [NUMBER_OF_EVENTS]
+"""
+
+import datetime as dt
+import sys
+import time
+
+import pytz
+
+from khal.khalendar.event import Event
+from khal.utils import human_formatter, json_formatter
+
+BERLIN = pytz.timezone("Europe/Berlin")
+LOCALE = {
+    "default_timezone": BERLIN,
+    "local_timezone": BERLIN,
+    "dateformat": "%d.%m.",
+    "longdateformat": "%d.%m.%Y",
+    "timeformat": "%H:%M",
+    "datetimeformat": "%d.%m. %H:%M",
+    "longdatetimeformat": "%d.%m.%Y %H:%M",
+    "unicode_symbols": True,
+    "firstweekday": 0,
+    "weeknumbers": False,
+}
+ENV = {"calendars": {"work": {"color": "dark green", "displayname": "Work"}}}
+
+AGENDA_FORMAT = (
+    "{calendar-color}{cancelled}{start-end-time-style} {title}{repeat-symbol}"
+    "{alarm-symbol}{description-separator}{description}{reset}"
+)
+JSON_FIELDS = ["title", "start", "end", "calendar", "location"]
+
+EVENT = """BEGIN:VCALENDAR
+BEGIN:VEVENT
+UID:benchmark-{number}
+SUMMARY:Meeting number {number} about something rather important
+DESCRIPTION:Bring the slides and some coffee for meeting {number}
+LOCATION:Room {number}
+DTSTART;TZID=Europe/Berlin:{start:%Y%m%dT%H%M%S}
+DTEND;TZID=Europe/Berlin:{end:%Y%m%dT%H%M%S}
+END:VEVENT
+END:VCALENDAR
+"""
+
+
+def generate_events(number: int) -> list[tuple[Event, dt.date]]:
+    events = []
+    first = dt.datetime(2024, 1, 1, 8)
+    for num in range(number):
+        start = first + dt.timedelta(days=num * 365 // number, hours=num % 10)
+        ics = EVENT.format(number=num, start=start, end=start + dt.timedelta(minutes=45))
+        event = Event.fromString(ics, locale=LOCALE, calendar="work")
+        events.append((event, start.date()))
+    return events
+
+
+def benchmark(name: str, formatter, events: list[tuple[Event, dt.date]]) -> None:
+    start = time.perf_counter()
+    for event, day in events:
+        formatter(event.attributes(day, env=ENV))
+    duration = time.perf_counter() - start
+    print(f"{name}: {len(events) / duration:.0f} events/s")
+
+
+def main() -> None:
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    events = generate_events(number)
+    benchmark("human", human_formatter(AGENDA_FORMAT, width=80), events)
+    benchmark("json", json_formatter(JSON_FIELDS), events)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,473 @@
 import datetime as dt
+import sqlite3
 from operator import itemgetter
 
 import icalendar
 import pytest
+from freezegun import freeze_time
 
+from khal import utils
 from khal.khalendar import backend
 from khal.khalendar.exceptions import OutdatedDbVersionError, UpdateFailed
+from khal.khalendar.vdir import get_etag_from_path
 
-from .utils import BERLIN, LOCALE_BERLIN, _get_text
+from .utils import BERLIN, LOCALE_BERLIN, LOCALE_NEW_YORK, NEW_YORK, _get_text
 
 calname = "home"
 
 
 def test_new_db_version():
     dbi = backend.SQLiteDb(calname, ":memory:", locale=LOCALE_BERLIN)
-    backend.DB_VERSION += 1
+    dbi.cursor.execute("UPDATE version SET version = ?", (backend.DB_VERSION + 1,))
     with pytest.raises(OutdatedDbVersionError):
         dbi._check_table_version()
 
 
+def test_old_db_version(tmpdir, monkeypatch):
+    """databases created by older versions of khal get rebuilt"""
+    db_path = str(tmpdir) + "/khal.db"
+    dbi = backend.SQLiteDb([calname], db_path, locale=LOCALE_BERLIN)
+    dbi.update(_get_text("event_dt_simple"), href="12345.ics", etag="abcd", calendar=calname)
+    dbi.set_ctag("a_ctag", calendar=calname)
+    dbi.conn.close()
+
+    monkeypatch.setattr(backend, "DB_VERSION", backend.DB_VERSION + 1)
+    dbi = backend.SQLiteDb([calname], db_path, locale=LOCALE_BERLIN)
+    assert dbi.list(calname) == []
+    assert dbi.get_ctag(calname) is None
+    dbi.cursor.execute("SELECT version FROM version")
+    assert dbi.cursor.fetchone() == (backend.DB_VERSION,)
+
+
+def test_migrate(tmpdir, monkeypatch):
+    """migrations keep the db, but events whose derived data changed need to
+    be updated"""
+    db_path = str(tmpdir) + "/khal.db"
+    dbi = backend.SQLiteDb([calname, "work"], db_path, locale=LOCALE_BERLIN)
+    dbi.update(_get_text("event_dt_simple"), href="simple.ics", etag="abcd", calendar=calname)
+    dbi.update(_get_text("event_d"), href="d.ics", etag="efgh", calendar="work")
+    dbi.set_ctag("home_ctag", calendar=calname)
+    dbi.set_ctag("work_ctag", calendar="work")
+    dbi.conn.close()
+
+    def migrate(db):
+        db.cursor.execute("ALTER TABLE events ADD COLUMN color TEXT")
+        backend._invalidate(db, "href = 'd.ics'")
+
+    monkeypatch.setattr(backend, "DB_VERSION", backend.DB_VERSION + 1)
+    monkeypatch.setitem(backend.MIGRATIONS, backend.DB_VERSION, migrate)
+    dbi = backend.SQLiteDb([calname, "work"], db_path, locale=LOCALE_BERLIN)
+    assert dbi.list(calname) == [("simple.ics", "abcd")]
+    assert dbi.list("work") == [("d.ics", None)]
+    assert dbi.get_ctag(calname) == "home_ctag"
+    assert dbi.get_ctag("work") is None
+    assert dbi.sql_ex("SELECT color FROM events", ()) == [(None,), (None,)]
+    assert dbi.sql_ex("SELECT version FROM version", ()) == [(backend.DB_VERSION,)]
+
+
+def test_migrate_failed(tmpdir, monkeypatch):
+    """if a migration fails, the db gets rebuilt"""
+    db_path = str(tmpdir) + "/khal.db"
+    dbi = backend.SQLiteDb([calname], db_path, locale=LOCALE_BERLIN)
+    dbi.update(_get_text("event_dt_simple"), href="simple.ics", etag="abcd", calendar=calname)
+    dbi.conn.close()
+
+    def migrate(db):
+        db.cursor.execute("DELETE FROM search")
+        db.cursor.execute("ALTER TABLE no_such_table ADD COLUMN color TEXT")
+
+    monkeypatch.setattr(backend, "DB_VERSION", backend.DB_VERSION + 1)
+    monkeypatch.setitem(backend.MIGRATIONS, backend.DB_VERSION, migrate)
+    dbi = backend.SQLiteDb([calname], db_path, locale=LOCALE_BERLIN)
+    assert dbi.list(calname) == []
+    assert dbi.sql_ex("SELECT version FROM version", ()) == [(backend.DB_VERSION,)]
+
+
+def _create_db_0_14_0(db_path):
+    """create an empty db with the layout (version 5) khal 0.14.0 created"""
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS version (version INTEGER);
+        INSERT INTO version (version) VALUES (5);
+        CREATE TABLE IF NOT EXISTS calendars (
+            calendar TEXT NOT NULL UNIQUE,
+            resource TEXT NOT NULL,
+            ctag TEXT
+            );
+        CREATE TABLE IF NOT EXISTS events (
+                href TEXT NOT NULL,
+                calendar TEXT NOT NULL,
+                sequence INT,
+                etag TEXT,
+                item TEXT,
+                primary key (href, calendar)
+                );
+        CREATE TABLE IF NOT EXISTS recs_loc (
+            dtstart INT NOT NULL,
+            dtend INT NOT NULL,
+            href TEXT NOT NULL REFERENCES events( href ),
+            rec_inst TEXT NOT NULL,
+            ref TEXT NOT NULL,
+            dtype INT NOT NULL,
+            calendar TEXT NOT NULL,
+            primary key (href, rec_inst, calendar)
+            );
+        CREATE TABLE IF NOT EXISTS recs_float (
+            dtstart INT NOT NULL,
+            dtend INT NOT NULL,
+            href TEXT NOT NULL REFERENCES events( href ),
+            rec_inst TEXT NOT NULL,
+            ref TEXT NOT NULL,
+            dtype INT NOT NULL,
+            calendar TEXT NOT NULL,
+            primary key (href, rec_inst, calendar)
+            );
+        INSERT INTO calendars VALUES ('home', '', 'a_ctag');
+    """)
+    return conn
+
+
+def test_migrate_from_0_14_0(tmpdir):
+    """databases created by khal 0.14.0 are migrated, their events only need
+    to be parsed again, but can be read meanwhile"""
+    dbi = backend.SQLiteDb([calname], ":memory:", locale=LOCALE_BERLIN)
+    dbi.update(_get_text("event_dt_simple"), href="simple.ics", etag="abcd", calendar=calname)
+    instance = dbi.sql_ex("SELECT dtstart, dtend, rec_inst, ref, dtype FROM recs_loc", ())[0]
+    db_path = str(tmpdir) + "/khal.db"
+
+    conn = _create_db_0_14_0(db_path)
+    conn.execute(
+        "INSERT INTO events (href, calendar, etag, item) VALUES (?, ?, ?, ?)",
+        ("simple.ics", calname, "abcd", _get_text("event_dt_simple")),
+    )
+    conn.execute(
+        "INSERT INTO recs_loc (dtstart, dtend, rec_inst, ref, dtype, href, calendar) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        instance + ("simple.ics", calname),
+    )
+    conn.commit()
+    conn.close()
+
+    dbi = backend.SQLiteDb([calname], db_path, locale=LOCALE_BERLIN)
+    assert dbi.sql_ex("SELECT version FROM version", ()) == [(backend.DB_VERSION,)]
+    # events need to be parsed again for the search index
+    assert dbi.list(calname) == [("simple.ics", None)]
+    assert dbi.get_ctag(calname) is None
+    assert dbi.find_by_uid("V042MJ8B3SJNFXQOJL6P53OFMHJE8Z3VZWOU") == [
+        (calname, "simple.ics", None)
+    ]
+    events = list(
+        dbi.get_localized(
+            BERLIN.localize(dt.datetime(2014, 4, 9, 0, 0)),
+            BERLIN.localize(dt.datetime(2014, 4, 10, 0, 0)),
+        )
+    )
+    assert [event[1] for event in events] == ["simple.ics"]
+    assert list(dbi.search("event")) == []
+
+    dbi.update(_get_text("event_dt_simple"), href="simple.ics", etag="abcd", calendar=calname)
+    assert dbi.list(calname) == [("simple.ics", "abcd")]
+    assert [event[1] for event in dbi.search("event")] == ["simple.ics"]
+
+
+def test_migrate_default_tz_from_0_14_0(tmpdir):
+    """events whose times are localized in the default timezone are flagged
+    when migrating, so they get updated once the default timezone changes"""
+    db_path = str(tmpdir) + "/khal.db"
+    conn = _create_db_0_14_0(db_path)
+    conn.executemany(
+        "INSERT INTO events (href, calendar, etag, item) VALUES (?, ?, ?, ?)",
+        [
+            (f"{name}.ics", calname, "abcd", _get_text(name))
+            for name in ["event_dt_simple", "event_dt_local_missing_tz", "event_d"]
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+    dbi = backend.SQLiteDb([calname], db_path, locale=LOCALE_BERLIN)
+    assert dbi.sql_ex("SELECT version FROM version", ()) == [(backend.DB_VERSION,)]
+    assert dict(dbi.sql_ex("SELECT href, default_tz FROM events", ())) == {
+        "event_dt_simple.ics": 0,
+        "event_dt_local_missing_tz.ics": 1,
+        "event_d.ics": 0,
+    }
+
+
+def test_migrate_etags(tmpdir):
+    """etags in the format used before version 13 are converted if the files
+    did not change, so they don't need to be parsed again"""
+    vdir = tmpdir.mkdir(calname)
+    for name in ["unchanged.ics", "changed.ics", "contact.vcf"]:
+        vdir.join(name).write("")
+    paths = {calname: str(vdir)}
+
+    def old_etag(name=""):
+        return f"{vdir.join(name).stat().mtime_ns:.9f}"
+
+    db_path = str(tmpdir) + "/khal.db"
+    dbi = backend.SQLiteDb([calname], db_path, locale=LOCALE_BERLIN, paths=paths)
+    for text, href, etag in [
+        ("event_dt_simple", "unchanged.ics", old_etag("unchanged.ics")),
+        ("event_d", "changed.ics", "1.000000000"),
+        # a date of a contact, see update_vcf_dates()
+        ("event_d_no_value", "contact.vcfBDAY", old_etag("contact.vcf")),
+    ]:
+        dbi.update(_get_text(text), href=href, etag=etag, calendar=calname)
+    dbi.set_ctag(old_etag(), calendar=calname)
+    dbi.cursor.execute("UPDATE version SET version = 12")
+    dbi.conn.commit()
+    dbi.conn.close()
+
+    dbi = backend.SQLiteDb([calname], db_path, locale=LOCALE_BERLIN, paths=paths)
+    assert dict(dbi.list(calname)) == {
+        "unchanged.ics": get_etag_from_path(str(vdir.join("unchanged.ics"))),
+        "changed.ics": "1.000000000",
+        "contact.vcfBDAY": get_etag_from_path(str(vdir.join("contact.vcf"))),
+    }
+    assert dbi.get_ctag(calname) == get_etag_from_path(str(vdir))
+
+
+def test_wal(tmpdir):
+    dbi = backend.SQLiteDb([calname], str(tmpdir) + "/khal.db", locale=LOCALE_BERLIN)
+    assert dbi.sql_ex("PRAGMA journal_mode", ()) == [("wal",)]
+
+
+@pytest.mark.skipif(backend.fcntl is None, reason="no advisory file locks")
+def test_update_lock(tmpdir):
+    db_path = str(tmpdir) + "/khal.db"
+    dbi = backend.SQLiteDb([calname], db_path, locale=LOCALE_BERLIN)
+    other = backend.SQLiteDb([calname], db_path, locale=LOCALE_BERLIN)
+    with dbi.update_lock(timeout=0) as locked:
+        assert locked
+        with other.update_lock(timeout=0.1) as other_locked:
+            assert not other_locked
+    with other.update_lock(timeout=0) as other_locked:
+        assert other_locked
+
+
+def test_interval_index():
+    """the interval index is kept in sync with the recurrence tables"""
+    dbi = backend.SQLiteDb([calname], ":memory:", locale=LOCALE_BERLIN)
+    dbi.update(_get_text("event_rrule_recuid"), href="12345.ics", etag="abcd", calendar=calname)
+    for table in ["recs_loc", "recs_float"]:
+        assert dbi.sql_ex(f"SELECT count(*) FROM {table}_index", ()) == dbi.sql_ex(
+            f"SELECT count(*) FROM {table}", ()
+        )
+    assert dbi.sql_ex("SELECT count(*) FROM recs_loc_index", ()) == [(6,)]
+    # updating replaces all rows
+    dbi.update(_get_text("event_rrule_recuid"), href="12345.ics", etag="abcd", calendar=calname)
+    assert dbi.sql_ex("SELECT count(*) FROM recs_loc_index", ()) == [(6,)]
+    dbi.delete("12345.ics", calendar=calname)
+    assert dbi.sql_ex("SELECT count(*) FROM recs_loc_index", ()) == [(0,)]
+
+
+def test_delete_many():
+    dbi = backend.SQLiteDb([calname], ":memory:", locale=LOCALE_BERLIN)
+    dbi.update(_get_text("event_rrule_recuid"), href="12345.ics", etag="abcd", calendar=calname)
+    dbi.update(_get_text("event_dt_simple"), href="simple.ics", etag="abcd", calendar=calname)
+    dbi.update(_get_text("event_d"), href="d.ics", etag="abcd", calendar=calname)
+    dbi.delete_many(["12345.ics", "d.ics"], calendar=calname)
+    assert dbi.list(calname) == [("simple.ics", "abcd")]
+    assert dbi.sql_ex(
+        "SELECT href FROM recs_loc JOIN events ON recs_loc.event = events.id", ()
+    ) == [("simple.ics",)]
+    assert dbi.sql_ex("SELECT count(*) FROM search", ()) == [(1,)]
+    assert dbi.sql_ex("SELECT count(*) FROM recs_float", ()) == [(0,)]
+    assert dbi.sql_ex("SELECT count(*) FROM recs_loc_index", ()) == [(1,)]
+
+
+def test_find_by_uid():
+    dbi = backend.SQLiteDb([calname, "work"], ":memory:", locale=LOCALE_BERLIN)
+    dbi.update(_get_text("event_dt_simple"), href="simple.ics", etag="abcd", calendar=calname)
+    dbi.update(_get_text("event_d"), href="d.ics", etag="efgh", calendar="work")
+    dbi.update(_get_text("event_rrule_recuid"), href="12345.ics", etag="abcd", calendar=calname)
+    assert dbi.find_by_uid("V042MJ8B3SJNFXQOJL6P53OFMHJE8Z3VZWOU") == [
+        (calname, "simple.ics", "abcd"),
+        ("work", "d.ics", "efgh"),
+    ]
+    assert dbi.find_by_uid("event_rrule_recurrence_id") == [(calname, "12345.ics", "abcd")]
+    dbi.delete("simple.ics", calendar=calname)
+    assert dbi.find_by_uid("V042MJ8B3SJNFXQOJL6P53OFMHJE8Z3VZWOU") == [("work", "d.ics", "efgh")]
+    assert dbi.find_by_uid("unknown") == []
+
+
+event_search = """BEGIN:VCALENDAR
+BEGIN:VEVENT
+UID:search
+SUMMARY:Team meeting
+DESCRIPTION:Talk about the party
+LOCATION:Berlin
+CATEGORIES:work,planning
+ATTENDEE;CN=Alice Example:mailto:alice@example.com
+ATTENDEE:mailto:bob@example.com
+ORGANIZER;CN=Carol:mailto:carol@example.com
+DTSTART;TZID=Europe/Berlin:20140409T093000
+DTEND;TZID=Europe/Berlin:20140409T103000
+END:VEVENT
+END:VCALENDAR
+"""
+
+event_party = """BEGIN:VCALENDAR
+BEGIN:VEVENT
+UID:party
+SUMMARY:Party
+DTSTART;VALUE=DATE:20140410
+DTEND;VALUE=DATE:20140411
+END:VEVENT
+END:VCALENDAR
+"""
+
+
+@pytest.mark.parametrize("fulltext", [True, False])
+def test_search(fulltext):
+    dbi = backend.SQLiteDb([calname], ":memory:", locale=LOCALE_BERLIN)
+    dbi._fulltext = dbi._fulltext and fulltext
+    dbi.update(event_search, href="search.ics", etag="abcd", calendar=calname)
+    dbi.update(event_party, href="party.ics", etag="abcd", calendar=calname)
+    dbi.update(_get_text("event_rrule_recuid"), href="12345.ics", etag="abcd", calendar=calname)
+
+    def hrefs(search_string):
+        return [href for _, href, *_ in dbi.search(search_string)]
+
+    # one result per VEVENT, not per instance
+    assert hrefs("Arbeit") == ["12345.ics", "12345.ics"]
+    assert hrefs("arbei") == ["12345.ics", "12345.ics"]
+    # property names and values not searched for are not matched
+    assert hrefs("VEVENT") == []
+    assert hrefs("Europe") == []
+    assert hrefs("location:berlin") == ["search.ics"]
+    assert hrefs("summary:berlin") == []
+    assert hrefs("category:work") == []
+    assert hrefs("categories:planning") == ["search.ics"]
+    assert hrefs("alice") == ["search.ics"]
+    assert hrefs("attendee:bob@example.com") == ["search.ics"]
+    assert hrefs("organizer:carol") == ["search.ics"]
+    assert hrefs('"team meeting"') == ["search.ics"]
+    assert hrefs("meeting team") == ["search.ics"]
+    assert hrefs("meeting planning Munich") == []
+    if fulltext:
+        # matches in the summary count more than in the description
+        assert hrefs("party") == ["party.ics", "search.ics"]
+    else:
+        assert sorted(hrefs("party")) == ["party.ics", "search.ics"]
+
+    [(_, _, start, end, *_)] = dbi.search("summary:party")
+    assert (start, end) == (dt.date(2014, 4, 10), dt.date(2014, 4, 11))
+
+    dbi.delete_many(["search.ics", "party.ics", "12345.ics"], calendar=calname)
+    assert hrefs("party") == []
+    assert dbi.sql_ex("SELECT count(*) FROM search", ()) == [(0,)]
+
+
+def test_parse_search():
+    assert backend.parse_search('Location:Berlin "team meeting" 10:30 foo:"bar baz"') == [
+        ("location", "Berlin", True),
+        (None, "team meeting", False),
+        (None, "10:30", True),
+        (None, 'foo:"bar baz"', True),
+    ]
+    assert backend.parse_search("  ") == []
+
+
+event_rrule_daily = """BEGIN:VCALENDAR
+BEGIN:VEVENT
+UID:daily
+SUMMARY:Standup
+DTSTART;TZID=Europe/Berlin:20190601T090000
+DTEND;TZID=Europe/Berlin:20190601T091500
+RRULE:FREQ=DAILY
+END:VEVENT
+END:VCALENDAR
+"""
+
+
+def test_horizon():
+    """never ending events are only stored around the current date, the
+    horizon moves along with it"""
+    with freeze_time("2020-01-01"):
+        dbi = backend.SQLiteDb([calname], ":memory:", locale=LOCALE_BERLIN)
+        dbi.update(event_rrule_daily, href="daily.ics", etag="abcd", calendar=calname)
+        assert not dbi.horizon_outdated()
+    stored = dbi.sql_ex("SELECT id, dtstart FROM recs_loc", ())
+    # 2019-06-01 until about 2022-01-01
+    assert 940 < len(stored) < 950
+    horizon_start, horizon_end = dbi._get_horizon(calname)
+
+    with freeze_time("2020-03-01"):
+        assert dbi.horizon_outdated()
+        dbi.extend_horizon()
+        assert not dbi.horizon_outdated()
+    assert dbi._get_horizon(calname)[0] == horizon_start
+    assert dbi._get_horizon(calname)[1] > horizon_end
+    extended = dbi.sql_ex("SELECT id, dtstart FROM recs_loc", ())
+    # only the instances of the added 60 days are inserted
+    assert set(stored) < set(extended)
+    assert 59 <= len(extended) - len(stored) <= 61
+
+    start = BERLIN.localize(dt.datetime(2022, 2, 15, 0, 0))
+    end = BERLIN.localize(dt.datetime(2022, 2, 15, 23, 59))
+    assert dbi.in_horizon(utils.to_unix_time(start), utils.to_unix_time(end))
+    events = list(dbi.get_localized(start, end))
+    assert [event[2] for event in events] == [BERLIN.localize(dt.datetime(2022, 2, 15, 9, 0))]
+
+
+event_once_far_away = """BEGIN:VCALENDAR
+BEGIN:VEVENT
+UID:far_away
+SUMMARY:Far away
+DTSTART;TZID=Europe/Berlin:22000601T080000
+DTEND;TZID=Europe/Berlin:22000601T083000
+END:VEVENT
+END:VCALENDAR
+"""
+
+
+@freeze_time("2020-01-01")
+def test_beyond_horizon(monkeypatch):
+    """instances beyond the horizon are expanded in memory, without storing
+    them"""
+    dbi = backend.SQLiteDb([calname], ":memory:", locale=LOCALE_BERLIN)
+    dbi.update(event_rrule_daily, href="daily.ics", etag="abcd", calendar=calname)
+    dbi.update(event_once_far_away, href="far.ics", etag="abcd", calendar=calname)
+    horizon = dbi._get_horizon(calname)
+    (count,) = dbi.sql_ex("SELECT count(*) FROM recs_loc", ())[0]
+    parsed = []
+    original = backend.parse_item
+
+    def parse_item(*args):
+        parsed.append(args[1])
+        return original(*args)
+
+    monkeypatch.setattr(backend, "parse_item", parse_item)
+
+    start = BERLIN.localize(dt.datetime(2200, 6, 1, 0, 0))
+    end = BERLIN.localize(dt.datetime(2200, 6, 2, 23, 59))
+    events = list(dbi.get_localized(start, end))
+    assert [(event[1], event[2]) for event in events] == [
+        ("far.ics", BERLIN.localize(dt.datetime(2200, 6, 1, 8, 0))),
+        ("daily.ics", BERLIN.localize(dt.datetime(2200, 6, 1, 9, 0))),
+        ("daily.ics", BERLIN.localize(dt.datetime(2200, 6, 2, 9, 0))),
+    ]
+    assert list(dbi.get_localized_calendars(start, end)) == [calname] * 3
+    instances = list(dbi.get_instances(start, end))
+    assert [instance[7] for instance in instances] == ["Far away", "Standup", "Standup"]
+    assert dbi._get_horizon(calname) == horizon
+    assert dbi.sql_ex("SELECT count(*) FROM recs_loc", ())[0] == (count,)
+    # the event is only parsed once
+    assert parsed == ["daily.ics"]
+
+    # but again once the db changed
+    dbi.update(event_rrule_daily, href="daily2.ics", etag="abcd", calendar=calname)
+    parsed.clear()
+    assert len(list(dbi.get_localized(start, end))) == 5
+    assert sorted(parsed) == ["daily.ics", "daily2.ics"]
+
+    start = BERLIN.localize(dt.datetime(9999, 12, 30, 0, 0))
+    end = BERLIN.localize(dt.datetime(9999, 12, 30, 23, 59))
+    assert list(dbi.get_localized(start, end)) == []
+
+
 def test_event_rrule_recurrence_id():
     dbi = backend.SQLiteDb([calname], ":memory:", locale=LOCALE_BERLIN)
     assert dbi.list(calname) == []
@@ -188,7 +637,7 @@ def test_event_recuid_rrule_no_master():
     assert events[0][3] == dt.datetime(2014, 6, 30, 12, 0)
     assert events[1][2] == dt.datetime(2014, 7, 7, 8, 30)
     assert events[1][3] == dt.datetime(2014, 7, 7, 12, 0)
-    events = dbi.search("VEVENT")
+    events = dbi.search("Arbeit")
     assert len(list(events)) == 2
 
 
@@ -208,6 +657,40 @@ def test_no_valid_timezone():
     assert event[3] == BERLIN.localize(dt.datetime(2014, 4, 9, 10, 30))
 
 
+def test_settings_changed(tmpdir):
+    """if the default timezone changes, only events localized in it are
+    updated"""
+    db_path = str(tmpdir) + "/khal.db"
+    dbi = backend.SQLiteDb([calname, "work"], db_path, locale=LOCALE_BERLIN)
+    dbi.update(_get_text("event_dt_local_missing_tz"), href="missing.ics", calendar=calname)
+    dbi.update(_get_text("event_dt_simple"), href="simple.ics", etag="abcd", calendar=calname)
+    dbi.update(_get_text("event_dt_local_missing_tz"), href="missing.ics", calendar="work")
+    dbi.set_ctag("home_ctag", calendar=calname)
+    dbi.set_ctag("work_ctag", calendar="work")
+    dbi.conn.close()
+
+    dbi = backend.SQLiteDb([calname], db_path, locale=LOCALE_BERLIN)
+    assert dbi.get_ctag(calname) == "home_ctag"
+
+    dbi = backend.SQLiteDb([calname], db_path, locale=LOCALE_NEW_YORK)
+    assert sorted(dbi.list(calname)) == [("missing.ics", None), ("simple.ics", "abcd")]
+    assert dbi.get_ctag(calname) is None
+    # only the selected calendars are checked
+    assert dbi.list("work") == [("missing.ics", "")]
+    assert dbi.get_ctag("work") == "work_ctag"
+
+    dbi.update(_get_text("event_dt_local_missing_tz"), href="missing.ics", calendar=calname)
+    start, end = (
+        NEW_YORK.localize(dt.datetime(2014, 4, 9, 0, 0)),
+        NEW_YORK.localize(dt.datetime(2014, 4, 10, 0, 0)),
+    )
+    events = [event for event in dbi.get_localized(start, end) if event[1] == "missing.ics"]
+    assert events[0][2] == NEW_YORK.localize(dt.datetime(2014, 4, 9, 9, 30))
+    dbi.set_ctag("new_ctag", calendar=calname)
+    dbi = backend.SQLiteDb([calname], db_path, locale=LOCALE_NEW_YORK)
+    assert dbi.get_ctag(calname) == "new_ctag"
+
+
 def test_event_delete():
     dbi = backend.SQLiteDb([calname], ":memory:", locale=LOCALE_BERLIN)
     assert dbi.list(calname) == []
@@ -352,6 +352,37 @@ def test_vertical_month():
         locale.setlocale(locale.LC_ALL, "C")
 
 
+def test_vertical_month_highlight():
+    """all days of the calendar are looked up at once"""
+
+    class Collection(testCollection):
+        def __init__(self) -> None:
+            super().__init__()
+            self.ranges: list[tuple[dt.date, dt.date]] = []
+
+        def get_calendars_between(self, start, end):
+            self.ranges.append((start, end))
+            return {
+                start + dt.timedelta(days=n): {"home"} if n == 10 else set()
+                for n in range((end - start).days + 1)
+            }
+
+        def get_calendars_on(self, day):
+            raise AssertionError("should not be called")
+
+    collection = Collection()
+    collection.addCalendar("home", "dark red", 10)
+    vert_str = vertical_month(
+        month=12,
+        year=2011,
+        today=dt.date(2011, 12, 1),
+        collection=collection,
+        highlight_event_days=True,
+    )
+    assert collection.ranges == [(dt.date(2011, 11, 28), dt.date(2012, 3, 4))]
+    assert "\x1b[31m 8\x1b[0m" in vert_str[2]
+
+
 def test_vertical_month_unicode():
     try:
         locale.setlocale(locale.LC_ALL, "de_DE.UTF-8")
@@ -2,17 +2,23 @@ import datetime as dt
 import json
 import os
 import re
+import socket
+import subprocess
 import sys
+import time
 import traceback
 
 import pytest
 from click.testing import CliRunner
 from freezegun import freeze_time
+from tzlocal import get_localzone
 
+from khal import client
 from khal.cli import main_ikhal, main_khal
+from khal.khalendar.vdir import Item
 from khal.utils import CONTENT_ATTRIBUTES
 
-from .utils import _get_ics_filepath, _get_text
+from .utils import _get_ics_filepath, _get_text, cal1
 
 
 class CustomCliRunner(CliRunner):
@@ -150,6 +156,39 @@ def test_direct_modification(runner):
     assert result.output == ""
 
 
+def test_reindex(runner):
+    runner = runner()
+    result = runner.invoke(main_khal, ["list"])
+    assert not result.exception
+
+    event = runner.calendars["one"].join("test.ics")
+    event.write(_get_text("event_dt_simple"))
+    other = runner.calendars["one"].join("other.ics")
+    other.write(_get_text("event_dt_simple").replace("An Event", "Another Event"))
+    result = runner.invoke(main_khal, ["reindex", "-a", "one", str(event)])
+    assert not result.exception
+    assert result.output == ""
+
+    # only the given files have been indexed
+    format = "{start-end-time-style}: {title}"
+    args = ["list", "--format", format, "--day-format", "", "09.04.2014"]
+    result = runner.invoke(main_khal, args)
+    assert not result.exception
+    assert result.output == "09:30-10:30: An Event\n"
+
+    os.remove(str(event))
+    result = runner.invoke(main_khal, ["reindex", "-a", "one", "test.ics"])
+    assert not result.exception
+    result = runner.invoke(main_khal, args)
+    assert result.output == ""
+
+    result = runner.invoke(main_khal, ["reindex", "-a", "two", str(other)])
+    assert result.exit_code == 2
+    assert "is not in calendar two" in result.output
+    result = runner.invoke(main_khal, ["reindex", "test.ics"])
+    assert result.exit_code == 2
+
+
 def test_simple(runner):
     runner = runner(days=2)
     result = runner.invoke(main_khal, ["list"])
@@ -455,6 +494,34 @@ def test_at_json_default_fields(runner):
     assert all(x in output_fields for x in CONTENT_ATTRIBUTES)
 
 
+def test_list_ndjson(runner):
+    runner = runner(days=2)
+    now = dt.datetime.now().strftime("%d.%m.%Y")
+    for title in ["first", "second"]:
+        result = runner.invoke(main_khal, f"new {now} 18:00 {title}".split())
+        assert not result.exception
+    args = ["list", "--ndjson", "--json", "title", "--json", "start-time"]
+    result = runner.invoke(main_khal, args)
+    assert not result.exception
+    lines = result.output.splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"start-time": "18:00", "title": "first"},
+        {"start-time": "18:00", "title": "second"},
+    ]
+
+
+def test_search_ndjson_default_fields(runner):
+    runner = runner(days=2)
+    now = dt.datetime.now().strftime("%d.%m.%Y")
+    result = runner.invoke(main_khal, f"new {now} 18:00 myevent".split())
+    assert not result.exception
+    result = runner.invoke(main_khal, ["search", "--ndjson", "myevent"])
+    assert not result.exception
+    event = json.loads(result.output)
+    assert event["title"] == "myevent"
+    assert all(x in event for x in CONTENT_ATTRIBUTES)
+
+
 def test_at_json_strip(runner):
     runner = runner()
     result = runner.invoke(
@@ -1149,3 +1216,169 @@ def test_list_now(runner, tmpdir):
 
     result = runner.invoke(main_khal, ["list", "now"])
     assert not result.exception
+
+
+def _wait_for_socket(path, process, timeout=20):
+    start = time.monotonic()
+    while not os.path.exists(path):
+        assert process.poll() is None, process.stderr.read()
+        assert time.monotonic() - start < timeout
+        time.sleep(0.05)
+
+
+def test_serve(runner, tmpdir, capsys):
+    runner = runner(days=2)
+    now = dt.datetime.now().strftime("%d.%m.%Y")
+    result = runner.invoke(main_khal, f"new {now} 18:00 myevent".split())
+    assert not result.exception
+    expected = runner.invoke(main_khal, ["list"]).output
+
+    socket_path = str(tmpdir.join("khal.sock"))
+    config = ["-c", str(runner.config_file)]
+    server = subprocess.Popen(
+        [sys.executable, "-m", "khal", *config, "serve", "--socket", socket_path],
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        _wait_for_socket(socket_path, server)
+        assert client.forward([*config, "list"], socket_path) == 0
+        assert capsys.readouterr().out == expected
+
+        # changes to the vdirs are picked up by the server
+        result = runner.invoke(main_khal, f"new {now} 20:00 otherevent".split())
+        assert not result.exception
+        assert client.forward([*config, "list"], socket_path) == 0
+        assert "otherevent" in capsys.readouterr().out
+
+        assert client.forward([*config, "list", "-a", "nonexistent"], socket_path) == 2
+        assert "Unknown calendar nonexistent" in capsys.readouterr().err
+
+        assert client.forward([*config, "new", "foo"], socket_path) == 2
+    finally:
+        server.terminate()
+        server.wait(timeout=20)
+    assert server.returncode == 0
+    assert not os.path.exists(socket_path)
+
+
+@pytest.mark.parametrize("watch", [True, False])
+def test_serve_update(coll_vdirs, sleep_time, watch):
+    """idle servers apply changes to the vdirs, watching them where possible"""
+    from khal import server
+
+    coll, vdirs = coll_vdirs
+    state = server.WarmState()
+    watcher = coll.watch() if watch else None
+    state._collections[("key",)] = ({}, coll, watcher)
+    time.sleep(sleep_time)
+    vdirs[cal1].upload(Item(_get_text("event_dt_simple")))
+    state.update()
+    assert len(list(coll.get_events_on(dt.date(2014, 4, 9)))) == 1
+    assert not coll.needs_update()
+    if watcher is not None:
+        watcher.close()
+
+
+def test_client_fallback(runner, tmpdir, monkeypatch, capsys):
+    runner = runner(days=2)
+    now = dt.datetime.now().strftime("%d.%m.%Y")
+    result = runner.invoke(main_khal, f"new {now} 18:00 myevent".split())
+    assert not result.exception
+
+    monkeypatch.setenv("KHAL_SOCKET", str(tmpdir.join("nonexistent.sock")))
+    with pytest.raises(SystemExit) as exit:
+        client.main(["-c", str(runner.config_file), "list"])
+    assert exit.value.code == 0
+    assert "myevent" in capsys.readouterr().out
+
+
+def test_serve_environment():
+    from khal import server
+
+    original = server._set_environment({"TZ": "Europe/Berlin", "LC_TIME": None})
+    try:
+        saved = server._set_environment({"TZ": "America/New_York", "LC_TIME": "C"})
+        assert saved == {"TZ": "Europe/Berlin", "LC_TIME": None}
+        assert str(get_localzone()) == "America/New_York"
+        assert time.tzname[0] == "EST"
+        assert os.environ["LC_TIME"] == "C"
+
+        server._set_environment(saved)
+        assert str(get_localzone()) == "Europe/Berlin"
+        assert time.tzname[0] == "CET"
+        assert "LC_TIME" not in os.environ
+    finally:
+        server._set_environment(original)
+
+
+def test_client_socket_permissions(tmpdir, capsys):
+    socket_dir = tmpdir.join("khal")
+    socket_dir.mkdir()
+    socket_path = str(socket_dir.join("khal.sock"))
+    os.chmod(str(socket_dir), 0o700)
+    assert client.is_private_dir(str(socket_dir))
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.bind(socket_path)
+        os.chmod(str(socket_dir), 0o755)
+        assert not client.is_private_dir(str(socket_dir))
+        assert client.forward(["list"], socket_path) is None
+    assert "accessible by other users" in capsys.readouterr().err
+
+    first, second = socket.socketpair(socket.AF_UNIX)
+    with first, second:
+        assert client.is_trusted_peer(first)
+
+
+@pytest.mark.parametrize(
+    ("argv", "command"),
+    [
+        (["list"], "list"),
+        (["-c", "list", "at"], "at"),
+        (["--config=foo", "-v", "DEBUG", "--no-color", "search", "x"], "search"),
+        (["--version"], None),
+    ],
+)
+def test_client_get_command(argv, command):
+    assert client.get_command(argv) == command
+
+
+def test_client_imports():
+    modules = subprocess.check_output(
+        [sys.executable, "-c", "import sys, khal.client; print(' '.join(sys.modules))"],
+        text=True,
+    ).split()
+    assert "click" not in modules
+    assert "khal.cli" not in modules
+
+
+def _import_times(*args):
+    """run khal with `args` and return the cumulative import times (in
+    microseconds) of all modules it imported"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "khal", *args],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    times = {}
+    for line in stderr.splitlines():
+        if line.startswith("import time:"):
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_import_budget(runner):
+    runner = runner()
+    config = ["-c", str(runner.config_file)]
+
+    times = _import_times(*config, "list")
+    assert "urwid" not in times
+
+    times = _import_times(*config, "printformats")
+    assert "sqlite3" not in times
+    assert "icalendar" not in times
+    # generous, importing khal.cli takes about 0.15 seconds on a laptop
+    assert times["khal.cli"] < 500_000
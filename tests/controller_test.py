@@ -5,8 +5,15 @@ import pytest
 from freezegun import freeze_time
 
 from khal import exceptions
-from khal.controllers import import_ics, khal_list, start_end_from_daterange
+from khal.controllers import (
+    format_day,
+    get_events_between,
+    import_ics,
+    khal_list,
+    start_end_from_daterange,
+)
 from khal.khalendar.vdir import Item
+from khal.utils import human_formatter
 
 from . import utils
 from .utils import _get_text
@@ -103,6 +110,69 @@ class TestGetAgenda:
             == ""
         )
 
+    @pytest.mark.parametrize("once", [False, True])
+    @pytest.mark.parametrize("notstarted", [False, True])
+    @pytest.mark.parametrize("show_all_days", [False, True])
+    def test_agenda_same_as_per_day(self, coll_vdirs, once, notstarted, show_all_days):
+        """all days are fetched with one query, the output must not differ from
+        querying each day on its own"""
+        coll, vdirs = coll_vdirs
+        for uid, dates in [
+            ("floating", "DTSTART:20140408T230000\r\nDTEND:20140409T010000"),
+            ("localized", "DTSTART:20140409T080000Z\r\nDTEND:20140409T090000Z"),
+            ("midnight", "DTSTART:20140410T200000Z\r\nDTEND:20140410T220000Z"),
+            ("allday", "DTSTART;VALUE=DATE:20140407\r\nDTEND;VALUE=DATE:20140410"),
+            ("late", "DTSTART;VALUE=DATE:20140414\r\nDTEND;VALUE=DATE:20140415"),
+            (
+                "daily",
+                "DTSTART:20140407T100000Z\r\nDTEND:20140407T110000Z\r\nRRULE:FREQ=DAILY;COUNT=5",
+            ),
+        ]:
+            coll.insert(
+                coll.create_event_from_ics(
+                    f"BEGIN:VEVENT\r\nUID:{uid}\r\nSUMMARY:{uid}\r\n{dates}\r\nEND:VEVENT\r\n",
+                    utils.cal1,
+                )
+            )
+        this_conf = {
+            "locale": utils.LOCALE_BERLIN,
+            "default": {"timedelta": dt.timedelta(days=2), "show_all_days": show_all_days},
+            "view": {"blank_line_before_day": True},
+        }
+        out = khal_list(
+            coll,
+            ["08.04.2014", "13.04.2014"],
+            this_conf,
+            agenda_format=event_format,
+            day_format="{date}",
+            once=once,
+            notstarted=notstarted,
+        )
+
+        expected = []
+        seen = set() if once else None
+        original_start = utils.BERLIN.localize(dt.datetime(2014, 4, 8))
+        for day in range(8, 14):
+            start = dt.datetime(2014, 4, day)
+            events = get_events_between(
+                coll,
+                utils.LOCALE_BERLIN,
+                start,
+                dt.datetime.combine(start.date(), dt.time.max),
+                human_formatter(event_format),
+                notstarted,
+                {},
+                original_start,
+                seen,
+            )
+            if show_all_days or events:
+                if expected:
+                    expected.append("")
+                expected.append(format_day(start.date(), "{date}", utils.LOCALE_BERLIN))
+            expected.extend(events)
+        assert out == expected
+        assert any("floating" in line for line in out)
+
 
 class TestImport:
     def test_import(self, coll_vdirs):
@@ -618,6 +618,23 @@ def test_event_no_alarms_list():
     assert attributes["alarms-list"] == []
 
 
+def test_event_attributes_lazy():
+    """attributes are only computed when they are needed"""
+    event = Event.fromString(_get_text("event_dt_simple"), **EVENT_KWARGS)
+    attributes = event.attributes(dt.date(2014, 4, 9))
+    assert human_formatter("{start-time} {title}")(attributes) == "09:30 An Event\x1b[0m"
+    assert set(attributes._values) == {"start-time", "start-time-full", "title"}
+
+    # all attributes are still available and keep their order
+    assert list(attributes)[:3] == ["start", "start-long", "start-date"]
+    assert list(attributes)[-2:] == ["status", "cancelled"]
+    assert len(dict(attributes)) == len(attributes)
+    assert "description" in attributes
+    assert "foo" not in attributes
+    with pytest.raises(KeyError):
+        attributes["foo"]
+
+
 def test_event_attendees():
     event = Event.fromString(_get_text("event_dt_simple"), **EVENT_KWARGS)
     assert event.attendees == ""
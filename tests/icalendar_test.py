@@ -5,7 +5,7 @@ import textwrap
 import icalendar
 from freezegun import freeze_time
 
-from khal.icalendar import new_vevent, split_ics
+from khal.icalendar import find_uid, new_vevent, split_ics, split_ics_stream
 
 from .utils import LOCALE_BERLIN, _get_text, _replace_uid, normalize_component
 
@@ -120,3 +120,29 @@ def test_split_ics_without_uid():
     assert vevents
     vevents2 = split_ics(cal)
     assert vevents[0] == vevents2[0]
+
+
+def test_split_ics_stream():
+    for name in ["cal_lots_of_timezones", "mult_uids_and_recuid_no_order", "tz_windows_format"]:
+        cal = _get_text(name)
+        assert list(split_ics_stream(cal.splitlines(keepends=True))) == split_ics(cal)
+
+
+def test_split_ics_stream_parallel(monkeypatch):
+    monkeypatch.setattr("khal.icalendar.PARALLEL_THRESHOLD", 0)
+    cal = _get_text("cal_lots_of_timezones")
+    vevents = list(split_ics_stream(cal.encode("utf-8").splitlines(), workers=2))
+    assert vevents == split_ics(cal)
+
+
+def test_split_ics_stream_without_uid():
+    cal = _get_text("without_uid")
+    vevents = list(split_ics_stream(cal.splitlines()))
+    assert len(vevents) == 1
+    assert vevents == list(split_ics_stream(cal.splitlines()))
+
+
+def test_find_uid():
+    assert find_uid(_get_text("event_dt_simple")) == "V042MJ8B3SJNFXQOJL6P53OFMHJE8Z3VZWOU"
+    assert find_uid(_get_text("event_rrule_recuid")) == "event_rrule_recurrence_id"
+    assert find_uid(_get_text("without_uid")) is None
@@ -1,6 +1,7 @@
 import datetime as dt
 import logging
 import os
+import sys
 from textwrap import dedent
 from time import sleep
 
@@ -112,6 +113,22 @@ class TestCalendar:
             )
         assert coll._needs_update(cal1) is False
 
+    def test_update_db_horizon(self, coll_vdirs):
+        """update_db() moves the horizon of never ending events along with the
+        current date, even if the vdirs did not change"""
+        coll, vdirs = coll_vdirs
+        weekly = _get_text("event_dt_rr").replace("COUNT=10", "INTERVAL=7")
+        count_sql = "SELECT count(*) FROM recs_float"
+        with freeze_time("2020-01-01"):
+            vdirs[cal1].upload(Item(weekly))
+            coll.update_db()
+            (count,) = coll._backend.sql_ex(count_sql, ())[0]
+        with freeze_time("2020-07-01"):
+            assert coll._backend.horizon_outdated()
+            coll.update_db()
+            assert not coll._backend.horizon_outdated()
+        assert coll._backend.sql_ex(count_sql, ())[0][0] == count + 26
+
 
 class TestVdirsyncerCompat:
     def test_list(self, coll_vdirs):
@@ -223,6 +240,45 @@ class TestCollection:
         assert len(list(vdirs[cal3].list())) == 0
         assert list(coll.get_localized(self.bstart_berlin, self.bend_berlin)) == []
 
+    def test_insert_many(self, coll_vdirs):
+        """insert several events at once, existing ones are updated"""
+        coll, vdirs = coll_vdirs
+        coll.insert(
+            Event.fromString(_get_text("event_dt_simple"), calendar=cal1, locale=LOCALE_BERLIN),
+            cal1,
+        )
+        items = [
+            Item(_get_text("event_dt_simple_updated")),
+            Item(_get_text("event_d").replace(SIMPLE_EVENT_UID, "another_uid")),
+        ]
+        assert coll.insert_many(items, cal1) == 2
+        events = sorted(coll.get_events_on(aday))
+        assert [event.summary for event in events] == ["An Event", "A not so simple Event"]
+        assert len(list(vdirs[cal1].list())) == 2
+        assert not coll._needs_update(cal1)
+
+    def test_insert_many_fails(self, coll_vdirs, monkeypatch):
+        """events written before an error are indexed anyway"""
+        coll, vdirs = coll_vdirs
+        monkeypatch.setattr(khal.khalendar.khalendar, "INSERT_CHUNK_SIZE", 2)
+        write = coll._write
+
+        def failing_write(event, calendar, href):
+            if event.uid == "uid3":
+                raise OSError("disk full")
+            return write(event, calendar, href)
+
+        monkeypatch.setattr(coll, "_write", failing_write)
+        items = [
+            Item(_get_text("event_dt_simple").replace(SIMPLE_EVENT_UID, f"uid{number}"))
+            for number in range(5)
+        ]
+        with pytest.raises(OSError, match="disk full"):
+            coll.insert_many(items, cal1)
+        assert len(list(vdirs[cal1].list())) == 3
+        assert len(list(coll.get_events_on(aday))) == 3
+        assert not coll._needs_update(cal1)
+
     def test_get(self, coll_vdirs):
         """test getting an event by its href"""
         coll, vdirs = coll_vdirs
@@ -253,6 +309,31 @@ class TestCollection:
         assert len(events) == 1
         assert events[0].calendar == cal2
 
+    def test_change_duplicate_uid(self, coll_vdirs):
+        """events cannot be moved to a calendar with an event with the same UID"""
+        coll, vdirs = coll_vdirs
+        coll.insert(Item(_get_text("event_dt_simple")), cal1)
+        coll.insert(Item(_get_text("event_d")), cal2)
+        event = [event for event in coll.get_events_on(aday) if event.calendar == cal1][0]
+        with pytest.raises(khal.khalendar.exceptions.DuplicateUid):
+            coll.change_collection(event, cal2)
+        assert sorted(coll.find_by_uid(SIMPLE_EVENT_UID)) == sorted(
+            [(cal1, SIMPLE_EVENT_UID + ".ics"), (cal2, SIMPLE_EVENT_UID + ".ics")]
+        )
+
+    def test_insert_duplicate_uid_other_href(self, coll_vdirs):
+        """duplicates are detected by UID, not just by the file name"""
+        coll, vdirs = coll_vdirs
+        vdirs[cal1].upload(Item(_get_text("event_dt_simple")))
+        href = list(vdirs[cal1].list())[0][0]
+        os.rename(os.path.join(vdirs[cal1].path, href), os.path.join(vdirs[cal1].path, "other.ics"))
+        coll.update_db()
+        with pytest.raises(khal.khalendar.exceptions.DuplicateUid):
+            coll.insert(Item(_get_text("event_dt_simple_updated")), cal1)
+        coll.force_update(Item(_get_text("event_dt_simple_updated")), cal1)
+        assert [href for href, _ in vdirs[cal1].list()] == ["other.ics"]
+        assert [event.summary for event in coll.get_events_on(aday)] == ["A not so simple Event"]
+
     def test_update_event(self, coll_vdirs):
         """updating one event"""
         coll, vdirs = coll_vdirs
@@ -269,6 +350,39 @@ class TestCollection:
         assert len(events) == 1
         assert events[0].summary == "really simple event"
 
+    def test_parsed_cache(self, coll_vdirs, monkeypatch):
+        """instances of a recurring event are only parsed once"""
+        coll, vdirs = coll_vdirs
+        event = Event.fromString(
+            _get_text("event_rrule_recuid"), calendar=cal1, locale=LOCALE_BERLIN
+        )
+        coll.insert(event, cal1)
+        calls = []
+        cal_from_ics = khal.khalendar.khalendar.cal_from_ics
+
+        def counting_cal_from_ics(ics):
+            calls.append(ics)
+            return cal_from_ics(ics)
+
+        monkeypatch.setattr(khal.khalendar.khalendar, "cal_from_ics", counting_cal_from_ics)
+        start = BERLIN.localize(dt.datetime(2014, 6, 30))
+        end = BERLIN.localize(dt.datetime(2014, 8, 26))
+        events = sorted(coll.get_localized(start, end))
+        assert len(events) == 6
+        assert len(calls) == 1
+
+        # modifying one instance does not leak into the others
+        events[0].update_summary("Not Arbeit")
+        events[0].update_alarms([(dt.timedelta(minutes=-10), "alarm")])
+        assert events[2].summary == "Arbeit"
+        assert events[2].alarms == []
+
+        # updating the event invalidates the cache
+        coll.update(events[0])
+        events = sorted(coll.get_localized(start, end))
+        assert len(calls) == 2
+        assert events[2].summary == "Not Arbeit"
+
     def test_newevent(self, coll_vdirs):
         coll, vdirs = coll_vdirs
         bday = dt.datetime.combine(aday, dt.time.min)
@@ -312,23 +426,23 @@ class TestCollection:
         """test searching for recurring events which only have a recuid event,
         and no master"""
         coll, vdirs = coll_vdirs
-        assert len(list(coll.search("Event"))) == 0
+        assert len(list(coll.search("Infrastructure"))) == 0
         event = Event.fromString(
             _get_text("event_dt_recuid_no_master"), calendar=cal1, locale=LOCALE_BERLIN
         )
         coll.insert(event, cal1)
-        assert len(list(coll.search("Event"))) == 1
+        assert len(list(coll.search("Infrastructure"))) == 1
 
     def test_search_recurrence_id_only_multi(self, coll_vdirs):
         """test searching for recurring events which only have a recuid event,
         and no master"""
         coll, vdirs = coll_vdirs
-        assert len(list(coll.search("Event"))) == 0
+        assert len(list(coll.search("Arbeit"))) == 0
         event = Event.fromString(
             _get_text("event_dt_multi_recuid_no_master"), calendar=cal1, locale=LOCALE_BERLIN
         )
         coll.insert(event, cal1)
-        events = sorted(coll.search("Event"))
+        events = sorted(coll.search("Arbeit"))
         assert len(events) == 2
         assert (
             human_formatter("{start} {end} {title}")(events[0].attributes(dt.date.today()))
@@ -409,6 +523,145 @@ class TestCollection:
             "Skipping foobar/12345.ics: \nThis event will not be available in khal."
         )
 
+    def test_update_db_parallel(self, coll_vdirs, caplog, fix_caplog, monkeypatch, sleep_time):
+        """many changed events are parsed by worker processes"""
+        coll, vdirs = coll_vdirs
+        monkeypatch.setattr(khal.khalendar.khalendar, "PARALLEL_THRESHOLD", 2)
+        caplog.set_level(logging.WARNING)
+        sleep(sleep_time)
+        vdirs[cal1].upload(DumbItem(_get_text("event_dt_simple"), uid="simple"))
+        vdirs[cal1].upload(DumbItem(_get_text("event_rrule_recuid"), uid="recuid"))
+        vdirs[cal1].upload(DumbItem(_get_text("event_dt_multi_uid"), uid="12345"))
+        coll.update_db()
+
+        assert len(list(coll.get_events_on(aday))) == 1
+        events = coll.get_localized(
+            BERLIN.localize(dt.datetime(2014, 6, 30)), BERLIN.localize(dt.datetime(2014, 8, 26))
+        )
+        assert len(list(events)) == 6
+        assert sorted(href for href, _ in coll._backend.list(cal1)) == ["recuid.ics", "simple.ics"]
+        messages = [rec.message for rec in caplog.records]
+        assert "Skipping foobar/12345.ics: \nThis event will not be available in khal." in messages
+
+    def test_calendars_between(self, coll_vdirs):
+        """looking up all days at once gives the same result as each on its own"""
+        coll, vdirs = coll_vdirs
+        for name, calendar in [
+            ("event_dt_simple", cal1),
+            ("event_d_long", cal2),
+            ("event_dt_long", cal3),
+        ]:
+            event = Event.fromString(_get_text(name), calendar=calendar, locale=LOCALE_BERLIN)
+            coll.insert(event, calendar)
+        days = [dt.date(2014, 4, 7) + dt.timedelta(days=n) for n in range(8)]
+        expected = {day: set(coll.get_calendars_on(day)) for day in days}
+        assert expected[aday] == {cal1, cal2, cal3}
+        assert expected[dt.date(2014, 4, 12)] == {cal3}
+        assert coll.get_calendars_between(days[0], days[-1]) == expected
+        assert set(coll.get_calendars_on(aday)) == {cal1, cal2, cal3}
+
+        # changes to the collection invalidate the cache
+        href, etag = list(vdirs[cal1].list())[0]
+        coll.delete(href, etag, cal1)
+        assert set(coll.get_calendars_on(aday)) == {cal2, cal3}
+        assert coll.get_calendars_between(aday, aday) == {aday: {cal2, cal3}}
+
+    def test_iter_instances(self, coll_vdirs):
+        coll, vdirs = coll_vdirs
+        for name, calendar in [("event_dt_simple", cal1), ("event_d_long", cal2)]:
+            event = Event.fromString(_get_text(name), calendar=calendar, locale=LOCALE_BERLIN)
+            coll.insert(event, calendar)
+        event = Event.fromString(
+            _get_text("event_dt_simple")
+            .replace("UID:", "LOCATION:Home\nSTATUS:CANCELLED\nUID:other_")
+            .replace("T0930", "T0800"),
+            calendar=cal3,
+            locale=LOCALE_BERLIN,
+        )
+        coll.insert(event, cal3)
+        start, end = dt.datetime(2014, 4, 9), dt.datetime(2014, 4, 10)
+        fields = ("calendar", "start", "end", "summary", "location", "status")
+        instances = list(coll.iter_instances(start, end, fields=fields))
+        assert instances == [
+            (cal2, dt.date(2014, 4, 9), dt.date(2014, 4, 12), "Another Event", "", ""),
+            (
+                cal3,
+                BERLIN.localize(dt.datetime(2014, 4, 9, 8)),
+                BERLIN.localize(dt.datetime(2014, 4, 9, 10, 30)),
+                "An Event",
+                "Home",
+                "CANCELLED",
+            ),
+            (
+                cal1,
+                BERLIN.localize(dt.datetime(2014, 4, 9, 9, 30)),
+                BERLIN.localize(dt.datetime(2014, 4, 9, 10, 30)),
+                "An Event",
+                "",
+                "",
+            ),
+        ]
+        assert instances[1].location == "Home"
+        assert not hasattr(instances[1], "__dict__")
+
+        # other fields need the events to be parsed
+        instances = list(coll.iter_instances(start, end, fields=("uid", "allday", "description")))
+        assert instances == [
+            ("V042MJ8B3SJNFXQOJL6P53OFMHJE8Z3VZWOU", True, ""),
+            ("other_V042MJ8B3SJNFXQOJL6P53OFMHJE8Z3VZWOU", False, ""),
+            ("V042MJ8B3SJNFXQOJL6P53OFMHJE8Z3VZWOU", False, ""),
+        ]
+        with pytest.raises(ValueError, match="unknown field"):
+            list(coll.iter_instances(start, end, fields=("no_such_field",)))
+
+    def test_update_hrefs(self, coll_vdirs, sleep_time):
+        coll, vdirs = coll_vdirs
+        sleep(sleep_time)
+        href, etag = vdirs[cal1].upload(DumbItem(_get_text("event_dt_simple"), uid="simple"))
+        assert coll.update_hrefs(cal1, [href]) == (aday, aday)
+        assert len(list(coll.get_events_on(aday))) == 1
+        assert not coll.needs_update()
+        # unchanged items are skipped
+        assert coll.update_hrefs(cal1, [href]) is None
+
+        # moving an event affects the old and the new days
+        moved = _get_text("event_dt_simple").replace("20140409", "20140412")
+        vdirs[cal1].update(href, DumbItem(moved, uid="simple"), etag)
+        assert coll.update_hrefs(cal1, [href]) == (aday, dt.date(2014, 4, 12))
+        assert list(coll.get_events_on(aday)) == []
+        assert len(list(coll.get_events_on(dt.date(2014, 4, 12)))) == 1
+
+        vdirs[cal1].delete(href, vdirs[cal1].get(href)[1])
+        assert coll.update_hrefs(cal1, [href]) == (dt.date(2014, 4, 12), dt.date(2014, 4, 12))
+        assert coll._backend.list(cal1) == []
+        assert not coll.needs_update()
+
+    def test_diff(self, coll_vdirs, sleep_time):
+        coll, vdirs = coll_vdirs
+        simple, _ = vdirs[cal1].upload(DumbItem(_get_text("event_dt_simple"), uid="simple"))
+        recuid, etag = vdirs[cal1].upload(DumbItem(_get_text("event_rrule_recuid"), uid="recuid"))
+        assert coll.diff(cal1) == ({simple, recuid}, set(), set())
+        coll.update_db()
+        assert coll.diff(cal1) == (set(), set(), set())
+
+        sleep(sleep_time)
+        vdirs[cal1].update(recuid, DumbItem(_get_text("event_rrule_recuid"), uid="recuid"), etag)
+        vdirs[cal1].delete(simple, vdirs[cal1].get(simple)[1])
+        assert coll.diff(cal1) == (set(), {recuid}, {simple})
+        assert coll.diff(cal2) == (set(), set(), set())
+
+    @pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux only")
+    def test_watch(self, coll_vdirs):
+        coll, vdirs = coll_vdirs
+        watcher = coll.watch()
+        assert watcher.read() == {}
+        href, etag = vdirs[cal1].upload(DumbItem(_get_text("event_dt_simple"), uid="simple"))
+        vdirs[cal2].set_meta("color", "#ff0000")
+        assert watcher.read() == {cal1: {href}}
+        vdirs[cal1].delete(href, etag)
+        assert watcher.read() == {cal1: {href}}
+        watcher.close()
+
 
 class TestDbCreation:
     def test_create_db(self, tmpdir):
@@ -433,6 +686,52 @@ class TestDbCreation:
         os.chmod(str(tmpdir), 777)
 
 
+@pytest.mark.skipif(khal.khalendar.backend.fcntl is None, reason="no advisory file locks")
+def test_update_db_locked(tmpdir, monkeypatch, sleep_time):
+    """while another process updates the db, the old snapshot is used"""
+    vdirpath = str(tmpdir) + "/" + cal1
+    os.makedirs(vdirpath, mode=0o770)
+    calendars = {
+        cal1: {"name": cal1, "path": vdirpath, "readonly": False, "color": "", "addresses": ""}
+    }
+    dbpath = str(tmpdir) + "/khal.db"
+    coll = CalendarCollection(calendars, dbpath=dbpath, locale=LOCALE_BERLIN)
+    other = khal.khalendar.backend.SQLiteDb([cal1], dbpath, locale=LOCALE_BERLIN)
+    monkeypatch.setattr(khal.khalendar.backend, "LOCK_TIMEOUT", 0.1)
+
+    sleep(sleep_time)
+    coll._storages[cal1].upload(Item(_get_text("event_dt_simple")))
+    with other.update_lock(timeout=0):
+        coll.update_db()
+        assert list(coll.get_events_on(aday)) == []
+        assert coll.needs_update()
+    coll.update_db()
+    assert len(list(coll.get_events_on(aday))) == 1
+    assert not coll.needs_update()
+
+
+@pytest.mark.skipif(khal.khalendar.backend.fcntl is None, reason="no advisory file locks")
+def test_update_hrefs_locked(tmpdir, sleep_time):
+    """update_hrefs() gives up if another process updates the db for too long"""
+    vdirpath = str(tmpdir) + "/" + cal1
+    os.makedirs(vdirpath, mode=0o770)
+    calendars = {
+        cal1: {"name": cal1, "path": vdirpath, "readonly": False, "color": "", "addresses": ""}
+    }
+    dbpath = str(tmpdir) + "/khal.db"
+    coll = CalendarCollection(calendars, dbpath=dbpath, locale=LOCALE_BERLIN)
+    other = khal.khalendar.backend.SQLiteDb([cal1], dbpath, locale=LOCALE_BERLIN)
+
+    sleep(sleep_time)
+    href, _ = coll._storages[cal1].upload(Item(_get_text("event_dt_simple")))
+    with other.update_lock(timeout=0):
+        with pytest.raises(khal.khalendar.exceptions.UpdateLocked):
+            coll.update_hrefs(cal1, [href], timeout=0.1)
+        assert list(coll.get_events_on(aday)) == []
+    assert coll.update_hrefs(cal1, [href], timeout=0) == (aday, aday)
+    assert len(list(coll.get_events_on(aday))) == 1
+
+
 def test_event_different_timezones(coll_vdirs, sleep_time):
     coll, vdirs = coll_vdirs
     sleep(sleep_time)  # Make sure we get a new ctag on upload
@@ -623,6 +922,22 @@ def test_birthdays(coll_vdirs_birthday, sleep_time):
         "Unix's 43rd birthday"
         == list(coll.get_floating(dt.datetime(2014, 3, 11), dt.datetime(2014, 3, 11)))[0].summary
     )
+    instances = coll.iter_instances(dt.datetime(2014, 3, 11), dt.datetime(2014, 3, 12))
+    assert [instance.summary for instance in instances] == ["Unix's 43rd birthday"]
+
+
+def test_birthdays_diff(coll_vdirs_birthday, sleep_time):
+    coll, vdirs = coll_vdirs_birthday
+    sleep(sleep_time)
+    href, etag = vdirs[cal1].upload(DumbItem(card, "unix"))
+    assert coll.diff(cal1) == ({href}, set(), set())
+    coll.update_db()
+    assert coll.diff(cal1) == (set(), set(), set())
+    sleep(sleep_time)
+    vdirs[cal1].delete(href, etag)
+    assert coll.diff(cal1) == (set(), set(), {href})
+    coll.update_db()
+    assert coll._backend.list(cal1) == []
 
 
 def test_birthdays_29feb(coll_vdirs_birthday, sleep_time):
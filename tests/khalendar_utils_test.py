@@ -742,6 +742,14 @@ END:VEVENT
 END:VCALENDAR
 """
 
+event_every_other_day = """BEGIN:VEVENT
+SUMMARY:every other day
+DTSTART;TZID=Europe/Berlin:20140101T230000
+DTEND;TZID=Europe/Berlin:20140102T010000
+RRULE:FREQ=DAILY;INTERVAL=2;BYDAY=MO,TU,WE,TH,FR
+END:VEVENT
+"""
+
 recurrence_id_with_timezone = """BEGIN:VEVENT
 SUMMARY:PyCologne
 DTSTART;TZID=/freeassociation.sourceforge.net/Tzfile/Europe/Berlin:20131113T190000
@@ -788,6 +796,47 @@ class TestSpecial:
         assert dtstart[0][0] == dt.date(2009, 10, 31)
         assert dtstart[-1][0] == dt.date(2037, 10, 31)
 
+    def test_window(self):
+        vevent = _get_vevent(latest_bug)
+        assert icalendar_helpers.is_unbounded(vevent)
+        dtstart = icalendar_helpers.expand(
+            vevent, berlin, dt.datetime(2019, 1, 1), dt.datetime(2021, 12, 31)
+        )
+        assert [start for start, _ in dtstart] == [
+            dt.date(2019, 10, 31),
+            dt.date(2020, 10, 31),
+            dt.date(2021, 10, 31),
+        ]
+
+    def test_window_before_dtstart(self):
+        vevent = _get_vevent(latest_bug)
+        dtstart = icalendar_helpers.expand(
+            vevent, berlin, dt.datetime(2005, 1, 1), dt.datetime(2006, 1, 1)
+        )
+        assert dtstart == []
+
+    def test_window_far_away(self):
+        """instances long after DTSTART are found without expanding all
+        earlier ones"""
+        vevent = _get_vevent(event_every_other_day)
+        dtstart = icalendar_helpers.expand(
+            vevent, berlin, dt.datetime(2500, 3, 2), dt.datetime(2500, 3, 9)
+        )
+        assert [start for start, _ in dtstart] == [
+            berlin.localize(dt.datetime(2500, 3, 2, 23, 0)),
+            berlin.localize(dt.datetime(2500, 3, 4, 23, 0)),
+            berlin.localize(dt.datetime(2500, 3, 8, 23, 0)),
+        ]
+
+    def test_window_bounded(self):
+        """rules with COUNT or UNTIL are always fully expanded"""
+        vevent = _get_vevent(vevent_count)
+        assert not icalendar_helpers.is_unbounded(vevent)
+        dtstart = icalendar_helpers.expand(
+            vevent, berlin, dt.datetime(2014, 2, 10), dt.datetime(2014, 2, 11)
+        )
+        assert len(dtstart) == 18
+
     def test_recurrence_id_with_timezone(self):
         vevent = _get_vevent(recurrence_id_with_timezone)
         dtstart = icalendar_helpers.expand(vevent, berlin)
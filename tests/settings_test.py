@@ -4,7 +4,9 @@ import os.path
 import pytest
 from tzlocal import get_localzone as _get_localzone
 
-from khal.settings import get_config
+import khal.settings.settings
+import khal.settings.utils
+from khal.settings import get_cached_config, get_config
 from khal.settings.exceptions import CannotParseConfigFileError, InvalidSettingsError
 from khal.settings.utils import (
     config_checks,
@@ -20,7 +22,7 @@ try:
 except ModuleNotFoundError:
     from validate import VdtValueError
 
-from .utils import LOCALE_BERLIN
+from .utils import BERLIN, LOCALE_BERLIN
 
 PATH = __file__.rsplit("/", 1)[0] + "/configs/"
 
@@ -58,7 +60,7 @@ class TestSettings:
                     "addresses": [""],
                 },
             },
-            "sqlite": {"path": os.path.expanduser("~/.cache/khal/khal.db")},
+            "sqlite": {"path": os.path.expanduser("~/.cache/khal/khal.db"), "workers": 0},
             "locale": LOCALE_BERLIN,
             "default": {
                 "default_calendar": None,
@@ -109,7 +111,7 @@ class TestSettings:
                     "addresses": ["user@example.com"],
                 },
             },
-            "sqlite": {"path": os.path.expanduser("~/.cache/khal/khal.db")},
+            "sqlite": {"path": os.path.expanduser("~/.cache/khal/khal.db"), "workers": 0},
             "locale": {
                 "local_timezone": get_localzone(),
                 "default_timezone": get_localzone(),
@@ -199,6 +201,51 @@ def test_broken_color(metavdirs):
     assert get_color_from_vdir(newvdir) is None
 
 
+def test_cached_config(metavdirs, tmpdir, monkeypatch):
+    monkeypatch.setattr("xdg.BaseDirectory.xdg_cache_home", str(tmpdir.join("cache")))
+    conf_path = tmpdir.join("khal.conf")
+    conf_path.write(f"[calendars]\n[[default]]\npath = {metavdirs}/cal3/*\ntype = discover\n")
+    config = get_cached_config(str(conf_path))
+    assert sorted(config["calendars"]) == ["home", "public", "work"]
+
+    def get_config(*args, **kwargs):
+        raise AssertionError("the config should have been cached")
+
+    with monkeypatch.context() as m:
+        m.setattr(khal.settings.settings, "get_config", get_config)
+        assert get_cached_config(str(conf_path)) == config
+
+    # new vdirs invalidate the cache
+    os.makedirs(metavdirs + "/cal3/new")
+    config = get_cached_config(str(conf_path))
+    assert sorted(config["calendars"]) == ["home", "new", "public", "work"]
+
+    # so do changes to the config file
+    conf_path.write(f"[calendars]\n[[default]]\npath = {metavdirs}/cal2/*\ntype = discover\n")
+    os.utime(str(conf_path), ns=(0, 0))
+    assert sorted(get_cached_config(str(conf_path))["calendars"]) == ["public"]
+
+
+def test_cached_config_environment(metavdirs, tmpdir, monkeypatch):
+    monkeypatch.setattr("xdg.BaseDirectory.xdg_cache_home", str(tmpdir.join("cache")))
+    monkeypatch.setenv("VDIRS", metavdirs)
+    conf_path = tmpdir.join("khal.conf")
+    conf_path.write("[calendars]\n[[default]]\npath = $VDIRS/cal3/*\ntype = discover\n")
+    config = get_cached_config(str(conf_path))
+    assert sorted(config["calendars"]) == ["home", "public", "work"]
+
+    # variables referenced in the config invalidate the cache
+    monkeypatch.setenv("VDIRS", metavdirs + "/cal3")
+    assert get_cached_config(str(conf_path))["calendars"] == {}
+    monkeypatch.setenv("VDIRS", metavdirs)
+    config = get_cached_config(str(conf_path))
+
+    # and so does the local timezone
+    monkeypatch.setattr(khal.settings.settings, "get_localzone", lambda: "Europe/Berlin")
+    monkeypatch.setattr(khal.settings.utils, "get_localzone", lambda: "Europe/Berlin")
+    assert get_cached_config(str(conf_path))["locale"]["local_timezone"] == BERLIN
+
+
 def test_discover(metavdirs):
     test_vdirs = {
         "/cal1/public",
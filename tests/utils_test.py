@@ -126,3 +126,35 @@ def test_human_formatter_width():
     formatter = utils.human_formatter("{red}{title}", width=10)
     output = formatter({"title": "morethan10characters", "red": style("", reset=False, fg="red")})
     assert output.startswith("\x1b[31mmoret\x1b[0m")
+
+
+def test_format_fields():
+    assert utils.format_fields("{start-time} {title!r:>10}{red}{nl}") == {
+        "start-time",
+        "title",
+        "red",
+        "nl",
+    }
+    assert utils.format_fields("{title:>{width}}") == {"title", "width"}
+    assert utils.format_fields("no fields") == set()
+
+
+def test_compile_format():
+    row = {"title": "An Event", "start-time": "09:30", "count": 3}
+    assert utils.compile_format("{start-time} {title}")(row) == "09:30 An Event"
+    assert utils.compile_format("{{{title}}} {count}")(row) == "{An Event} 3"
+    assert utils.compile_format("{title:>10}|{count!r}")(row) == "  An Event|3"
+    assert utils.compile_format("no fields")(row) == "no fields"
+
+
+def test_ndjson_formatter():
+    formatter = utils.ndjson_formatter(["title", "status"])
+    rows = [
+        {"title": "An Event", "status": " CONFIRMED ", "uid": "1"},
+        {"title": "Another Event", "status": "", "uid": "2"},
+    ]
+    assert formatter(rows) == [
+        '{"title": "An Event", "status": "CONFIRMED"}',
+        '{"title": "Another Event", "status": ""}',
+    ]
+    assert formatter(rows[0]) == '{"title": "An Event", "status": "CONFIRMED"}'
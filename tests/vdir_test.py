@@ -77,3 +77,17 @@ def test_get_href_from_uid():
 
     href = vdir._generate_href()
     assert href is not None
+
+
+def test_etag_read_write_consistent(tmpdir, monkeypatch):
+    """etags obtained while writing match those from listing the vdir, which
+    never syncs or opens files"""
+    collection = vdir.Vdir(str(tmpdir), ".ics")
+    href, etag = collection.upload(vdir.Item("BEGIN:VEVENT\nUID:foo\nEND:VEVENT"))
+
+    def fsync(fd):
+        raise AssertionError("reading should not sync")
+
+    monkeypatch.setattr(os, "fsync", fsync)
+    assert list(collection.list()) == [(href, etag)]
+    assert collection.get(href)[1] == etag